@@ -3,19 +3,22 @@ from dataclasses import dataclass
 import amaranth_soc.wishbone.bus as wb
 from amaranth import *
 from amaranth.lib import data, stream, wiring
+from amaranth.lib.fifo import SyncFIFOBuffered
 from amaranth.lib.wiring import In, Out
 from amaranth.utils import exact_log2
 
 from ..utils.layouts import (
+    VertexCacheLookupLayout,
     VertexLayout,
     num_textures,
-    wb_bus_addr_width,
+    vertex_cache_depth,
     wb_bus_data_width,
 )
 from ..utils.types import (
     FixedPoint_mem,
     IndexKind,
     InputTopology,
+    Vector4_mem,
     address_shape,
     index_shape,
 )
@@ -24,77 +27,128 @@ from .layouts import InputData, InputMode
 __all__ = [
     "IndexGenerator",
     "InputTopologyProcessor",
+    "VertexCacheTags",
     "InputAssembly",
 ]
 
 
+def _word_addr_width(data_width: int) -> int:
+    """Width of a word address covering the whole byte address space."""
+    return address_shape.width - exact_log2(data_width // 8)
+
+
 class IndexGenerator(wiring.Component):
     """Generates index stream based on index stream description register.
 
     Gets index stream description and outputs index stream.
 
-    TODO: add memory burst support
+    Index buffer words are fetched with incrementing bursts (one Wishbone cycle
+    per burst, ``cti`` set to incrementing) into a small FIFO. Indices are then
+    unpacked from the FIFO head, so the bus handshake is paid once per burst
+    instead of once per word.
+
+    Parameters
+    ----------
+    data_width: int
+        Width of the memory bus. Wider buses deliver more indices per beat.
+    fifo_depth: int
+        Depth (in bus words) of the fetched data FIFO. Bursts are at most half of
+        it long, so the next burst can be in flight while the previous one drains.
     """
 
-    os_index: Out(stream.Signature(index_shape))
-    bus: Out(
-        wb.Signature(
-            addr_width=wb_bus_addr_width, data_width=wb_bus_data_width, granularity=8
+    os_index: stream.Interface
+    bus: wb.Interface
+    ready: Signal
+
+    c_address: Signal
+    c_count: Signal
+    c_kind: Signal
+    start: Signal
+
+    def __init__(self, data_width: int = wb_bus_data_width, fifo_depth: int = 8):
+        assert fifo_depth >= 2, "FIFO must hold at least two bursts"
+        super().__init__(
+            {
+                "os_index": Out(stream.Signature(index_shape)),
+                "bus": Out(
+                    wb.Signature(
+                        addr_width=_word_addr_width(data_width),
+                        data_width=data_width,
+                        granularity=8,
+                        features={"cti", "bte"},
+                    )
+                ),
+                "ready": Out(1),
+                "c_address": In(address_shape),
+                "c_count": In(unsigned(32)),
+                "c_kind": In(IndexKind),
+                "start": In(1),
+            }
         )
-    )
-    ready: Out(1)
-
-    c_address: In(address_shape)
-    c_count: In(unsigned(32))
-    c_kind: In(IndexKind)
-    start: In(1)
+        self.fifo_depth = fifo_depth
 
     def elaborate(self, platform) -> Module:
         m = Module()
 
-        address = Signal.like(self.c_address)
         kind = self.c_kind
         count = self.c_count
 
-        index_increment = Signal(3)
+        m.submodules.fifo = fifo = SyncFIFOBuffered(
+            width=len(self.bus.dat_r), depth=self.fifo_depth
+        )
+
+        offset_bits = exact_log2(self.bus.data_width // 8)
+
+        # indices are unpacked lane by lane from the word at the FIFO head;
+        # the word is popped only after its last lane has been sent
         index_shift = Signal(2)
+        last_lane = Signal(offset_bits)
         with m.Switch(kind):
             with m.Case(IndexKind.U8):
                 m.d.comb += [
-                    index_increment.eq(1),
                     index_shift.eq(0),
+                    last_lane.eq((self.bus.data_width // 8) - 1),
                 ]
             with m.Case(IndexKind.U16):
                 m.d.comb += [
-                    index_increment.eq(2),
                     index_shift.eq(1),
+                    last_lane.eq((self.bus.data_width // 16) - 1),
                 ]
             with m.Case(IndexKind.U32):
                 m.d.comb += [
-                    index_increment.eq(4),
                     index_shift.eq(2),
+                    last_lane.eq((self.bus.data_width // 32) - 1),
                 ]
             with m.Default():
                 m.d.comb += [
-                    index_increment.eq(0),
                     index_shift.eq(0),
+                    last_lane.eq(0),
                 ]
 
-        data_read = Signal.like(self.bus.dat_r)
-
-        offset = address[: exact_log2(self.bus.data_width // 8)]
+        # lane (in units of the index size) of the next index in the head word
+        sub_off = Signal(offset_bits)
+        data_read = fifo.r_data
         extended_data = Signal(index_shape)
 
-        with m.Switch(kind):
-            with m.Case(IndexKind.U8):
-                m.d.comb += extended_data.eq(data_read.word_select(offset[0:], 8))
-            with m.Case(IndexKind.U16):
-                m.d.comb += extended_data.eq(data_read.word_select(offset[1:], 16))
-            with m.Case(IndexKind.U32):
-                m.d.comb += extended_data.eq(data_read.word_select(offset[2:], 32))
+        # shift the selected index down to bit 0, then keep as many bits as
+        # the index kind has
+        byte_off = (sub_off << index_shift)[:offset_bits]
+        shifted = Signal.like(data_read)
+        m.d.comb += shifted.eq(data_read >> Cat(C(0, 3), byte_off))
+        m.d.comb += extended_data.eq(
+            Mux(kind == IndexKind.U8, shifted[:8], shifted[: len(extended_data)])
+        )
 
         cur_idx = Signal.like(count)
 
+        # memory side: words still to be requested and the current burst
+        word_addr = Signal.like(self.bus.adr)
+        words_left = Signal(len(self.c_address) + 1)
+        burst_left = Signal(range(self.fifo_depth + 1))
+
+        first_word = self.c_address[offset_bits:]
+        last_word = (self.c_address + (count << index_shift) - 1)[offset_bits:]
+
         with m.If(self.os_index.ready):
             m.d.sync += self.os_index.valid.eq(0)
 
@@ -104,14 +158,28 @@ class IndexGenerator(wiring.Component):
                 with m.If(self.start):
                     m.d.sync += [
                         cur_idx.eq(0),
-                        address.eq(self.c_address),
+                        sub_off.eq(self.c_address[:offset_bits] >> index_shift),
                     ]
                     with m.If(count == 0):
                         m.next = "IDLE"
                     with m.Elif(kind == IndexKind.NOT_INDEXED):
-                        m.next = "STREAM_NON_INDEXED"
+                        # no memory access needed -> the first index goes out
+                        # in the start cycle already
+                        m.d.sync += [
+                            self.os_index.payload.eq(0),
+                            self.os_index.valid.eq(1),
+                            cur_idx.eq(1),
+                        ]
+                        with m.If(count == 1):
+                            m.next = "WAIT_FLUSH"
+                        with m.Else():
+                            m.next = "STREAM_NON_INDEXED"
                     with m.Else():
-                        m.next = "MEM_READ_INIT"
+                        m.d.sync += [
+                            word_addr.eq(first_word),
+                            words_left.eq(last_word - first_word + 1),
+                        ]
+                        m.next = "INDEX_SEND"
 
             with m.State("STREAM_NON_INDEXED"):
                 with m.If(~self.os_index.valid | self.os_index.ready):
@@ -123,43 +191,68 @@ class IndexGenerator(wiring.Component):
                     with m.If(cur_idx + 1 == count):  # last index streamed
                         m.next = "WAIT_FLUSH"
 
-            with m.State("MEM_READ_INIT"):
-                # initiate memory read
-                m.d.sync += [
-                    self.bus.cyc.eq(1),
-                    self.bus.adr.eq(address[len(offset) :]),
-                    self.bus.we.eq(0),
-                    self.bus.stb.eq(1),
-                    self.bus.sel.eq(~0),
-                ]
-                m.next = "MEM_READ_WAIT"
-            with m.State("MEM_READ_WAIT"):
-                with m.If(self.bus.ack):
-                    m.d.sync += data_read.eq(self.bus.dat_r)
-                    m.d.sync += self.bus.cyc.eq(0)
-                    m.d.sync += self.bus.stb.eq(0)
-                    m.next = "INDEX_SEND"
             with m.State("INDEX_SEND"):
-                with m.If(~self.os_index.valid | self.os_index.ready):
-                    next_addr = address + index_increment
+                with m.If(fifo.r_rdy & (~self.os_index.valid | self.os_index.ready)):
                     m.d.sync += [
                         self.os_index.payload.eq(extended_data),
                         self.os_index.valid.eq(1),
-                        address.eq(next_addr),
+                        sub_off.eq(sub_off + 1),
                         cur_idx.eq(cur_idx + 1),
                     ]
                     with m.If(cur_idx + 1 == count):
+                        m.d.comb += fifo.r_en.eq(1)
                         m.next = "WAIT_FLUSH"
-                    with m.Elif(next_addr[: len(offset)] != 0):
-                        m.next = "INDEX_SEND"
-                    with m.Else():
-                        m.next = (
-                            "MEM_READ_INIT"  # crossed word boundary -> read next word
-                        )
+                    with m.Elif(sub_off == last_lane):
+                        # last lane of the word -> continue with the next word
+                        m.d.comb += fifo.r_en.eq(1)
+                        m.d.sync += sub_off.eq(0)
             with m.State("WAIT_FLUSH"):
                 with m.If(~self.os_index.valid | self.os_index.ready):
                     m.next = "IDLE"
 
+        m.d.comb += self.bus.bte.eq(wb.BurstTypeExt.LINEAR)
+
+        # The FIFO is double-buffered: a burst refills one half of it while the
+        # indices of the other half are still being sent.
+        burst_max = self.fifo_depth // 2
+
+        with m.FSM():
+            with m.State("MEM_IDLE"):
+                with m.If(
+                    (words_left != 0) & (fifo.level <= self.fifo_depth - burst_max)
+                ):
+                    m.d.sync += burst_left.eq(
+                        Mux(words_left < burst_max, words_left, burst_max)
+                    )
+                    m.next = "MEM_READ"
+            with m.State("MEM_READ"):
+                m.d.comb += [
+                    self.bus.cyc.eq(1),
+                    self.bus.stb.eq(1),
+                    self.bus.we.eq(0),
+                    self.bus.adr.eq(word_addr),
+                    self.bus.sel.eq(~0),
+                    self.bus.cti.eq(
+                        Mux(
+                            burst_left == 1,
+                            wb.CycleType.END_OF_BURST,
+                            wb.CycleType.INCR_BURST,
+                        )
+                    ),
+                ]
+                with m.If(self.bus.ack):
+                    m.d.comb += [
+                        fifo.w_data.eq(self.bus.dat_r),
+                        fifo.w_en.eq(1),
+                    ]
+                    m.d.sync += [
+                        word_addr.eq(word_addr + 1),
+                        words_left.eq(words_left - 1),
+                        burst_left.eq(burst_left - 1),
+                    ]
+                    with m.If(burst_left == 1):
+                        m.next = "MEM_IDLE"
+
         return m
 
 
@@ -167,6 +260,10 @@ class InputTopologyProcessor(wiring.Component):
     """Processes input topology description.
 
     Gets input index stream and outputs vertex index stream based on input topology.
+
+    ``is_index.ready`` only depends on the fill level of the internal output
+    queue, not on ``os_index.ready``. ``ready`` is asserted when the queue is
+    empty, i.e. when the configuration may be changed.
     """
 
     is_index: In(stream.Signature(index_shape))
@@ -188,26 +285,41 @@ class InputTopologyProcessor(wiring.Component):
         v1 = Signal(index_shape)
         v2 = Signal(index_shape)
         vertex_count = Signal(2)
+        strip_parity = Signal()  # even triangle of a triangle strip
 
         # max 3 output indices per input index
         max_amplification = 3
-        to_send = Array(Signal(index_shape) for _ in range(max_amplification))
-        to_send_left = Signal(2)
+
+        # Output queue: a whole primitive is pushed in one cycle, one index is
+        # popped per cycle. A new input is accepted whenever the queue has room
+        # for the largest primitive, independently of the output handshake.
+        queue_depth = 4
+        queue = Array(Signal(index_shape) for _ in range(queue_depth))
+        rd_ptr = Signal(range(queue_depth))
+        level = Signal(range(queue_depth + 1))
+
+        push = [Signal(index_shape, name=f"push_{i}") for i in range(max_amplification)]
+        push_n = Signal(range(max_amplification + 1))
+        pop = Signal()
 
         ready_for_input = Signal()
 
-        m.d.comb += self.ready.eq(ready_for_input)
-        m.d.comb += ready_for_input.eq(to_send_left == 0)
+        m.d.comb += [
+            ready_for_input.eq(level <= queue_depth - max_amplification),
+            self.ready.eq(level == 0),
+            self.os_index.valid.eq(level != 0),
+            self.os_index.payload.eq(queue[rd_ptr] + self.c_base_vertex),
+            pop.eq(self.os_index.valid & self.os_index.ready),
+        ]
+
+        wr_ptr = (rd_ptr + level)[: len(rd_ptr)]
+        for i in range(max_amplification):
+            with m.If(i < push_n):
+                m.d.sync += queue[(wr_ptr + i)[: len(rd_ptr)]].eq(push[i])
 
-        with m.Switch(to_send_left):
-            for i in range(1, max_amplification + 1):
-                with m.Case(i):
-                    m.d.comb += self.os_index.payload.eq(
-                        to_send[i - 1] + self.c_base_vertex
-                    )
-                    m.d.comb += self.os_index.valid.eq(1)
-                    with m.If(self.os_index.ready):
-                        m.d.sync += to_send_left.eq(i - 1)
+        m.d.sync += level.eq(level + push_n - pop)
+        with m.If(pop):
+            m.d.sync += rd_ptr.eq(rd_ptr + 1)
 
         m.d.comb += self.is_index.ready.eq(ready_for_input)
 
@@ -218,13 +330,16 @@ class InputTopologyProcessor(wiring.Component):
                 self.c_primitive_restart_enable
                 & (idx == self.c_primitive_restart_index)
             ):
-                m.d.sync += vertex_count.eq(0)  # reset on primitive restart
+                m.d.sync += [
+                    vertex_count.eq(0),  # reset on primitive restart
+                    strip_parity.eq(0),
+                ]
             with m.Else():
                 with m.Switch(self.c_input_topology):
                     with m.Case(InputTopology.POINT_LIST):
-                        m.d.sync += [
-                            to_send[0].eq(idx),
-                            to_send_left.eq(1),
+                        m.d.comb += [
+                            push[0].eq(idx),
+                            push_n.eq(1),
                         ]
                     with m.Case(InputTopology.LINE_LIST):
                         with m.Switch(vertex_count):
@@ -234,12 +349,12 @@ class InputTopologyProcessor(wiring.Component):
                                     vertex_count.eq(1),
                                 ]
                             with m.Case(1):
-                                m.d.sync += [
-                                    to_send[1].eq(v1),
-                                    to_send[0].eq(idx),
-                                    to_send_left.eq(2),
-                                    vertex_count.eq(0),
+                                m.d.comb += [
+                                    push[0].eq(v1),
+                                    push[1].eq(idx),
+                                    push_n.eq(2),
                                 ]
+                                m.d.sync += vertex_count.eq(0)
                     with m.Case(InputTopology.TRIANGLE_LIST):
                         with m.Switch(vertex_count):
                             with m.Case(0):
@@ -253,13 +368,13 @@ class InputTopologyProcessor(wiring.Component):
                                     vertex_count.eq(2),
                                 ]
                             with m.Case(2):
-                                m.d.sync += [
-                                    to_send[2].eq(v1),
-                                    to_send[1].eq(v2),
-                                    to_send[0].eq(idx),
-                                    to_send_left.eq(3),
-                                    vertex_count.eq(0),
+                                m.d.comb += [
+                                    push[0].eq(v1),
+                                    push[1].eq(v2),
+                                    push[2].eq(idx),
+                                    push_n.eq(3),
                                 ]
+                                m.d.sync += vertex_count.eq(0)
                     with m.Case(InputTopology.LINE_STRIP):
                         with m.If(vertex_count == 0):
                             m.d.sync += [
@@ -267,12 +382,12 @@ class InputTopologyProcessor(wiring.Component):
                                 vertex_count.eq(1),
                             ]
                         with m.Else():
-                            m.d.sync += [
-                                to_send[1].eq(v1),
-                                to_send[0].eq(idx),
-                                to_send_left.eq(2),
-                                v1.eq(idx),
+                            m.d.comb += [
+                                push[0].eq(v1),
+                                push[1].eq(idx),
+                                push_n.eq(2),
                             ]
+                            m.d.sync += v1.eq(idx)
                     with m.Case(InputTopology.TRIANGLE_STRIP):
                         with m.Switch(vertex_count):
                             with m.Case(0):
@@ -286,25 +401,16 @@ class InputTopologyProcessor(wiring.Component):
                                     vertex_count.eq(2),
                                 ]
                             with m.Case(2):
-                                # Odd triangle -> indexes n, n+1, n+2
-                                # so v1, v2, idx
-                                m.d.sync += [
-                                    to_send[2].eq(v1),
-                                    to_send[1].eq(v2),
-                                    to_send[0].eq(idx),
-                                    to_send_left.eq(3),
-                                    vertex_count.eq(3),
-                                    v1.eq(v2),
-                                    v2.eq(idx),
+                                # odd triangles -> v1, v2, idx
+                                # even triangles -> v2, v1, idx (keeps winding)
+                                m.d.comb += [
+                                    push[0].eq(Mux(strip_parity, v2, v1)),
+                                    push[1].eq(Mux(strip_parity, v1, v2)),
+                                    push[2].eq(idx),
+                                    push_n.eq(3),
                                 ]
-                            with m.Case(3):
-                                # Even triangle -> indexes n+1, n, n+2
-                                # so v2, v1, idx
                                 m.d.sync += [
-                                    to_send[2].eq(v2),
-                                    to_send[1].eq(v1),
-                                    to_send[0].eq(idx),
-                                    to_send_left.eq(3),
+                                    strip_parity.eq(~strip_parity),
                                     v1.eq(v2),
                                     v2.eq(idx),
                                 ]
@@ -321,13 +427,13 @@ class InputTopologyProcessor(wiring.Component):
                                     vertex_count.eq(2),
                                 ]
                             with m.Default():
-                                m.d.sync += [
-                                    to_send[2].eq(v1),  # center vertex
-                                    to_send[1].eq(v2),  # previous outer vertex
-                                    to_send[0].eq(idx),  # current outer vertex
-                                    to_send_left.eq(3),
-                                    v2.eq(idx),
+                                m.d.comb += [
+                                    push[0].eq(v1),  # center vertex
+                                    push[1].eq(v2),  # previous outer vertex
+                                    push[2].eq(idx),  # current outer vertex
+                                    push_n.eq(3),
                                 ]
+                                m.d.sync += v2.eq(idx)
                     with m.Default():
                         m.d.sync += Assert(
                             0, "unsupported topology"
@@ -336,6 +442,93 @@ class InputTopologyProcessor(wiring.Component):
         return m
 
 
+class VertexCacheTags(wiring.Component):
+    """Tag half of the post-transform vertex cache.
+
+    Placed between ``InputTopologyProcessor`` and ``InputAssembly``. Remembers
+    the indices of the last ``vertex_cache_depth`` vertices sent down the
+    pipeline (FIFO replacement). Only misses are forwarded on ``os_index`` to
+    be fetched, transformed and shaded; each index additionally produces an
+    entry on ``os_lookup`` that tells ``PrimitiveAssembly`` which cache slot
+    holds (or is to hold) the vertex.
+
+    Lookups are queued in a FIFO, so it has to cover the latency of the
+    vertex stages for misses to stream back to back.
+
+    ``flush`` invalidates all entries; it has to be pulsed whenever the vertex
+    configuration changes, e.g. at the start of each draw.
+
+    Parameters
+    ----------
+    lookup_depth: int
+        Depth of the lookup queue towards primitive assembly.
+    """
+
+    is_index: In(stream.Signature(index_shape))
+    os_index: Out(stream.Signature(index_shape))
+    os_lookup: Out(stream.Signature(VertexCacheLookupLayout))
+    ready: Out(1)
+
+    flush: In(1)
+
+    def __init__(self, lookup_depth: int = 32):
+        super().__init__()
+        self.lookup_depth = lookup_depth
+
+    def elaborate(self, platform) -> Module:
+        m = Module()
+
+        m.submodules.fifo = fifo = SyncFIFOBuffered(
+            width=Shape.cast(VertexCacheLookupLayout).width, depth=self.lookup_depth
+        )
+
+        tags = Array(
+            Signal(index_shape, name=f"tag_{i}") for i in range(vertex_cache_depth)
+        )
+        tag_valid = Signal(vertex_cache_depth)
+        next_slot = Signal(range(vertex_cache_depth))
+
+        idx = self.is_index.payload
+        hits = Cat(tag_valid[i] & (tags[i] == idx) for i in range(vertex_cache_depth))
+        hit = hits.any()
+        hit_slot = Signal(range(vertex_cache_depth))
+        for i in range(vertex_cache_depth):
+            with m.If(hits[i]):
+                m.d.comb += hit_slot.eq(i)
+
+        lookup = Signal(VertexCacheLookupLayout)
+        accept = Signal()
+
+        m.d.comb += [
+            lookup.hit.eq(hit),
+            lookup.slot.eq(Mux(hit, hit_slot, next_slot)),
+            self.os_index.payload.eq(idx),
+            self.os_index.valid.eq(self.is_index.valid & ~hit & fifo.w_rdy),
+            self.is_index.ready.eq(fifo.w_rdy & (hit | self.os_index.ready)),
+            accept.eq(self.is_index.valid & self.is_index.ready),
+            fifo.w_data.eq(lookup),
+            fifo.w_en.eq(accept),
+            self.os_lookup.payload.eq(fifo.r_data),
+            self.os_lookup.valid.eq(fifo.r_rdy),
+            fifo.r_en.eq(self.os_lookup.ready),
+            self.ready.eq(fifo.level == 0),
+        ]
+
+        with m.If(accept & ~hit):
+            m.d.sync += [
+                tags[next_slot].eq(idx),
+                tag_valid.bit_select(next_slot, 1).eq(1),
+                next_slot.eq(
+                    Mux(next_slot == vertex_cache_depth - 1, 0, next_slot + 1)
+                ),
+            ]
+
+        with m.If(self.flush):
+            m.d.sync += tag_valid.eq(0)
+
+        return m
+
+
 class InputAssemblyAttrConfigLayout(data.Struct):
     """Single vertex attribute configuration"""
 
@@ -349,21 +542,49 @@ class InputAssembly(wiring.Component):
     Gets index stream and outputs vertex attribute stream.
 
     Takes configuration for vertex attributes including position, normal, texcoords, and color.
-    Each attribute can be constant or per-vertex.
+    Each attribute can be constant, per-vertex or disabled (not fetched, reads as
+    (0, 0, 0, 1)).
+
+    Components of a per-vertex attribute are fetched with a single incrementing
+    Wishbone burst.
 
     TODO: support other formats than Fixed 16.16
-    TODO: add memory burst support
-    """
 
-    is_index: In(stream.Signature(index_shape))
-    os_vertex: Out(stream.Signature(VertexLayout))
-    bus: Out(wb.Signature(addr_width=wb_bus_addr_width, data_width=wb_bus_data_width))
-    ready: Out(1)
+    Parameters
+    ----------
+    data_width: int
+        Width of the memory bus. Components are selected from the bus word by address.
+    """
 
-    c_pos: In(InputAssemblyAttrConfigLayout)
-    c_norm: In(InputAssemblyAttrConfigLayout)
-    c_tex: In(InputAssemblyAttrConfigLayout).array(num_textures)
-    c_col: In(InputAssemblyAttrConfigLayout)
+    is_index: stream.Interface
+    os_vertex: stream.Interface
+    bus: wb.Interface
+    ready: Signal
+
+    c_pos: Value
+    c_norm: Value
+    c_tex: list[Value]
+    c_col: Value
+
+    def __init__(self, data_width: int = wb_bus_data_width):
+        super().__init__(
+            {
+                "is_index": In(stream.Signature(index_shape)),
+                "os_vertex": Out(stream.Signature(VertexLayout)),
+                "bus": Out(
+                    wb.Signature(
+                        addr_width=_word_addr_width(data_width),
+                        data_width=data_width,
+                        features={"cti", "bte"},
+                    )
+                ),
+                "ready": Out(1),
+                "c_pos": In(InputAssemblyAttrConfigLayout),
+                "c_norm": In(InputAssemblyAttrConfigLayout),
+                "c_tex": In(InputAssemblyAttrConfigLayout).array(num_textures),
+                "c_col": In(InputAssemblyAttrConfigLayout),
+            }
+        )
 
     def elaborate(self, platform) -> Module:
         m = Module()
@@ -372,108 +593,232 @@ class InputAssembly(wiring.Component):
 
         idx = Signal.like(self.is_index.payload)
         vtx = Signal.like(self.os_vertex.payload)
+        out_vtx = Signal.like(vtx)
 
         addr = Signal.like(self.c_pos.info.per_vertex.address)
+        offset_bits = exact_log2(self.bus.data_width // 8)
+
+        # 4 bytes per component (Fixed point 16.16)
+        component_width = FixedPoint_mem.as_shape().width
+        lanes = self.bus.data_width // component_width
+        lane = addr[2:offset_bits]
+        comp = Signal(range(4 + lanes))  # components already read
+
+        # Completed vertices are queued, so fetching of the next vertex starts
+        # while the previous ones still wait for the consumer.
+        m.submodules.out_fifo = out_fifo = SyncFIFOBuffered(
+            width=len(vtx.as_value()), depth=2
+        )
+        m.d.comb += [
+            self.os_vertex.payload.eq(out_fifo.r_data),
+            self.os_vertex.valid.eq(out_fifo.r_rdy),
+            out_fifo.r_en.eq(self.os_vertex.ready),
+        ]
 
-        output_next_free = ~self.os_vertex.valid | self.os_vertex.ready
-
-        with m.If(self.os_vertex.ready):
-            m.d.sync += self.os_vertex.valid.eq(0)
+        m.d.comb += self.bus.bte.eq(wb.BurstTypeExt.LINEAR)
 
         @dataclass
         class AttrInfo:
             config: InputAssemblyAttrConfigLayout
             data_v: Signal
+            out_v: Signal
 
             @property
             def components(self) -> int:
                 return len(self.data_v)
 
         attr_info = [
-            AttrInfo(config=self.c_pos, data_v=vtx.position),
-            AttrInfo(config=self.c_norm, data_v=vtx.normal),
+            AttrInfo(config=self.c_pos, data_v=vtx.position, out_v=out_vtx.position),
+            AttrInfo(config=self.c_norm, data_v=vtx.normal, out_v=out_vtx.normal),
             *[
-                AttrInfo(config=self.c_tex[i], data_v=vtx.texcoords[i])
+                AttrInfo(
+                    config=self.c_tex[i],
+                    data_v=vtx.texcoords[i],
+                    out_v=out_vtx.texcoords[i],
+                )
                 for i in range(num_textures)
             ],
-            AttrInfo(config=self.c_col, data_v=vtx.color),
+            AttrInfo(config=self.c_col, data_v=vtx.color, out_v=out_vtx.color),
         ]
 
+        # constant and disabled attributes are never stored, they are muxed
+        # into the output vertex
+        disabled_value = Vector4_mem.const([0.0, 0.0, 0.0, 1.0])
+        for attr in attr_info:
+            with m.Switch(attr.config.mode):
+                with m.Case(InputMode.CONSTANT):
+                    m.d.comb += [
+                        attr.out_v[i].eq(attr.config.info.constant_value[i])
+                        for i in range(attr.components)
+                    ]
+                with m.Case(InputMode.PER_VERTEX):
+                    m.d.comb += attr.out_v.eq(attr.data_v)
+                with m.Default():
+                    m.d.comb += [
+                        attr.out_v[i].eq(disabled_value[i])
+                        for i in range(attr.components)
+                    ]
+
+        # only one attribute is fetched at a time, so the address of the
+        # selected attribute is computed by a single shared multiply-add
+        attr_sel = Signal(range(len(attr_info)))
+        attr_base = Array(a.config.info.per_vertex.address for a in attr_info)
+        attr_stride = Array(a.config.info.per_vertex.stride for a in attr_info)
+
+        # Indices mostly advance by one (or repeat) between vertices, so the
+        # address of the last fetched vertex is kept per attribute and stepped
+        # by the stride. The multiplier is only used on a discontinuity; its
+        # result is registered, which takes it off the critical path.
+        last_idx = Array(Signal(index_shape) for _ in attr_info)
+        last_addr = Array(Signal.like(addr) for _ in attr_info)
+        last_valid = Signal(len(attr_info))
+
+        offset = Signal.like(addr)
+        m.d.sync += offset.eq(idx * attr_stride[attr_sel])
+
+        idx_delta = Signal(index_shape)
+        m.d.comb += idx_delta.eq(idx - last_idx[attr_sel])
+
+        step_addr = Signal.like(addr)
+        step_hit = Signal()
+        with m.Switch(idx_delta):
+            with m.Case(0):
+                m.d.comb += step_addr.eq(last_addr[attr_sel])
+            with m.Case(1):
+                m.d.comb += step_addr.eq(last_addr[attr_sel] + attr_stride[attr_sel])
+            with m.Case((1 << len(idx_delta)) - 1):  # -1
+                m.d.comb += step_addr.eq(last_addr[attr_sel] - attr_stride[attr_sel])
+        m.d.comb += step_hit.eq(
+            last_valid.bit_select(attr_sel, 1)
+            & ((idx_delta == 0) | (idx_delta == 1) | idx_delta.all())
+        )
+
+        # next per-vertex attribute to fetch; constant attributes are skipped
+        # in the same cycle
+        per_vertex_mask = Cat(a.config.mode == InputMode.PER_VERTEX for a in attr_info)
+        remaining = Signal(len(attr_info))
+        next_sel = Signal.like(attr_sel)
+        next_valid = Signal()
+        m.d.comb += remaining.eq(per_vertex_mask)
+        for attr_no in reversed(range(len(attr_info))):
+            with m.If(remaining[attr_no]):
+                m.d.comb += [
+                    next_sel.eq(attr_no),
+                    next_valid.eq(1),
+                ]
+
+        def fetch_next():
+            with m.If(next_valid):
+                m.d.sync += attr_sel.eq(next_sel)
+                m.next = "FETCH_START"
+            with m.Else():
+                m.next = "SEND"
+
+        attr_components = Array(C(a.components) for a in attr_info)
+
         with m.FSM():
             with m.State("IDLE"):
                 m.d.comb += [
-                    self.ready.eq(1),
+                    self.ready.eq(out_fifo.level == 0),
                     self.is_index.ready.eq(1),
                 ]
 
+                # configuration may change while idle
+                with m.If(self.ready):
+                    m.d.sync += last_valid.eq(0)
+
                 with m.If(self.is_index.valid):
                     m.d.sync += idx.eq(self.is_index.payload)
-                    m.next = "FETCH_ATTR_0_START"
-
-            for attr_no, attr in enumerate(attr_info):
-                base_name = f"FETCH_ATTR_{attr_no}"
-                with m.State(f"{base_name}_START"):
-                    config = attr.config
-                    with m.Switch(config.mode):
-                        with m.Case(InputMode.CONSTANT):
-                            # constant value
-                            m.d.sync += [
-                                attr.data_v[i].eq(config.info.constant_value[i])
-                                for i in range(attr.components)
-                            ]
-                            m.next = f"{base_name}_DONE"
-                        with m.Case(InputMode.PER_VERTEX):
-                            # per-vertex attribute
-                            base_addr = config.info.per_vertex.address
-                            stride = config.info.per_vertex.stride
-                            m.d.sync += addr.eq(base_addr + idx * stride)
-                            m.next = f"{base_name}_MEM_READ_COMPONENT_0"
-
-                for i in range(attr.components):
-                    with m.State(f"{base_name}_MEM_READ_COMPONENT_{i}"):
-                        # initiate memory read
-                        m.d.sync += [
-                            self.bus.cyc.eq(1),
-                            self.bus.adr.eq(addr // (self.bus.data_width // 8)),
-                            self.bus.we.eq(0),
-                            self.bus.stb.eq(1),
-                            self.bus.sel.eq(~0),
-                        ]
-                        m.next = f"{base_name}_MEM_WAIT_{i}"
+                    fetch_next()
 
-                    with m.State(f"{base_name}_MEM_WAIT_{i}"):
-                        with m.If(self.bus.ack):
-                            # parse and store
-                            m.d.sync += attr.data_v[i].eq(
-                                FixedPoint_mem(self.bus.dat_r)
-                            )
+            with m.State("FETCH_START"):
+                # only entered for per-vertex attributes
+                m.d.sync += comp.eq(0)
+                with m.If(step_hit):
+                    m.d.sync += [
+                        addr.eq(step_addr),
+                        last_addr[attr_sel].eq(step_addr),
+                        last_idx[attr_sel].eq(idx),
+                    ]
+                    m.next = "MEM_READ"
+                with m.Else():
+                    m.next = "FETCH_SEEK"
 
-                            # deassert memory access
-                            m.d.sync += [
-                                self.bus.cyc.eq(0),
-                                self.bus.stb.eq(0),
-                            ]
+            with m.State("FETCH_SEEK"):
+                # index discontinuity -> use the registered product
+                m.d.sync += [
+                    addr.eq(attr_base[attr_sel] + offset),
+                    last_addr[attr_sel].eq(attr_base[attr_sel] + offset),
+                    last_idx[attr_sel].eq(idx),
+                    last_valid.bit_select(attr_sel, 1).eq(1),
+                ]
+                m.next = "MEM_READ"
 
-                            if i + 1 < attr.components:
-                                # next component
+            with m.State("MEM_READ"):
+                # all components of the attribute are read in one burst;
+                # each beat delivers the components from `lane` to the end
+                # of the bus word
+                taken = lanes - lane
+                last_beat = comp + taken >= attr_components[attr_sel]
 
-                                # 4 bytes per component (Fixed point 16.16)
-                                m.d.sync += addr.eq(addr + 4)
-                                m.next = f"{base_name}_MEM_READ_COMPONENT_{i + 1}"
-                            else:
-                                # all components read
-                                m.next = f"{base_name}_DONE"
+                m.d.comb += [
+                    self.bus.cyc.eq(1),
+                    self.bus.stb.eq(1),
+                    self.bus.we.eq(0),
+                    self.bus.adr.eq(addr[offset_bits:]),
+                    self.bus.sel.eq(~0),
+                    self.bus.cti.eq(
+                        Mux(
+                            last_beat,
+                            wb.CycleType.END_OF_BURST,
+                            wb.CycleType.INCR_BURST,
+                        )
+                    ),
+                ]
 
-                with m.State(f"{base_name}_DONE"):
-                    if attr_no == len(attr_info) - 1:
-                        # last attribute -> output vertex
-                        with m.If(output_next_free):
-                            m.d.sync += [
-                                self.os_vertex.payload.eq(vtx),
-                                self.os_vertex.valid.eq(1),
-                            ]
-                            m.next = "IDLE"
-                    else:
-                        m.next = f"FETCH_ATTR_{attr_no + 1}_START"
+                # only attributes after the current one are left
+                m.d.comb += remaining.eq(per_vertex_mask & ~((2 << attr_sel) - 1))
+
+                with m.If(self.bus.ack):
+                    # parse and store
+                    with m.Switch(attr_sel):
+                        for attr_no, attr in enumerate(attr_info):
+                            with m.Case(attr_no):
+                                for i in range(lanes):
+                                    with m.If(lane <= i):
+                                        with m.Switch(comp + i - lane):
+                                            for c in range(attr.components):
+                                                with m.Case(c):
+                                                    m.d.sync += attr.data_v[c].eq(
+                                                        FixedPoint_mem(
+                                                            self.bus.dat_r.word_select(
+                                                                i, component_width
+                                                            )
+                                                        )
+                                                    )
+
+                    # continue at the start of the next bus word
+                    m.d.sync += [
+                        comp.eq(comp + taken),
+                        addr.eq(Cat(C(0, offset_bits), addr[offset_bits:] + 1)),
+                    ]
+
+                    with m.If(last_beat):
+                        # all components read
+                        fetch_next()
+
+            with m.State("SEND"):
+                # output vertex and continue with the next index
+                with m.If(out_fifo.w_rdy):
+                    m.d.comb += [
+                        out_fifo.w_data.eq(out_vtx),
+                        out_fifo.w_en.eq(1),
+                        self.is_index.ready.eq(1),
+                    ]
+                    with m.If(self.is_index.valid):
+                        m.d.sync += idx.eq(self.is_index.payload)
+                        fetch_next()
+                    with m.Else():
+                        m.next = "IDLE"
 
         return m
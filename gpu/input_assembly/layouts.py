@@ -5,9 +5,11 @@ from ..utils.types import Vector4_mem, address_shape, stride_shape
 __all__ = ["InputMode", "InputData"]
 
 
-class InputMode(enum.Enum, shape=1):
+class InputMode(enum.Enum, shape=2):
     CONSTANT = 0
     PER_VERTEX = 1
+    # not fetched nor configured; reads as (0, 0, 0, 1)
+    DISABLED = 2
 
 
 class PerVertexData(data.Struct):
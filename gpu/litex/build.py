@@ -4,10 +4,54 @@ This module generates Verilog from all Amaranth GPU components for consumption
 by the LiteX wrappers.
 """
 
+from functools import cache
+from importlib import import_module
 from pathlib import Path
 
 from amaranth.back import verilog
 
+# Component name -> (module, class)
+COMPONENTS = {
+    "IndexGenerator": ("gpu.input_assembly.cores", "IndexGenerator"),
+    "InputTopologyProcessor": ("gpu.input_assembly.cores", "InputTopologyProcessor"),
+    "InputAssembly": ("gpu.input_assembly.cores", "InputAssembly"),
+    "VertexTransform": ("gpu.vertex_transform.cores", "VertexTransform"),
+    "VertexShading": ("gpu.vertex_shading.cores", "VertexShading"),
+    "PrimitiveAssembly": ("gpu.primitive_assembly.cores", "PrimitiveAssembly"),
+    "PrimitiveClipper": ("gpu.rasterizer.cores", "PrimitiveClipper"),
+    "TriangleRasterizer": ("gpu.rasterizer.rasterizer", "TriangleRasterizer"),
+    "Texturing": ("gpu.pixel_shading.cores", "Texturing"),
+    "DepthStencilTest": ("gpu.pixel_shading.cores", "DepthStencilTest"),
+    "SwapchainOutput": ("gpu.pixel_shading.cores", "SwapchainOutput"),
+}
+
+
+def _component_args(component_name):
+    from gpu.utils.layouts import fetch_bus_data_width
+
+    # Index and vertex fetch go through the wide f2h_sdram port
+    return {
+        "IndexGenerator": {"data_width": fetch_bus_data_width},
+        "InputAssembly": {"data_width": fetch_bus_data_width},
+    }.get(component_name, {})
+
+
+@cache
+def _convert(component_name):
+    """Elaborate a component once per process and return its Verilog."""
+    module_name, class_name = COMPONENTS[component_name]
+    component_cls = getattr(import_module(module_name), class_name)
+    component = component_cls(**_component_args(component_name))
+    return verilog.convert(component, name=component_name)
+
+
+def _write(component_name, output_path):
+    verilog_text = _convert(component_name)
+    output_file = output_path / f"{component_name}.v"
+    with open(output_file, "w") as f:
+        f.write(verilog_text)
+    return str(output_file)
+
 
 def generate_all_verilog(output_dir="build/gpu_verilog"):
     """Generate Verilog from all GPU pipeline components.
@@ -23,52 +67,11 @@ def generate_all_verilog(output_dir="build/gpu_verilog"):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    # Import all components
-    from gpu.input_assembly.cores import (
-        IndexGenerator,
-        InputAssembly,
-        InputTopologyProcessor,
-    )
-    from gpu.pixel_shading.cores import DepthStencilTest, SwapchainOutput, Texturing
-    from gpu.primitive_assembly.cores import PrimitiveAssembly
-    from gpu.rasterizer.cores import PrimitiveClipper
-    from gpu.rasterizer.rasterizer import TriangleRasterizer
-    from gpu.vertex_shading.cores import VertexShading
-    from gpu.vertex_transform.cores import VertexTransform
-
-    components = {
-        "IndexGenerator": IndexGenerator,
-        "InputTopologyProcessor": InputTopologyProcessor,
-        "InputAssembly": InputAssembly,
-        "VertexTransform": VertexTransform,
-        "VertexShading": VertexShading,
-        "PrimitiveAssembly": PrimitiveAssembly,
-        "PrimitiveClipper": PrimitiveClipper,
-        "TriangleRasterizer": TriangleRasterizer,
-        "Texturing": Texturing,
-        "DepthStencilTest": DepthStencilTest,
-        "SwapchainOutput": SwapchainOutput,
-    }
-
     generated_files = {}
 
-    for name, component_cls in components.items():
+    for name in COMPONENTS:
         try:
-            # Instantiate the component
-            component = component_cls()
-
-            # Convert to Verilog
-            verilog_text = verilog.convert(
-                component,
-                name=name,
-            )
-
-            # Write to file
-            output_file = output_path / f"{name}.v"
-            with open(output_file, "w") as f:
-                f.write(verilog_text)
-
-            generated_files[name] = str(output_file)
+            generated_files[name] = _write(name, output_path)
             print(f"✓ Generated {name}.v")
 
         except Exception as e:
@@ -92,48 +95,13 @@ def generate_verilog(component_name, output_dir="build/gpu_verilog"):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    # Component mapping
-    component_map = {
-        "IndexGenerator": ("gpu.input_assembly.cores", "IndexGenerator"),
-        "InputTopologyProcessor": (
-            "gpu.input_assembly.cores",
-            "InputTopologyProcessor",
-        ),
-        "InputAssembly": ("gpu.input_assembly.cores", "InputAssembly"),
-        "VertexTransform": ("gpu.vertex_transform.cores", "VertexTransform"),
-        "VertexShading": ("gpu.vertex_shading.cores", "VertexShading"),
-        "PrimitiveAssembly": ("gpu.primitive_assembly.cores", "PrimitiveAssembly"),
-        "PrimitiveClipper": ("gpu.rasterizer.cores", "PrimitiveClipper"),
-        "TriangleRasterizer": ("gpu.rasterizer.rasterizer", "TriangleRasterizer"),
-        "Texturing": ("gpu.pixel_shading.cores", "Texturing"),
-        "DepthStencilTest": ("gpu.pixel_shading.cores", "DepthStencilTest"),
-        "SwapchainOutput": ("gpu.pixel_shading.cores", "SwapchainOutput"),
-    }
-
-    if component_name not in component_map:
+    if component_name not in COMPONENTS:
         raise ValueError(f"Unknown component: {component_name}")
 
-    module_name, class_name = component_map[component_name]
-
     try:
-        # Dynamic import
-        module = __import__(module_name, fromlist=[class_name])
-        component_cls = getattr(module, class_name)
-
-        # Instantiate and convert
-        component = component_cls()
-        verilog_text = verilog.convert(
-            component,
-            name=component_name,
-        )
-
-        # Write to file
-        output_file = output_path / f"{component_name}.v"
-        with open(output_file, "w") as f:
-            f.write(verilog_text)
-
+        output_file = _write(component_name, output_path)
         print(f"Generated {component_name}.v at {output_file}")
-        return str(output_file)
+        return output_file
 
     except Exception as e:
         print(f"Failed to generate {component_name}: {e}")
@@ -12,8 +12,8 @@ class LiteXIndexGenerator(LiteXModule, AutoCSR):
     """LiteX wrapper for the IndexGenerator stage."""
 
     def __init__(self, platform=None, verilog_path="index_generator.v"):
-        # Wishbone master bus for index buffer reads
-        self.bus = wishbone.Interface(data_width=32, adr_width=30)
+        # Wishbone master bus for index buffer reads (64-bit, like the HPS f2h_sdram port)
+        self.bus = wishbone.Interface(data_width=64, adr_width=29)
 
         # Stream source (indices)
         self.source_index = stream.Endpoint(index_layout)
@@ -46,6 +46,8 @@ class LiteXIndexGenerator(LiteXModule, AutoCSR):
             "o_bus__cyc": self.bus.cyc,
             "o_bus__stb": self.bus.stb,
             "i_bus__ack": self.bus.ack,
+            "o_bus__cti": self.bus.cti,
+            "o_bus__bte": self.bus.bte,
             # Stream output (os_index)
             "o_os_index__valid": self.source_index.valid,
             "i_os_index__ready": self.source_index.ready,
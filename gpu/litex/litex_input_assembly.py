@@ -5,6 +5,7 @@ from litex.soc.interconnect import stream, wishbone
 from litex.soc.interconnect.csr import *
 from migen import *
 
+from ..utils.layouts import num_textures
 from .stream_defs import index_layout, vertex_layout
 
 
@@ -12,8 +13,8 @@ class LiteXInputAssembly(LiteXModule, AutoCSR):
     """LiteX wrapper for the InputAssembly stage."""
 
     def __init__(self, platform=None, verilog_path="input_assembly.v"):
-        # Wishbone master bus for vertex buffer reads
-        self.bus = wishbone.Interface(data_width=32, adr_width=30)
+        # Wishbone master bus for vertex buffer reads (64-bit, like the HPS f2h_sdram port)
+        self.bus = wishbone.Interface(data_width=64, adr_width=29)
 
         # Stream sink/source (indices → vertices)
         self.sink_index = stream.Endpoint(index_layout)
@@ -23,21 +24,20 @@ class LiteXInputAssembly(LiteXModule, AutoCSR):
         self._ready = CSRStatus(1, description="Input assembly ready")
 
         # Vertex attribute configuration
-        self._pos_offset = CSRStorage(
-            16, description="Position attribute offset in bytes"
-        )
-        self._pos_stride = CSRStorage(
-            16, description="Position attribute stride in bytes"
-        )
-        self._pos_format = CSRStorage(4, description="Position attribute format")
-
-        self._norm_offset = CSRStorage(16, description="Normal attribute offset")
-        self._norm_stride = CSRStorage(16, description="Normal attribute stride")
-        self._norm_format = CSRStorage(4, description="Normal attribute format")
-
-        self._col_offset = CSRStorage(16, description="Color attribute offset")
-        self._col_stride = CSRStorage(16, description="Color attribute stride")
-        self._col_format = CSRStorage(4, description="Color attribute format")
+        #
+        # InputData is a union, so it is split into 32-bit words: words 0/1 hold
+        # either address/stride or constant x/y, words 2/3 only constant z/w.
+        # A per-vertex attribute only needs its mode and the first two words
+        # written, a disabled attribute only its mode.
+        attr_cfg = {
+            name: self._attr_csrs(name, desc)
+            for name, desc in [
+                ("pos", "Position"),
+                ("norm", "Normal"),
+                *[(f"tex{i}", f"Texcoord {i}") for i in range(num_textures)],
+                ("col", "Color"),
+            ]
+        }
 
         # # #
 
@@ -45,21 +45,10 @@ class LiteXInputAssembly(LiteXModule, AutoCSR):
             "i_clk": ClockSignal(),
             "i_rst": ResetSignal(),
             "o_ready": self._ready.status,
-            "i_c_pos": Cat(
-                self._pos_format.storage,
-                self._pos_stride.storage,
-                self._pos_offset.storage,
-            ),
-            "i_c_norm": Cat(
-                self._norm_format.storage,
-                self._norm_stride.storage,
-                self._norm_offset.storage,
-            ),
-            "i_c_col": Cat(
-                self._col_format.storage,
-                self._col_stride.storage,
-                self._col_offset.storage,
-            ),
+            "i_c_pos": attr_cfg["pos"],
+            "i_c_norm": attr_cfg["norm"],
+            "i_c_col": attr_cfg["col"],
+            **{f"i_c_tex__{i}": attr_cfg[f"tex{i}"] for i in range(num_textures)},
             # Wishbone connections
             "o_bus__adr": self.bus.adr,
             "i_bus__dat_r": self.bus.dat_r,
@@ -67,6 +56,8 @@ class LiteXInputAssembly(LiteXModule, AutoCSR):
             "o_bus__cyc": self.bus.cyc,
             "o_bus__stb": self.bus.stb,
             "i_bus__ack": self.bus.ack,
+            "o_bus__cti": self.bus.cti,
+            "o_bus__bte": self.bus.bte,
             # Stream input (is_index)
             "i_is_index__valid": self.sink_index.valid,
             "o_is_index__ready": self.sink_index.ready,
@@ -79,5 +70,21 @@ class LiteXInputAssembly(LiteXModule, AutoCSR):
 
         self.specials += Instance("InputAssembly", **gpu_params)
 
+    def _attr_csrs(self, name, desc):
+        mode = CSRStorage(
+            2,
+            description=f"{desc} attribute mode: 0=constant, 1=per-vertex, 2=disabled",
+        )
+        words = [
+            CSRStorage(32, description=f"{desc} attribute address / constant x"),
+            CSRStorage(32, description=f"{desc} attribute stride / constant y"),
+            CSRStorage(32, description=f"{desc} attribute constant z"),
+            CSRStorage(32, description=f"{desc} attribute constant w"),
+        ]
+        setattr(self, f"_{name}_mode", mode)
+        for i, word in enumerate(words):
+            setattr(self, f"_{name}_info{i}", word)
+        return Cat(mode.storage, *[word.storage for word in words])
+
 
 __all__ = ["LiteXInputAssembly"]
@@ -15,6 +15,7 @@ from litex.soc.cores.cpu import CPUS
 from litex.soc.cores.video import VideoVGAPHY, video_timings
 from litex.soc.integration.builder import *
 from litex.soc.integration.soc_core import *
+from litex.soc.interconnect import axi, wishbone
 from litex.soc.interconnect.csr import *
 from migen import *
 
@@ -64,6 +65,24 @@ class _CRG(LiteXModule):
         )
 
 
+# GPU fetch cache hints ----------------------------------------------------------------------------
+class _FetchCacheHints(LiteXModule):
+    def __init__(self, hps):
+        self._arcache = CSRStorage(
+            4,
+            reset=0b1110,
+            description="ARCACHE of GPU index/vertex reads, cacheable and allocating by default (0 when HPS caches are bypassed)",
+        )
+        self._arprot = CSRStorage(3, reset=0b010, description="ARPROT of GPU reads")
+
+        # # #
+
+        self.comb += [
+            hps.f2h_sdram_arcache.eq(self._arcache.storage),
+            hps.f2h_sdram_arprot.eq(self._arprot.storage),
+        ]
+
+
 # BaseSoC ------------------------------------------------------------------------------------------
 class BaseSoC(SoCCore):
     def __init__(
@@ -112,9 +131,21 @@ class BaseSoC(SoCCore):
             # Register GPU Verilog sources with the platform
             platform.add_source_dir(f"{BUILD_DIR}/gpu_verilog")
 
-            # Connect GPU Wishbone buses to main bus as masters
-            self.bus.add_master(name="gpu_index", master=self.gpu.bus_index)
-            self.bus.add_master(name="gpu_vertex", master=self.gpu.bus_vertex)
+            # Index/vertex fetches are 64-bit; with the HPS they go straight to its
+            # DDR through f2h_sdram instead of the 32-bit main bus
+            if kwargs.get("cpu_type") == "hps":
+                fetch_bus = wishbone.Interface(data_width=64, adr_width=29)
+                self.gpu_fetch_arbiter = wishbone.Arbiter(
+                    [self.gpu.bus_index, self.gpu.bus_vertex], fetch_bus
+                )
+                self.gpu_fetch_axi = axi.Wishbone2AXI(fetch_bus, self.cpu.f2h_sdram)
+                # Index/vertex walks are sequential streams -> hint them as cacheable
+                self.gpu_fetch_cache = _FetchCacheHints(self.cpu)
+            else:
+                self.bus.add_master(name="gpu_index", master=self.gpu.bus_index)
+                self.bus.add_master(name="gpu_vertex", master=self.gpu.bus_vertex)
+
+            # Connect remaining GPU Wishbone buses to main bus as masters
             self.bus.add_master(
                 name="gpu_depthstencil", master=self.gpu.bus_depthstencil
             )
@@ -179,6 +179,13 @@ class HPS(CPU):
             quartus_axi3_params("f2h_sdram_slave", self.f2h_sdram, dir="slave")
         )
 
+        # Read cache/protection hints of f2h_sdram, overriding whatever the master
+        # drives (cacheable/allocating, non-secure data by default)
+        self.f2h_sdram_arcache = Signal(4, reset=0b1110)
+        self.f2h_sdram_arprot = Signal(3, reset=0b010)
+        self.cpu_params["i_f2h_sdram_slave_arcache"] = self.f2h_sdram_arcache
+        self.cpu_params["i_f2h_sdram_slave_arprot"] = self.f2h_sdram_arprot
+
         # Set reset
         self.comb += self.cd_hps.rst.eq(~hps_rst_n)
 
@@ -8,6 +8,7 @@ from .input_assembly.cores import (
     InputAssembly,
     InputAssemblyAttrConfigLayout,
     InputTopologyProcessor,
+    VertexCacheTags,
 )
 from .pixel_shading.cores import (
     BlendConfig,
@@ -51,9 +52,12 @@ class GraphicsPipeline(wiring.Component):
     """End-to-end graphics pipeline wiring.
 
     Stages (streams):
-      IndexGenerator → InputTopologyProcessor → InputAssembly → VertexTransform →
-      VertexShading → PrimitiveAssembly → PrimitiveClipper → TriangleRasterizer →
-      Texturing → DepthStencilTest → SwapchainOutput
+      IndexGenerator → InputTopologyProcessor → VertexCacheTags → InputAssembly →
+      VertexTransform → VertexShading → PrimitiveAssembly → PrimitiveClipper →
+      TriangleRasterizer → Texturing → DepthStencilTest → SwapchainOutput
+
+    VertexCacheTags forwards only vertex cache misses to InputAssembly; cache
+    hits are resolved by PrimitiveAssembly through a separate lookup stream.
 
     Exposes separate Wishbone buses for vertex fetch, depth/stencil and color.
     """
@@ -100,11 +104,18 @@ class GraphicsPipeline(wiring.Component):
     # Wishbone buses (separate for simplicity)
     wb_index: Out(
         wb.Signature(
-            addr_width=wb_bus_addr_width, data_width=wb_bus_data_width, granularity=8
+            addr_width=wb_bus_addr_width,
+            data_width=wb_bus_data_width,
+            granularity=8,
+            features={"cti", "bte"},
         )
     )
     wb_vertex: Out(
-        wb.Signature(addr_width=wb_bus_addr_width, data_width=wb_bus_data_width)
+        wb.Signature(
+            addr_width=wb_bus_addr_width,
+            data_width=wb_bus_data_width,
+            features={"cti", "bte"},
+        )
     )
     wb_depthstencil: Out(
         wb.Signature(
@@ -124,12 +135,13 @@ class GraphicsPipeline(wiring.Component):
         # Submodules
         m.submodules.idx = idx = IndexGenerator()
         m.submodules.topo = topo = InputTopologyProcessor()
+        m.submodules.vcache = vcache = VertexCacheTags()
         m.submodules.ia = ia = InputAssembly()
 
         m.submodules.vtx_xf = vtx_xf = VertexTransform()
         m.submodules.vtx_sh = vtx_sh = VertexShading()
 
-        m.submodules.pa = pa = PrimitiveAssembly()
+        m.submodules.pa = pa = PrimitiveAssembly(vertex_cache=True)
         m.submodules.clip = clip = PrimitiveClipper()
         m.submodules.rast = rast = TriangleRasterizer()
 
@@ -139,7 +151,9 @@ class GraphicsPipeline(wiring.Component):
 
         # Streams wiring: IA chain
         wiring.connect(m, idx.os_index, topo.is_index)
-        wiring.connect(m, topo.os_index, ia.is_index)
+        wiring.connect(m, topo.os_index, vcache.is_index)
+        wiring.connect(m, vcache.os_index, ia.is_index)
+        wiring.connect(m, vcache.os_lookup, pa.is_lookup)
         wiring.connect(m, ia.os_vertex, vtx_xf.is_vertex)
         wiring.connect(m, vtx_xf.os_vertex, vtx_sh.is_vertex)
         wiring.connect(m, vtx_sh.os_vertex, pa.is_vertex)
@@ -159,6 +173,7 @@ class GraphicsPipeline(wiring.Component):
         m.d.comb += self.ready.eq(
             idx.ready
             & topo.ready
+            & vcache.ready
             & ia.ready
             & vtx_xf.ready
             & vtx_sh.ready
@@ -184,6 +199,7 @@ class GraphicsPipeline(wiring.Component):
             topo.c_primitive_restart_enable.eq(self.c_primitive_restart_enable),
             topo.c_primitive_restart_index.eq(self.c_primitive_restart_index),
             topo.c_base_vertex.eq(self.c_base_vertex),
+            vcache.flush.eq(self.start),
         ]
 
         # Input Assembly configuration
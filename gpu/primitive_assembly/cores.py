@@ -1,8 +1,15 @@
 from amaranth import *
 from amaranth.lib import data, stream, wiring
+from amaranth.lib.fifo import SyncFIFOBuffered
+from amaranth.lib.memory import Memory
 from amaranth.lib.wiring import In, Out
 
-from ..utils.layouts import PrimitiveAssemblyLayout, RasterizerLayout
+from ..utils.layouts import (
+    PrimitiveAssemblyLayout,
+    RasterizerLayout,
+    VertexCacheLookupLayout,
+    vertex_cache_depth,
+)
 from ..utils.types import CullFace, FixedPoint, FrontFace, PrimitiveType
 
 
@@ -21,60 +28,132 @@ class PrimitiveAssembly(wiring.Component):
 
     Input: PrimitiveAssemblyLayout
     Output: RasterizerLayout
+
+    With ``vertex_cache`` enabled the core also holds the data half of the
+    post-transform vertex cache. Every vertex of the draw is then announced on
+    ``is_lookup`` (produced by ``VertexCacheTags`` in front of input assembly):
+    on a miss the next shaded vertex is taken from ``is_vertex`` and stored in
+    the given slot, on a hit the vertex is re-read from the slot and nothing is
+    consumed from ``is_vertex``.
+
+    Primitives are pushed into a small output FIFO, so a triangle is sent in
+    consecutive cycles and a stalled consumer does not hold up the facing and
+    culling decision of the next one. ``ready`` also waits for it to drain.
+
+    Parameters
+    ----------
+    vertex_cache: bool
+        Resolve vertex cache lookups from ``is_lookup``.
+    fifo_depth: int
+        Depth of the output FIFO, in vertices.
     """
 
-    is_vertex: In(stream.Signature(PrimitiveAssemblyLayout))
-    os_primitive: Out(stream.Signature(RasterizerLayout))
-    ready: Out(1)
+    is_vertex: stream.Interface
+    is_lookup: stream.Interface
+    os_primitive: stream.Interface
+    ready: Signal
 
-    prim_config: In(PrimitiveAssemblyConfigLayout)
+    prim_config: Signal
 
     @property
     def config(self):
         # Backward-compatible alias expected by tests and benches
         return self.prim_config
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, vertex_cache: bool = False, fifo_depth: int = 4):
+        ports = {
+            "is_vertex": In(stream.Signature(PrimitiveAssemblyLayout)),
+            "os_primitive": Out(stream.Signature(RasterizerLayout)),
+            "ready": Out(1),
+            "prim_config": In(PrimitiveAssemblyConfigLayout),
+        }
+        if vertex_cache:
+            ports["is_lookup"] = In(stream.Signature(VertexCacheLookupLayout))
+        super().__init__(ports)
+        self.vertex_cache = vertex_cache
+        self.fifo_depth = fifo_depth
 
     def elaborate(self, platform):
         m = Module()
 
+        # primitives leave through the output FIFO
+        out = stream.Signature(RasterizerLayout).create()
+        idle = Signal()
+
+        m.submodules.out_fifo = out_fifo = SyncFIFOBuffered(
+            width=Shape.cast(RasterizerLayout).width, depth=self.fifo_depth
+        )
+        m.d.comb += [
+            out_fifo.w_data.eq(out.payload),
+            out_fifo.w_en.eq(out.valid),
+            out.ready.eq(out_fifo.w_rdy),
+            self.os_primitive.payload.eq(out_fifo.r_data),
+            self.os_primitive.valid.eq(out_fifo.r_rdy),
+            out_fifo.r_en.eq(self.os_primitive.ready),
+            self.ready.eq(idle & (out_fifo.level == 0)),
+        ]
+
+        if self.vertex_cache:
+            # vertices in draw order, merged from cache hits and shaded misses
+            src = stream.Signature(PrimitiveAssemblyLayout).create()
+
+            m.submodules.cache = cache = Memory(
+                shape=PrimitiveAssemblyLayout, depth=vertex_cache_depth, init=[]
+            )
+            rd = cache.read_port(domain="comb")
+            wr = cache.write_port()
+
+            lookup = self.is_lookup
+            have_vertex = lookup.valid & (lookup.p.hit | self.is_vertex.valid)
+
+            m.d.comb += [
+                rd.addr.eq(lookup.p.slot),
+                wr.addr.eq(lookup.p.slot),
+                wr.data.eq(self.is_vertex.payload),
+                wr.en.eq(self.is_vertex.valid & self.is_vertex.ready),
+                src.valid.eq(have_vertex),
+                src.payload.eq(Mux(lookup.p.hit, rd.data, self.is_vertex.payload)),
+                lookup.ready.eq(src.ready & have_vertex),
+                self.is_vertex.ready.eq(src.ready & lookup.valid & ~lookup.p.hit),
+            ]
+        else:
+            src = self.is_vertex
+
         with m.Switch(self.prim_config.type):
             with m.Case(PrimitiveType.POINTS, PrimitiveType.LINES):
                 # Simple pass-through for points and lines
-                m.d.comb += self.ready.eq(1)
+                m.d.comb += idle.eq(1)
                 m.d.comb += [
-                    self.is_vertex.ready.eq(self.os_primitive.ready),
-                    self.os_primitive.valid.eq(self.is_vertex.valid),
-                    self.os_primitive.p.position_ndc.eq(self.is_vertex.p.position_ndc),
-                    self.os_primitive.p.texcoords.eq(self.is_vertex.p.texcoords),
-                    self.os_primitive.p.color.eq(self.is_vertex.p.color),
-                    self.os_primitive.p.front_facing.eq(1),
+                    src.ready.eq(out.ready),
+                    out.valid.eq(src.valid),
+                    out.p.position_ndc.eq(src.p.position_ndc),
+                    out.p.texcoords.eq(src.p.texcoords),
+                    out.p.color.eq(src.p.color),
+                    out.p.front_facing.eq(1),
                 ]
             with m.Case(PrimitiveType.TRIANGLES):
                 # calculate front facing
-                trinagle = Array(Signal.like(self.is_vertex.payload) for _ in range(3))
+                trinagle = Array(Signal.like(src.payload) for _ in range(3))
                 idx = Signal(range(3))
                 front_facing = Signal()
 
                 def send_vertex(m, ff, idx):
                     m.d.comb += [
-                        self.os_primitive.valid.eq(1),
-                        self.os_primitive.p.position_ndc.eq(trinagle[idx].position_ndc),
-                        self.os_primitive.p.texcoords.eq(trinagle[idx].texcoords),
-                        self.os_primitive.p.color.eq(
+                        out.valid.eq(1),
+                        out.p.position_ndc.eq(trinagle[idx].position_ndc),
+                        out.p.texcoords.eq(trinagle[idx].texcoords),
+                        out.p.color.eq(
                             Mux(ff, trinagle[idx].color, trinagle[idx].color_back)
                         ),
-                        self.os_primitive.p.front_facing.eq(ff),
+                        out.p.front_facing.eq(ff),
                     ]
 
                 with m.FSM():
                     with m.State("WAIT_VERTEX"):
-                        m.d.comb += [self.is_vertex.ready.eq(1), self.ready.eq(1)]
-                        with m.If(self.is_vertex.valid):
+                        m.d.comb += [src.ready.eq(1), idle.eq(1)]
+                        with m.If(src.valid):
                             m.d.sync += [
-                                trinagle[idx].eq(self.is_vertex.payload),
+                                trinagle[idx].eq(src.payload),
                                 idx.eq(idx + 1),
                             ]
                             with m.If(idx + 1 == 3):
@@ -146,15 +225,15 @@ class PrimitiveAssembly(wiring.Component):
                             # Register front_facing for use in subsequent states
                             m.d.sync += front_facing.eq(ff)
                             send_vertex(m, ff, 0)
-                            with m.If(self.os_primitive.ready):
+                            with m.If(out.ready):
                                 m.next = "SEND_VERTEX_1"
                     with m.State("SEND_VERTEX_1"):
                         send_vertex(m, front_facing, 1)
-                        with m.If(self.os_primitive.ready):
+                        with m.If(out.ready):
                             m.next = "SEND_VERTEX_2"
                     with m.State("SEND_VERTEX_2"):
                         send_vertex(m, front_facing, 2)
-                        with m.If(self.os_primitive.ready):
+                        with m.If(out.ready):
                             m.next = "WAIT_VERTEX"
 
         return m
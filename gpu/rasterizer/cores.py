@@ -1,512 +1,625 @@
+from functools import reduce
+
 from amaranth import *
-from amaranth.lib import stream, wiring
+from amaranth.lib import data, stream, wiring
+from amaranth.lib.fifo import SyncFIFOBuffered
 from amaranth.lib.wiring import In, Out
 
 from gpu.utils.stream import WideStreamOutput
 
+from ..utils import fixed
 from ..utils import math as gpu_math
-from ..utils.fixed import Value
 from ..utils.layouts import RasterizerLayout, num_textures
 from ..utils.types import FixedPoint, PrimitiveType
 
+# Emit simulation trace prints from PrimitiveClipper
+DEBUG = False
 
-class PrimitiveClipper(wiring.Component):
-    """Primitive clipper for rasterizer stage.
+# Clip planes, in pipeline order: 0: +x, 1: -x, 2: +y, 3: -y, 4: +z, 5: -z
+num_clip_planes = 6
 
-    - Input: stream of `RasterizerLayout` vertices (assembled order depends on primitive type).
-    - Output: stream of `RasterizerLayout` vertices with primitives fully inside the clip volume.
-    - Registers: primitive type (point/line/triangle), cull face, winding order.
-    - Culling: applied for triangles only (front/back based on area sign and winding).
-        - Clipping: trivial accept/reject against NDC cube (after perspective divide):
-            -1 <= x_ndc,y_ndc,z_ndc <= 1. No polygon splitting.
+# Edges whose end points are both closer than this to the plane are treated
+# as not crossing it (the reciprocal of their distance would blow up).
+clip_epsilon = 2**-10
+
+
+class ClipVertexLayout(data.Struct):
+    """One vertex of a polygon streamed between the plane clippers."""
+
+    vertex: RasterizerLayout
+    last: unsigned(1)  # last vertex of the polygon
+    planes: unsigned(num_clip_planes)  # planes the polygon may cross
+
+
+class PlaneClipper(wiring.Component):
+    """Sutherland-Hodgman clipping of polygons against a single clip plane.
+
+    - Input: stream of polygon vertices, the last one of each polygon flagged.
+    - Output: the polygon clipped against the plane, in the same format.
+      A polygon clipped away entirely produces no output.
+
+    Each incoming vertex closes the edge from the previous one, so edges are
+    processed at one per cycle unless they cross the plane, which costs a
+    reciprocal for the intersection. The clipped vertex is held back for one
+    output so that the last one can be flagged.
+
+    Polygons whose ``planes`` bit for this plane is clear lie entirely inside
+    it and are forwarded vertex by vertex without clipping.
+
+    Parameters
+    ----------
+    plane : int
+        Clip plane handled by this stage (see `num_clip_planes`).
+    parallel : int
+        Number of attributes interpolated per cycle at an intersection, i.e.
+        the number of lerp multipliers. Trades area for intersection latency.
     """
 
-    is_vertex: In(stream.Signature(RasterizerLayout))
-    os_vertex: Out(stream.Signature(RasterizerLayout))
+    i: In(stream.Signature(ClipVertexLayout))
+    o: Out(stream.Signature(ClipVertexLayout))
 
-    prim_type: In(PrimitiveType)
     ready: Out(1)
 
+    def __init__(self, plane: int, parallel: int = 4):
+        assert 0 <= plane < num_clip_planes
+        assert parallel >= 1
+        self._plane = plane
+        self._parallel = parallel
+        super().__init__()
+
     def elaborate(self, platform):
         m = Module()
+        plane = self._plane
+        parallel = self._parallel
+        axis = plane // 2
+
         # Reciprocal unit for t computation (t = num / den = num * inv(den))
-        m.submodules.inv = inv = gpu_math.FixedPointInv(FixedPoint, steps=4)
+        # Seeded, like the rasterizer's and the perspective divide's. A single
+        # step truncates one bit low even on powers of two (inv(2.0) gives
+        # 0.5 - 2^-13, which moves an intersection at the midpoint of an edge
+        # past it); the second one makes them exact.
+        m.submodules.inv = inv = gpu_math.FixedPointInv(
+            FixedPoint, steps=2, seed_bits=8
+        )
 
-        buf = Array(Signal(RasterizerLayout) for _ in range(3))
-        idx = Signal(range(3))
-        needed = Signal(range(4))
+        first_v = Signal(RasterizerLayout)  # closes the polygon
+        a_v = Signal(RasterizerLayout)  # start of the current edge
+        b_v = Signal(RasterizerLayout)  # end of an edge crossing the plane
+        edge_b = Signal(RasterizerLayout)  # end of the current edge
+        started = Signal()  # first vertex of the polygon received
+        planes = Signal(num_clip_planes)  # `planes` of the clipped polygon
+        end_pending = Signal()  # closing edge follows the crossing one
+        closing = Signal()  # crossing edge is the closing one
+
+        # Clipped vertex waiting for its successor (or the end of the polygon)
+        pend_v = Signal(RasterizerLayout)
+        pend_valid = Signal()
+        can_emit = ~pend_valid | ~self.o.valid | self.o.ready
+
+        def emit(v):
+            with m.If(pend_valid):
+                m.d.sync += [
+                    self.o.p.vertex.eq(pend_v),
+                    self.o.p.last.eq(0),
+                    self.o.p.planes.eq(planes),
+                    self.o.valid.eq(1),
+                ]
+            m.d.sync += [
+                pend_v.eq(v),
+                pend_valid.eq(1),
+            ]
+
+        with m.If(self.o.ready):
+            m.d.sync += self.o.valid.eq(0)
+
+        # Distance from the plane in clip space using ±w comparisons
+        # even planes: x <= w  => dist = w - x
+        # odd planes:  x >= -w => dist = x + w
+        def plane_dist(v):
+            coord = v.position_ndc[axis]
+            w = v.position_ndc[3]
+            return w - coord if plane % 2 == 0 else coord + w
+
+        # The plane is fixed per stage, so a distance is a single add or
+        # subtract. Only the end of an edge needs one: the distance of its
+        # start is kept from the previous edge.
+        a_dist = Signal(FixedPoint)
+        b_dist = Signal(FixedPoint)
+        b_v_dist = Signal(FixedPoint)
+        m.d.comb += b_dist.eq(plane_dist(edge_b))
+
+        a_inside = a_dist >= 0
+        b_inside = b_dist >= 0
 
-        # Clipping work buffers (up to 9 vertices after clipping against 6 planes)
-        clip_buf = Array(
-            Array(Signal(RasterizerLayout) for _ in range(9)) for _ in range(2)
-        )
-        clip_count = Array(Signal(range(10)) for _ in range(2))
-        clip_src = Signal()  # ping-pong buffer index
-        clip_plane = Signal(range(6))  # current plane being clipped against
-        clip_idx = Signal(range(9))  # current vertex index during clipping
         # Interpolation helper signals
         t_num = Signal(FixedPoint)
         t_den = Signal(FixedPoint)
-        t_recip = Signal(FixedPoint)
-        emit_next = Signal()  # entering case: emit intersection and next vertex
-        edge_curr_idx = Signal(range(9))
-        edge_next_idx = Signal(range(9))
-
-        # Primitive vertex count based on register
-        with m.Switch(self.prim_type):
-            with m.Case(PrimitiveType.POINTS):
-                m.d.comb += needed.eq(1)
-            with m.Case(PrimitiveType.LINES):
-                m.d.comb += needed.eq(2)
-            with m.Default():
-                m.d.comb += needed.eq(3)
+        t = Signal(FixedPoint)
+
+        # Interpolated fields of a vertex. The coordinate of the clip axis is
+        # not interpolated, it is forced onto the plane instead.
+        def lerp_fields(v):
+            fields = [v.position_ndc[i] for i in range(4) if i != axis]
+            fields += [v.color[i] for i in range(4)]
+            for ti in range(num_textures):
+                fields += [v.texcoords[ti][i] for i in range(4)]
+            return fields
+
+        intersection_r = Signal(RasterizerLayout)  # fields of earlier steps
+        intersection = Signal(RasterizerLayout)
+
+        a_fields = lerp_fields(a_v)
+        r_fields = lerp_fields(intersection_r)
+        o_fields = lerp_fields(intersection)
+
+        # Edge differences, computed while waiting for the reciprocal so that
+        # APPLY only multiplies and adds. Intermediate values are kept at the
+        # base fractional precision.
+        diffs = [
+            (b - a).reshape(FixedPoint.f_bits)
+            for a, b in zip(a_fields, lerp_fields(b_v))
+        ]
+        diff_r = [Signal(d.shape(), name=f"diff_{i}") for i, d in enumerate(diffs)]
+
+        def lerp(a, diff, t):
+            prod = (t * diff).reshape(FixedPoint.f_bits)
+            return (a + prod).reshape(FixedPoint.f_bits)
+
+        # Shared lerp lanes, stepping through the fields `parallel` at a time
+        lerp_steps = -(-len(a_fields) // parallel)
+        lerp_step = Signal(range(lerp_steps))
+        lane_a = [Signal(FixedPoint, name=f"lane_a_{j}") for j in range(parallel)]
+        lane_d = [Signal.like(diff_r[0], name=f"lane_d_{j}") for j in range(parallel)]
+        lane_r = [Signal(FixedPoint, name=f"lane_r_{j}") for j in range(parallel)]
+
+        def lerp_group(k):
+            return range(k * parallel, min((k + 1) * parallel, len(a_fields)))
+
+        # The fields of the last step come straight from the lanes
+        m.d.comb += intersection.eq(intersection_r)
+        for j, f in enumerate(lerp_group(lerp_steps - 1)):
+            m.d.comb += o_fields[f].eq(lane_r[j])
+
+        # Force the intersected coordinate to lie exactly on the clipping plane
+        # to avoid tiny fixed-point overshoot (e.g. 1.00012 instead of 1.0).
+        w = intersection.position_ndc[3]
+        m.d.comb += [
+            intersection.position_ndc[axis].eq(w if plane % 2 == 0 else -w),
+            intersection.front_facing.eq(a_v.front_facing),
+        ]
+
+        # Start vertex projected onto the plane, for edges lying on it
+        a_on_plane = Signal(RasterizerLayout)
+        m.d.comb += a_on_plane.eq(a_v)
+        m.d.comb += a_on_plane.position_ndc[axis].eq(
+            a_v.position_ndc[3] if plane % 2 == 0 else -a_v.position_ndc[3]
+        )
 
-        m.submodules.w_out = w_out = WideStreamOutput(self.os_vertex.p.shape(), 3)
-        wiring.connect(m, wiring.flipped(self.os_vertex), w_out.o)
+        def clip_edge(after_edge):
+            if DEBUG:
+                m.d.sync += Print(
+                    Format(
+                        "PLANE {} edge {} -> {} dists {} {}",
+                        plane,
+                        a_v.position_ndc,
+                        edge_b.position_ndc,
+                        a_dist,
+                        b_dist,
+                    )
+                )
 
-        with m.If(w_out.i.ready):
-            m.d.sync += w_out.i.valid.eq(0)
-        with m.If(w_out.n.ready):
-            m.d.sync += w_out.n.valid.eq(0)
+            # Inside vertices are kept; an edge crossing the plane adds the
+            # intersection after its start vertex. For edges lying (almost) on
+            # the plane the intersection is one of the end points: the start
+            # vertex is kept even if it is outside (moved onto the plane), and
+            # nothing is added.
+            crossing = a_inside != b_inside
+            degenerate = Signal()
+            m.d.comb += [
+                t_den.eq(a_dist - b_dist),
+                degenerate.eq(abs(t_den) < fixed.Const(clip_epsilon, FixedPoint)),
+            ]
+
+            with m.If(a_inside):
+                emit(a_v)
+            with m.Elif(crossing & degenerate):
+                emit(a_on_plane)
+
+            with m.If(crossing & ~degenerate):
+                # Compute t via reciprocal: request inv(t_den) right away. The
+                # reciprocal unit is always free here, as its only result has
+                # been taken before the next edge.
+                m.d.comb += [
+                    inv.i.valid.eq(1),
+                    inv.i.payload.eq(t_den),
+                ]
+                m.d.sync += [
+                    t_num.eq(a_dist),
+                    b_v.eq(edge_b),
+                    b_v_dist.eq(b_dist),
+                ]
+                m.next = "INV"
+            with m.Else():
+                after_edge()
 
         with m.FSM():
-            with m.State("COLLECT"):
-                m.d.comb += [self.is_vertex.ready.eq(1), self.ready.eq(1)]
-                with m.If(self.is_vertex.valid):
-                    m.d.sync += buf[idx].eq(self.is_vertex.payload)
-                    with m.If(idx == (needed - 1)):
-                        m.d.sync += idx.eq(0)
-                        m.next = "CHECK"
-                    with m.Else():
-                        m.d.sync += idx.eq(idx + 1)
-
-            with m.State("CHECK"):
-                # Compute clip codes for trivial accept/reject (no polygon splitting).
-                # Helper function to compute clip code for a vertex
-                def compute_clip_code(vtx):
-                    x, y, z, w = vtx.position_ndc
-                    bits = [
-                        x > w,  # +x
-                        x < -w,  # -x
-                        y > w,  # +y
-                        y < -w,  # -y
-                        z > w,  # +z
-                        z < -w,  # -z
-                    ]
-                    return Cat(bits)
-
-                codes = Array(Signal(6) for _ in range(3))
-                for i in range(3):
-                    m.d.comb += codes[i].eq(compute_clip_code(buf[i]))
+            with m.State("RECV"):
+                # Polygons not crossing the plane pass straight through; all
+                # their vertices are taken as if they were the first one
+                bypass = ~started & ~self.i.p.planes[plane]
 
-                m.d.sync += [
-                    Print(
-                        Format(
-                            "vtx0: {}, vtx1: {}, vtx2: {}",
-                            buf[0].position_ndc,
-                            buf[1].position_ndc,
-                            buf[2].position_ndc,
-                        )
-                    ),
-                    Print(
-                        Format(
-                            "Clip codes: {:06b}, {:06b}, {:06b}",
-                            codes[0],
-                            codes[1],
-                            codes[2],
-                        )
+                m.d.comb += [
+                    edge_b.eq(self.i.p.vertex),
+                    self.i.ready.eq(
+                        Mux(bypass, ~self.o.valid | self.o.ready, ~started | can_emit)
                     ),
+                    self.ready.eq(~started & ~pend_valid & ~self.o.valid),
                 ]
-                with m.If((codes[0] & codes[1] & codes[2]) != 0):
-                    m.d.sync += Print("Trivial reject")
-                    # Fully outside; drop primitive.
-                    m.next = "COLLECT"
-                with m.Elif((codes[0] | codes[1] | codes[2]) == 0):
-                    # Fully inside; forward primitive.
-                    with m.If(~w_out.i.valid & ~w_out.n.valid):
-                        m.d.sync += Print("Trivial accept")
-                        m.d.sync += [
-                            w_out.i.p[0].eq(buf[0]),
-                            w_out.i.p[1].eq(buf[1]),
-                            w_out.i.p[2].eq(buf[2]),
-                            w_out.n.p.eq(needed),
-                            w_out.i.valid.eq(1),
-                            w_out.n.valid.eq(1),
-                        ]
-                        m.next = "COLLECT"
-                with m.Else():
-                    # Needs clipping (only triangles and lines should reach here).
-                    m.next = "CLIP"
-
-            with m.State("CLIP"):
-                # Sutherland-Hodgman clipping for triangles only
-                # Initialize first buffer with triangle vertices
-                with m.If(needed == 3):
-                    m.d.sync += [
-                        clip_buf[0][0].eq(buf[0]),
-                        clip_buf[0][1].eq(buf[1]),
-                        clip_buf[0][2].eq(buf[2]),
-                        clip_count[0].eq(3),
-                        clip_plane.eq(0),
-                        clip_src.eq(0),
-                    ]
-                    m.next = "CLIP_PLANE"
-                with m.Else():
-                    # TODO: implement line clipping (Cohen-Sutherland or Liang-Barsky)
-                    m.next = "COLLECT"
-
-            with m.State("CLIP_PLANE"):
-                # Clip against current plane
-                # Planes: 0: +x, 1: -x, 2: +y, 3: -y, 4: +z, 5: -z
-                src = clip_src
-                dst = ~clip_src
-                m.d.sync += Print(
-                    Format(
-                        "CLIP_PLANE enter plane {} src {} dst {} count {}",
-                        clip_plane,
-                        src,
-                        dst,
-                        clip_count[src],
-                    )
-                )
 
-                # If source polygon is empty or clipped away, skip to emit
-                with m.If(clip_count[src] == 0):
-                    m.next = "CLIP_EMIT"
-                with m.Elif(clip_plane > 5):
-                    # All planes processed
-                    m.next = "CLIP_EMIT"
-                with m.Else():
+                with m.If(self.i.valid & self.i.ready & bypass):
                     m.d.sync += [
-                        clip_count[dst].eq(0),
-                        clip_idx.eq(0),
+                        self.o.p.eq(self.i.p),
+                        self.o.valid.eq(1),
                     ]
-                    m.next = "CLIP_EDGE"
-
-            with m.State("CLIP_EDGE"):
-                # Clip edge across current plane
-                src = clip_src
-                dst = ~clip_src
-                curr_idx = clip_idx
-                next_idx = Mux(clip_idx == clip_count[src] - 1, 0, clip_idx + 1)
-
-                curr_v = clip_buf[src][curr_idx]
-                next_v = clip_buf[src][next_idx]
+                with m.Elif(self.i.valid & self.i.ready):
+                    m.d.sync += started.eq(~self.i.p.last)
 
-                m.d.sync += Print(
-                    Format(
-                        "CLIP_EDGE plane {} src {} curr {} next {} count {}",
-                        clip_plane,
-                        src,
-                        curr_idx,
-                        next_idx,
-                        clip_count[src],
-                    )
-                )
+                    with m.If(~started):
+                        m.d.sync += [
+                            first_v.eq(self.i.p.vertex),
+                            a_v.eq(self.i.p.vertex),
+                            a_dist.eq(b_dist),
+                            planes.eq(self.i.p.planes),
+                        ]
+                        with m.If(self.i.p.last):
+                            m.next = "CLOSE"
+                    with m.Else():
 
-                c_x, c_y, c_z, c_w = curr_v.position_ndc
-                n_x, n_y, n_z, n_w = next_v.position_ndc
+                        def recv_next():
+                            m.d.sync += [
+                                a_v.eq(edge_b),
+                                a_dist.eq(b_dist),
+                            ]
+                            with m.If(self.i.p.last):
+                                m.next = "CLOSE"
 
-                m.d.sync += Print(
-                    Format(
-                        "   curr ({}, {}, {}, {}), next ({}, {}, {}, {})",
-                        c_x,
-                        c_y,
-                        c_z,
-                        c_w,
-                        n_x,
-                        n_y,
-                        n_z,
-                        n_w,
-                    )
-                )
-
-                # Compute distance from plane in clip space using ±w comparisons
-                # plane 0: +x (x <= w) => dist = w - x
-                # plane 1: -x (x >= -w) => dist = x + w
-                # plane 2: +y (y <= w) => dist = w - y
-                # plane 3: -y (y >= -w) => dist = y + w
-                # plane 4: +z (z <= w) => dist = w - z (far)
-                # plane 5: -z (z >= -w) => dist = z + w (near)
-                curr_dist = Signal(FixedPoint)
-                next_dist = Signal(FixedPoint)
-
-                with m.Switch(clip_plane):
-                    with m.Case(0):
-                        m.d.comb += [
-                            curr_dist.eq(c_w - c_x),
-                            next_dist.eq(n_w - n_x),
-                        ]
-                    with m.Case(1):
-                        m.d.comb += [
-                            curr_dist.eq(c_x + c_w),
-                            next_dist.eq(n_x + n_w),
-                        ]
-                    with m.Case(2):
-                        m.d.comb += [
-                            curr_dist.eq(c_w - c_y),
-                            next_dist.eq(n_w - n_y),
-                        ]
-                    with m.Case(3):
-                        m.d.comb += [
-                            curr_dist.eq(c_y + c_w),
-                            next_dist.eq(n_y + n_w),
-                        ]
-                    with m.Case(4):
-                        m.d.comb += [
-                            curr_dist.eq(c_w - c_z),
-                            next_dist.eq(n_w - n_z),
-                        ]
-                    with m.Case(5):
-                        m.d.comb += [
-                            curr_dist.eq(c_z + c_w),
-                            next_dist.eq(n_z + n_w),
+                        m.d.sync += [
+                            end_pending.eq(self.i.p.last),
+                            closing.eq(0),
                         ]
+                        clip_edge(recv_next)
 
-                curr_inside = curr_dist >= 0
-                next_inside = next_dist >= 0
+            with m.State("CLOSE"):
+                # Edge from the last vertex back to the first one
+                m.d.comb += edge_b.eq(first_v)
 
-                m.d.sync += Print(
-                    Format(
-                        "   dists {} {} inside {} {}",
-                        curr_dist,
-                        next_dist,
-                        curr_inside,
-                        next_inside,
-                    )
-                )
+                def close_next():
+                    m.next = "FLUSH"
 
-                out_count = clip_count[dst]
+                with m.If(can_emit):
+                    m.d.sync += closing.eq(1)
+                    clip_edge(close_next)
 
-                # Prepare indices for use across states
-                m.d.sync += [
-                    edge_curr_idx.eq(curr_idx),
-                    edge_next_idx.eq(next_idx),
-                ]
+            # Wait for the reciprocal of t_den
+            with m.State("INV"):
+                m.d.sync += [d_r.eq(d) for d_r, d in zip(diff_r, diffs)]
 
-                # Both inside: emit next vertex and move to next edge
-                with m.If(curr_inside & next_inside):
+                m.d.comb += inv.o.ready.eq(1)
+                with m.If(inv.o.valid):
+                    # t = t_num * inv(t_den), constrained back to the base
+                    # fixed-point width to avoid overflow
+                    t_full = t_num * inv.o.p
+                    m.d.sync += t.eq(t_full.reshape(FixedPoint.f_bits))
+                    m.next = "APPLY"
+
+            with m.State("APPLY"):
+                # Apply intersection at t, `parallel` fields per cycle
+                if DEBUG:
+                    with m.If(lerp_step == 0):
+                        m.d.sync += Print(Format("PLANE {} t {}", plane, t))
+
+                for j in range(parallel):
+                    m.d.comb += lane_r[j].eq(lerp(lane_a[j], lane_d[j], t))
+
+                with m.Switch(lerp_step):
+                    for k in range(lerp_steps):
+                        with m.Case(k):
+                            for j, f in enumerate(lerp_group(k)):
+                                m.d.comb += [
+                                    lane_a[j].eq(a_fields[f]),
+                                    lane_d[j].eq(diff_r[f]),
+                                ]
+                                m.d.sync += r_fields[f].eq(lane_r[j])
+
+                with m.If(lerp_step != lerp_steps - 1):
+                    m.d.sync += lerp_step.eq(lerp_step + 1)
+                with m.Elif(can_emit):
+                    emit(intersection)
+
+                    # Continue with the next edge
                     m.d.sync += [
-                        clip_buf[dst][out_count].eq(next_v),
-                        clip_count[dst].eq(out_count + 1),
+                        lerp_step.eq(0),
+                        a_v.eq(b_v),
+                        a_dist.eq(b_v_dist),
                     ]
-                    # Move to next edge
-                    with m.If(clip_idx == clip_count[src] - 1):
-                        # Done with this plane
-                        m.d.sync += clip_src.eq(dst)
-                        with m.If(clip_plane == 5):
-                            # All planes done
-                            m.next = "CLIP_EMIT"
-                        with m.Else():
-                            m.d.sync += clip_plane.eq(clip_plane + 1)
-                            m.next = "CLIP_PLANE"
+                    with m.If(closing):
+                        m.next = "FLUSH"
+                    with m.Elif(end_pending):
+                        m.next = "CLOSE"
                     with m.Else():
-                        m.d.sync += clip_idx.eq(clip_idx + 1)
-                # Exiting: emit intersection
-                with m.Elif(curr_inside & ~next_inside):
-                    # Compute t via reciprocal: request inv(t_den)
-                    m.d.sync += [
-                        t_num.eq(curr_dist),
-                        t_den.eq(curr_dist - next_dist),
-                        emit_next.eq(0),
-                    ]
-                    m.next = "CLIP_INV_REQ"
-                # Entering: emit intersection and next vertex
-                with m.Elif(~curr_inside & next_inside):
-                    # Compute t via reciprocal: request inv(t_den)
+                        m.next = "RECV"
+
+            with m.State("FLUSH"):
+                # Send the held vertex as the last one of the polygon
+                with m.If(~pend_valid):
+                    m.next = "RECV"
+                with m.Elif(~self.o.valid | self.o.ready):
                     m.d.sync += [
-                        t_num.eq(curr_dist),
-                        t_den.eq(curr_dist - next_dist),
-                        emit_next.eq(1),
+                        self.o.p.vertex.eq(pend_v),
+                        self.o.p.last.eq(1),
+                        self.o.p.planes.eq(planes),
+                        self.o.valid.eq(1),
+                        pend_valid.eq(0),
                     ]
-                    m.next = "CLIP_INV_REQ"
-                # Both outside: emit nothing, move to next edge
-                with m.Else():
-                    # Move to next edge
-                    with m.If(clip_idx == clip_count[src] - 1):
-                        # Done with this plane
-                        m.d.sync += clip_src.eq(dst)
-                        with m.If(clip_plane == 5):
-                            # All planes done
-                            m.next = "CLIP_EMIT"
-                        with m.Else():
-                            m.d.sync += clip_plane.eq(clip_plane + 1)
-                            m.next = "CLIP_PLANE"
-                    with m.Else():
-                        m.d.sync += clip_idx.eq(clip_idx + 1)
+                    m.next = "RECV"
 
-            # Request reciprocal for t_den
-            with m.State("CLIP_INV_REQ"):
-                m.d.comb += [
-                    inv.i.valid.eq(1),
-                    inv.i.payload.eq(t_den),
-                ]
-                with m.If(inv.i.ready):
-                    m.next = "CLIP_INV_WAIT"
+        return m
 
-            with m.State("CLIP_INV_WAIT"):
-                m.d.comb += inv.o.ready.eq(1)
-                with m.If(inv.o.valid):
-                    m.d.sync += t_recip.eq(inv.o.p)
-                    m.next = "CLIP_APPLY"
-
-            with m.State("CLIP_APPLY"):
-                # Apply intersection using t = t_num * t_recip
-                src = clip_src
-                dst = ~clip_src
-                curr_idx = edge_curr_idx
-                next_idx = edge_next_idx
-                curr_v = clip_buf[src][curr_idx]
-                next_v = clip_buf[src][next_idx]
-                out_count = clip_count[dst]
 
-                m.d.sync += Print(
-                    Format(
-                        "CLIP_APPLY plane {} src {} dst {} curr {} next {} out {} emit_next {}",
-                        clip_plane,
-                        src,
-                        dst,
-                        curr_idx,
-                        next_idx,
-                        out_count,
-                        emit_next,
-                    )
-                )
+class PrimitiveClipper(wiring.Component):
+    """Primitive clipper for rasterizer stage.
 
-                t = Signal(FixedPoint)
-                t_full = t_num * t_recip
-                # Constrain t back to the base fixed-point width to avoid overflow
-                m.d.comb += t.eq(t_full.reshape(FixedPoint.f_bits))
+    - Input: stream of `RasterizerLayout` vertices (assembled order depends on primitive type).
+    - Output: stream of `RasterizerLayout` vertices with primitives fully inside the clip volume.
+    - Registers: primitive type (point/line/triangle).
+    - Culling: done before this stage by `PrimitiveAssembly`, so culled triangles
+      never reach the clipper; `front_facing` is carried through.
+    - Clipping: trivial accept/reject against the clip volume -w <= x,y,z <= w.
+      Triangles crossing it are streamed through a pipeline of `PlaneClipper`
+      stages, one per plane with a FIFO between them, and the clipped
+      polygon is emitted as a triangle fan. Several triangles can be in
+      flight in different stages at once.
+    """
 
-                def lerp(a, b, t):
-                    # Keep intermediate products at the base fractional precision
-                    a_v = Value.cast(a, FixedPoint.f_bits)
-                    b_v = Value.cast(b, FixedPoint.f_bits)
-                    diff = (b_v - a_v).reshape(FixedPoint.f_bits)
-                    prod = (t * diff).reshape(FixedPoint.f_bits)
-                    return (a_v + prod).reshape(FixedPoint.f_bits)
+    is_vertex: In(stream.Signature(RasterizerLayout))
+    os_vertex: Out(stream.Signature(RasterizerLayout))
 
-                def lerp_a(a, b, t, n):
-                    return [lerp(a[i], b[i], t) for i in range(n)]
+    prim_type: In(PrimitiveType)
+    ready: Out(1)
 
-                pos = lerp_a(curr_v.position_ndc, next_v.position_ndc, t, 4)
-                col = lerp_a(curr_v.color, next_v.color, t, 4)
+    def __init__(self, fifo_depth: int = 10, lerp_parallel: int = 4):
+        # a whole clipped polygon (up to 9 vertices) fits between two stages
+        self._fifo_depth = fifo_depth
+        self._lerp_parallel = lerp_parallel
+        super().__init__()
 
-                # Force the intersected coordinate to lie exactly on the clipping plane
-                # to avoid tiny fixed-point overshoot (e.g. 1.00012 instead of 1.0).
-                pos_clamped = [Signal.like(pos[i]) for i in range(len(pos))]
+    def elaborate(self, platform):
+        m = Module()
+
+        buf = [Signal(RasterizerLayout) for _ in range(3)]
+        pending = Signal(3, init=0b001)  # one-hot slot of the next vertex
+        needed = Signal(range(4))
+        last_slot = Signal(3)  # one-hot slot of the last vertex
+        clip_planes = Signal(num_clip_planes)  # planes crossed by the triangle
+
+        # Primitive vertex count based on register
+        with m.Switch(self.prim_type):
+            with m.Case(PrimitiveType.POINTS):
+                m.d.comb += [needed.eq(1), last_slot.eq(0b001)]
+            with m.Case(PrimitiveType.LINES):
+                m.d.comb += [needed.eq(2), last_slot.eq(0b010)]
+            with m.Default():
+                m.d.comb += [needed.eq(3), last_slot.eq(0b100)]
+
+        # Plane clipper pipeline: stage k clips against plane k
+        stages = []
+        fifos = []
+        for plane in range(num_clip_planes):
+            stage = PlaneClipper(plane, parallel=self._lerp_parallel)
+            m.submodules[f"p{plane}"] = stage
+
+            if stages:
+                fifo = SyncFIFOBuffered(
+                    width=ClipVertexLayout.as_shape().size, depth=self._fifo_depth
+                )
+                m.submodules[f"fifo{plane}"] = fifo
                 m.d.comb += [
-                    pos_clamped[0].eq(
-                        Mux(
-                            clip_plane == 0,
-                            pos[3],
-                            Mux(clip_plane == 1, -pos[3], pos[0]),
-                        )
-                    ),
-                    pos_clamped[1].eq(
-                        Mux(
-                            clip_plane == 2,
-                            pos[3],
-                            Mux(clip_plane == 3, -pos[3], pos[1]),
-                        )
-                    ),
-                    pos_clamped[2].eq(
-                        Mux(
-                            clip_plane == 4,
-                            pos[3],
-                            Mux(clip_plane == 5, -pos[3], pos[2]),
-                        )
-                    ),
-                    pos_clamped[3].eq(pos[3]),
+                    fifo.w_data.eq(stages[-1].o.p),
+                    fifo.w_en.eq(stages[-1].o.valid),
+                    stages[-1].o.ready.eq(fifo.w_rdy),
+                    stage.i.p.eq(fifo.r_data),
+                    stage.i.valid.eq(fifo.r_rdy),
+                    fifo.r_en.eq(stage.i.ready),
                 ]
+                fifos.append(fifo)
 
-                # Build interpolated texcoords
-                m.d.sync += Print(Format("      t {}", t))
+            stages.append(stage)
 
-                # Assign individual fields directly
-                for i in range(4):
-                    m.d.sync += (
-                        clip_buf[dst][out_count].position_ndc[i].eq(pos_clamped[i])
-                    )
-                for i in range(4):
-                    m.d.sync += clip_buf[dst][out_count].color[i].eq(col[i])
-                for ti in range(num_textures):
-                    tex = lerp_a(curr_v.texcoords[ti], next_v.texcoords[ti], t, 4)
-                    for i in range(4):
-                        m.d.sync += clip_buf[dst][out_count].texcoords[ti][i].eq(tex[i])
-                m.d.sync += clip_buf[dst][out_count].front_facing.eq(
-                    curr_v.front_facing
-                )
+        clip_in = stages[0].i
+        clip_out = stages[-1].o
 
-                with m.If(emit_next):
-                    m.d.sync += [
-                        clip_buf[dst][out_count + 1].eq(next_v),
-                        clip_count[dst].eq(out_count + 2),
-                    ]
-                with m.Else():
-                    m.d.sync += [
-                        clip_count[dst].eq(out_count + 1),
-                    ]
+        m.submodules.w_out = w_out = WideStreamOutput(self.os_vertex.p.shape(), 3)
+        wiring.connect(m, wiring.flipped(self.os_vertex), w_out.o)
 
-                # Continue to next edge or next plane
-                with m.If(clip_idx == clip_count[src] - 1):
-                    m.d.sync += clip_src.eq(dst)
-                    with m.If(clip_plane == 5):
-                        m.next = "CLIP_EMIT"
-                    with m.Else():
-                        m.d.sync += clip_plane.eq(clip_plane + 1)
-                        m.next = "CLIP_PLANE"
-                with m.Else():
-                    m.d.sync += clip_idx.eq(clip_idx + 1)
-                    m.next = "CLIP_EDGE"
+        with m.If(w_out.i.ready):
+            m.d.sync += w_out.i.valid.eq(0)
+        with m.If(w_out.n.ready):
+            m.d.sync += w_out.n.valid.eq(0)
 
-            with m.State("CLIP_EMIT"):
-                # Emit clipped polygon as triangle fan
-                final_buf = clip_src
-                final_count = clip_count[final_buf]
+        # A new primitive can be written in the cycle the previous one is taken
+        w_out_free = (~w_out.i.valid | w_out.i.ready) & (~w_out.n.valid | w_out.n.ready)
 
-                m.d.sync += Print(
-                    Format(
-                        "CLIP_EMIT count {} plane {} src {}",
-                        final_count,
-                        clip_plane,
-                        final_buf,
-                    )
-                )
+        # Emit clipped polygons as triangle fans: (0, i-1, i)
+        fan_v0 = Signal(RasterizerLayout)
+        fan_prev = Signal(RasterizerLayout)
+        fan_idle = Signal()
 
-                with m.If(final_count < 3):
-                    # Clipped to nothing
-                    m.next = "COLLECT"
-                with m.Else():
-                    # Emit first triangle
-                    m.d.sync += clip_idx.eq(2)
-                    m.next = "CLIP_OUTPUT"
-
-            with m.State("CLIP_OUTPUT"):
-                # Output triangle as fan: (0, idx-1, idx)
-                final_buf = clip_src
-                final_count = clip_count[final_buf]
-
-                with m.If(~w_out.i.valid & ~w_out.n.valid):
-                    out_vertices = Signal.like(w_out.i.p)
-                    m.d.comb += [
-                        out_vertices[0].eq(clip_buf[final_buf][0]),
-                        out_vertices[1].eq(clip_buf[final_buf][clip_idx - 1]),
-                        out_vertices[2].eq(clip_buf[final_buf][clip_idx]),
-                    ]
+        with m.FSM(name="fan"):
+            with m.State("FAN_V0"):
+                m.d.comb += [
+                    clip_out.ready.eq(1),
+                    fan_idle.eq(~clip_out.valid),
+                ]
+                with m.If(clip_out.valid):
+                    m.d.sync += fan_v0.eq(clip_out.p.vertex)
+                    # polygons with fewer than 3 vertices are dropped
+                    with m.If(~clip_out.p.last):
+                        m.next = "FAN_V1"
+
+            with m.State("FAN_V1"):
+                m.d.comb += clip_out.ready.eq(1)
+                with m.If(clip_out.valid):
+                    m.d.sync += fan_prev.eq(clip_out.p.vertex)
+                    with m.If(clip_out.p.last):
+                        m.next = "FAN_V0"
+                    with m.Else():
+                        m.next = "FAN_TRI"
+
+            with m.State("FAN_TRI"):
+                m.d.comb += clip_out.ready.eq(w_out_free)
+                with m.If(clip_out.valid & w_out_free):
                     m.d.sync += [
-                        w_out.i.p.eq(out_vertices),
+                        w_out.i.p[0].eq(fan_v0),
+                        w_out.i.p[1].eq(fan_prev),
+                        w_out.i.p[2].eq(clip_out.p.vertex),
                         w_out.i.valid.eq(1),
                         w_out.n.p.eq(3),
                         w_out.n.valid.eq(1),
+                        fan_prev.eq(clip_out.p.vertex),
                     ]
+                    with m.If(clip_out.p.last):
+                        m.next = "FAN_V0"
+
+        # No polygon is in flight in the clipping pipeline
+        clip_idle = Signal()
+        m.d.comb += clip_idle.eq(
+            fan_idle
+            & Cat(s.ready for s in stages).all()
+            & Cat(f.level == 0 for f in fifos).all()
+        )
 
-                    # Check if this is the last triangle
-                    with m.If(clip_idx == final_count - 1):
-                        # Done, go back to COLLECT
+        # Clip codes for trivial accept/reject.
+        # Helper function to compute clip code for a vertex: a bit is
+        # the sign of the (full width) distance from its plane
+        def compute_clip_code(vtx):
+            x, y, z, w = vtx.position_ndc
+
+            def outside(dist):
+                return dist.as_value()[-1]
+
+            bits = [
+                outside(w - x),  # +x
+                outside(x + w),  # -x
+                outside(w - y),  # +y
+                outside(y + w),  # -y
+                outside(w - z),  # +z
+                outside(z + w),  # -z
+            ]
+            return Cat(bits)
+
+        # Codes are registered as the vertices arrive, so the primitive is
+        # classified in the cycle its last vertex is taken.
+        code_in = Signal(6)
+        codes = [Signal(6) for _ in range(3)]
+        m.d.comb += code_in.eq(compute_clip_code(self.is_vertex.payload))
+
+        prim_codes = [Mux(pending[i], code_in, codes[i]) for i in range(3)]
+        prim_used = [C(1), ~last_slot[0], last_slot[2]]
+        codes_and = Signal(6)
+        codes_or = Signal(6)
+        m.d.comb += [
+            codes_and.eq(
+                reduce(
+                    lambda a, b: a & b,
+                    (Mux(u, c, 0b111111) for c, u in zip(prim_codes, prim_used)),
+                )
+            ),
+            codes_or.eq(
+                reduce(
+                    lambda a, b: a | b,
+                    (Mux(u, c, 0) for c, u in zip(prim_codes, prim_used)),
+                )
+            ),
+        ]
+
+        with m.FSM():
+            with m.State("COLLECT"):
+                last = (pending & last_slot).any()
+                reject = codes_and != 0
+                accept = codes_or == 0
+                # Trivially accepted primitives are forwarded once the clipped
+                # ones before them have left, to keep primitive order.
+                m.d.comb += [
+                    self.is_vertex.ready.eq(
+                        ~last | reject | ~accept | (w_out_free & clip_idle)
+                    ),
+                    self.ready.eq(clip_idle),
+                ]
+                with m.If(self.is_vertex.valid & self.is_vertex.ready):
+                    for i in range(3):
+                        with m.If(pending[i]):
+                            m.d.sync += [
+                                buf[i].eq(self.is_vertex.payload),
+                                codes[i].eq(code_in),
+                            ]
+                    with m.If(last):
+                        m.d.sync += pending.eq(0b001)
+
+                        if DEBUG:
+                            m.d.sync += Print(
+                                Format(
+                                    "Clip codes: {:06b}, {:06b}, {:06b}",
+                                    *prim_codes,
+                                )
+                            )
+
+                        with m.If(reject):
+                            if DEBUG:
+                                m.d.sync += Print("Trivial reject")
+                            # Fully outside; drop primitive.
+                        with m.Elif(accept):
+                            if DEBUG:
+                                m.d.sync += Print("Trivial accept")
+                            # Fully inside; forward primitive.
+                            m.d.sync += [
+                                w_out.i.p[i].eq(
+                                    Mux(pending[i], self.is_vertex.payload, buf[i])
+                                )
+                                for i in range(3)
+                            ]
+                            m.d.sync += [
+                                w_out.n.p.eq(needed),
+                                w_out.i.valid.eq(1),
+                                w_out.n.valid.eq(1),
+                            ]
+                        with m.Elif(needed == 3):
+                            # Needs clipping: Sutherland-Hodgman for triangles only.
+                            # Only the stages of the crossed planes clip it.
+                            m.d.sync += clip_planes.eq(codes_or)
+                            m.next = "CLIP"
+                        # TODO: implement line clipping (Cohen-Sutherland or Liang-Barsky)
+                    with m.Else():
+                        m.d.sync += pending.eq(pending << 1)
+
+            with m.State("CLIP"):
+                # Stream the triangle into the plane clipper pipeline. The
+                # buffer is shifted down instead of indexed, so no vertex-wide
+                # mux feeds the first stage.
+                m.d.comb += [
+                    clip_in.p.vertex.eq(buf[0]),
+                    clip_in.p.last.eq(pending[2]),
+                    clip_in.p.planes.eq(clip_planes),
+                    clip_in.valid.eq(1),
+                ]
+                with m.If(clip_in.ready):
+                    m.d.sync += [
+                        buf[0].eq(buf[1]),
+                        buf[1].eq(buf[2]),
+                    ]
+                    with m.If(pending[2]):
+                        m.d.sync += pending.eq(0b001)
                         m.next = "COLLECT"
                     with m.Else():
-                        # More triangles to emit, increment and stay in CLIP_OUTPUT
-                        m.d.sync += clip_idx.eq(clip_idx + 1)
+                        m.d.sync += pending.eq(pending << 1)
 
         return m
@@ -1,11 +1,20 @@
 from amaranth import *
-from amaranth.lib import stream, wiring
+from amaranth.lib import data, stream, wiring
+from amaranth.lib.fifo import SyncFIFOBuffered
 from amaranth.lib.wiring import In, Out
+from amaranth.utils import exact_log2
 
 from ..utils import fixed
 from ..utils import math as gpu_math
-from ..utils.layouts import FragmentLayout, FramebufferInfoLayout, RasterizerLayout
-from ..utils.transactron_utils import max_value, min_value
+from ..utils.layouts import (
+    DepthQueryLayout,
+    FragmentLayout,
+    FramebufferInfoLayout,
+    RasterizerLayout,
+    texture_coords,
+)
+from ..utils.transactron_utils import max_value, min_max_onehot, min_value, or_value
+from ..utils.types import FixedPoint, Vector4
 
 
 class TriangleRasterizer(wiring.Component):
@@ -16,42 +25,126 @@ class TriangleRasterizer(wiring.Component):
     Input: RasterizerLayout stream (3 vertices per triangle)
     Output: FragmentLayout stream (one per covered pixel)
 
+    The bounding box is walked in square blocks of pixels. A block is
+    skipped in a single cycle when one edge function is outside at all its
+    corners; otherwise it is scanned in 2x2 pixel quads: all four samples of
+    a quad are tested in one cycle, and only the covered ones are queued for
+    interpolation.
+
+    Interpolation is a pipeline of its own, with one reciprocal unit for the
+    perspective divide: a new sample can enter it every cycle, so the scan
+    does not wait for the interpolation of the previous one. The reciprocal
+    of the area has its own unit and is computed while the scan starts.
+    The attributes of a fragment are interpolated a few at a time, sharing
+    the same multipliers. Fragments are emitted through a small output FIFO.
+
+    With ``early_depth`` enabled the depth of every covered sample is computed
+    first (it only needs the area reciprocal) and sent on ``os_depth_query``.
+    For each query, in order, ``is_depth_result`` tells if the fragment may
+    pass the depth test; failing samples are dropped before the perspective
+    divide and the interpolation of the other attributes.
+
     TODO: support for lines and points (for now only triangles)
 
     TODO: values overflow when
     """
 
-    is_vertex: In(stream.Signature(RasterizerLayout))
-    os_fragment: Out(stream.Signature(FragmentLayout))
+    is_vertex: stream.Interface
+    os_fragment: stream.Interface
+    os_depth_query: stream.Interface
+    is_depth_result: stream.Interface
 
     # Framebuffer configuration
-    fb_info: In(FramebufferInfoLayout)
-    ready: Out(1)
-
-    def __init__(self, inv_steps: int = 4, subpixel_bits: int = 4):
+    fb_info: Signal
+    ready: Signal
+
+    def __init__(
+        self,
+        inv_steps: int = 1,
+        inv_seed_bits: int = 8,
+        subpixel_bits: int = 4,
+        fifo_depth: int = 4,
+        block_size: int = 8,
+        interp_lanes: int = 1,
+        early_depth: bool = False,
+    ):
         """Initialize the rasterizer.
 
         Args:
             inv_steps: Number of Newton-Raphson iterations for reciprocal
+            inv_seed_bits: Index bits of the reciprocal seed table
             subpixel_bits: Number of fractional bits for subpixel precision (default 4 = 16x16)
+            fifo_depth: Depth of the output fragment FIFO (one quad by default)
+            block_size: Side of the blocks tested for rejection, in pixels
+            interp_lanes: Number of attributes interpolated per cycle (each
+                lane has three multipliers)
+            early_depth: Query the depth test before interpolating
         """
-        super().__init__()
+        assert block_size >= 2 and block_size % 2 == 0, "blocks hold whole quads"
+        ports = {
+            "is_vertex": In(stream.Signature(RasterizerLayout)),
+            "os_fragment": Out(stream.Signature(FragmentLayout)),
+            "fb_info": In(FramebufferInfoLayout),
+            "ready": Out(1),
+        }
+        if early_depth:
+            ports["os_depth_query"] = Out(stream.Signature(DepthQueryLayout))
+            ports["is_depth_result"] = In(stream.Signature(unsigned(1)))
+        super().__init__(ports)
         self._inv_steps = inv_steps
+        self._inv_seed_bits = inv_seed_bits
         self._subpixel_bits = subpixel_bits
+        self._fifo_depth = fifo_depth
+        self._block_size = block_size
+        self._interp_lanes = interp_lanes
+        self._early_depth = early_depth
 
     def elaborate(self, platform):
         m = Module()
 
-        # Buffer for triangle vertices
-        vtx = Array(Signal(RasterizerLayout) for _ in range(3))
+        # Fragments leave through the output FIFO
+        frag = stream.Signature(FragmentLayout).create()
+        idle = Signal()
+
+        m.submodules.out_fifo = out_fifo = SyncFIFOBuffered(
+            width=Shape.cast(FragmentLayout).width, depth=self._fifo_depth
+        )
+        m.d.comb += [
+            out_fifo.w_data.eq(frag.payload),
+            out_fifo.w_en.eq(frag.valid),
+            frag.ready.eq(out_fifo.w_rdy),
+            self.os_fragment.payload.eq(out_fifo.r_data),
+            self.os_fragment.valid.eq(out_fifo.r_rdy),
+            out_fifo.r_en.eq(self.os_fragment.ready),
+            self.ready.eq(idle & (out_fifo.level == 0)),
+        ]
+
+        # Triangle vertices, stored per field: positions are only kept in
+        # screen space, transformed as the vertices arrive
         vtx_idx = Signal(range(3))
 
+        # Screen positions are narrow (16 bits with the default 4 subpixel
+        # bits), so coverage only needs 17x17 bit edge function multipliers;
+        # the attributes keep the full FixedPoint precision.
         fb_pos_int_bits = 12
         s_fb_type = fixed.SQ(fb_pos_int_bits, self._subpixel_bits)
 
-        # Screen-space coordinates of vertices
-        screen_x = Array(Signal(s_fb_type) for _ in range(3))
-        screen_y = Array(Signal(s_fb_type) for _ in range(3))
+        screen_x = Array(Signal(s_fb_type, name=f"screen_x_{i}") for i in range(3))
+        screen_y = Array(Signal(s_fb_type, name=f"screen_y_{i}") for i in range(3))
+        vtx_z = Array(Signal(FixedPoint, name=f"vtx_z_{i}") for i in range(3))
+        # w of an NDC position is 1 / w_clip, left there by the perspective divide
+        vtx_inv_w = Array(Signal(FixedPoint, name=f"vtx_inv_w_{i}") for i in range(3))
+        vtx_color = Array(Signal(Vector4, name=f"vtx_color_{i}") for i in range(3))
+        vtx_texcoords = Array(
+            Signal(texture_coords, name=f"vtx_texcoords_{i}") for i in range(3)
+        )
+        front_facing = Signal()
+
+        # Operands of the viewport transform multiplier, shared by x and y
+        vp_coord_y = Signal()  # y of the current vertex is transformed
+        vp_ndc = Signal(FixedPoint)
+        vp_offset = Signal(FixedPoint)
+        vp_scale = Signal(FixedPoint)
 
         # Bounding box
         bb_min_x = Signal(signed(fb_pos_int_bits + 1))
@@ -59,91 +152,198 @@ class TriangleRasterizer(wiring.Component):
         bb_max_x = Signal(signed(fb_pos_int_bits + 1))
         bb_max_y = Signal(signed(fb_pos_int_bits + 1))
 
+        # Far scissor edges. fb_info is static while triangles are in flight,
+        # so the sums are registered to keep the adders out of CULLING.
+        scissor_end_x = self.fb_info.scissor_offset_x + self.fb_info.scissor_width
+        scissor_end_y = self.fb_info.scissor_offset_y + self.fb_info.scissor_height
+        scissor_max_x = Signal.like(scissor_end_x)
+        scissor_max_y = Signal.like(scissor_end_y)
+        m.d.sync += [scissor_max_x.eq(scissor_end_x), scissor_max_y.eq(scissor_end_y)]
+
         # Clamped bounding box (after scissor)
         min_x = Signal(unsigned(fb_pos_int_bits))
         min_y = Signal(unsigned(fb_pos_int_bits))
         max_x = Signal(unsigned(fb_pos_int_bits))
         max_y = Signal(unsigned(fb_pos_int_bits))
 
-        # Current sample being tested
+        block = self._block_size
+
+        # Top-left sample of the current block
+        bx = Signal(fb_pos_int_bits)
+        by = Signal(fb_pos_int_bits)
+
+        # Top-left sample of the current 2x2 quad
         px = Signal(fb_pos_int_bits)
         py = Signal(fb_pos_int_bits)
 
+        # Samples of a quad, as offsets from its top-left one (bit order of
+        # quad_mask)
+        quad_offsets = [(0, 0), (1, 0), (0, 1), (1, 1)]
+
+        # Fragment being emitted
+        frag_x = Signal(fb_pos_int_bits)
+        frag_y = Signal(fb_pos_int_bits)
+
         # Barycentric coordinates (unnormalized edge function values)
         weight_shape = fixed.SQ(2 * fb_pos_int_bits + 1, 4)
 
-        # Reciprocal unit for perspective-correct interpolation
-        m.submodules.inv = inv = gpu_math.FixedPointInv(
-            weight_shape, steps=self._inv_steps
+        # Reciprocal units for barycentric normalization and for
+        # perspective-correct interpolation
+        m.submodules.inv_area = inv_area = gpu_math.FixedPointInv(
+            weight_shape, steps=self._inv_steps, seed_bits=self._inv_seed_bits
+        )
+        m.submodules.inv_persp = inv_persp = gpu_math.FixedPointInv(
+            weight_shape, steps=self._inv_steps, seed_bits=self._inv_seed_bits
         )
 
-        w0 = Signal(weight_shape)
-        w1 = Signal(weight_shape)
-        w2 = Signal(weight_shape)
         area = Signal(weight_shape)
-        area_recip = Signal.like(inv.o.payload)
+        area_recip = Signal.like(inv_area.o.payload)
+        area_pending = Signal()  # area_recip not computed yet
 
         inv_w_sum = Signal(weight_shape)
-        inv_w_sum_recip = Signal.like(inv.o.payload)
+
+        # Covered sample waiting for interpolation
+        sample_layout = data.StructLayout(
+            {
+                "w": data.ArrayLayout(weight_shape, 3),
+                "x": unsigned(fb_pos_int_bits),
+                "y": unsigned(fb_pos_int_bits),
+            }
+        )
+        interp_idle = Signal()  # no sample of the triangle is left to emit
 
         # Fixed-point type for interpolation accumulators
         weight_persp = Array(Signal(fixed.UQ(1, 15)) for _ in range(3))
         weight_linear = Array(Signal(fixed.UQ(1, 15)) for _ in range(3))
 
-        def vtx_attr(interp_type, v0, v1, v2):
-            match interp_type:
-                case "perspective":
-                    return (
-                        weight_persp[0] * v0
-                        + weight_persp[1] * v1
-                        + weight_persp[2] * v2
-                    )
-                case "linear":
-                    return (
-                        weight_linear[0] * v0
-                        + weight_linear[1] * v1
-                        + weight_linear[2] * v2
-                    )
-                case _:
-                    raise ValueError(f"Unknown interpolation type: {interp_type}")
-
         # Edge function helper
         def edge_fn(ax, ay, bx, by, cx, cy):
             """Compute edge function: (B-A) × (C-A)"""
             return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
 
+        # Edge i is the one opposite to vertex i, from vertex i+1 to vertex i+2
+        def edge_at(i, cx, cy):
+            a, b = (i + 1) % 3, (i + 2) % 3
+            return edge_fn(screen_x[a], screen_y[a], screen_x[b], screen_y[b], cx, cy)
+
+        # Edge functions are linear in the sample position, so they are
+        # evaluated once per triangle and then stepped by their x (A) and
+        # y (B) increments: the scan loop only adds. Values are kept exact
+        # at the full precision of edge_fn.
+        edge_shape = edge_at(0, screen_x[0], screen_y[0]).shape()
+        edge_val = Array(Signal(edge_shape, name=f"edge_val_{i}") for i in range(3))
+        edge_row = Array(Signal(edge_shape, name=f"edge_row_{i}") for i in range(3))
+
+        # The edge functions at any point sum to the (doubled, signed) area,
+        # so only two of them have to be evaluated with multipliers
+        area_exact = Signal(edge_shape)
+
+        # Orientation of the triangle (exact, the rounded area may be zero)
+        area_pos = Signal()
+        area_neg = Signal()
+
+        # Top-left fill rule: a sample exactly on an edge is covered only if
+        # the edge is owned, i.e. its inward normal points right, or straight
+        # down the y axis. Of two triangles sharing an edge exactly one owns it.
+        edge_owned = Signal(3)
+
+        # The stored edge function values are biased by one LSB where needed
+        # (edges not owned by a positive triangle, owned by a negative one),
+        # so that a sample is covered iff all of them are non-negative for a
+        # positive triangle, or all negative for a negative one: coverage
+        # only looks at their sign bits.
+        edge_bias = Signal(3)
+        m.d.comb += edge_bias.eq(edge_owned ^ area_pos.replicate(3))
+
+        def bias(i):
+            lsb = Cat(edge_bias[i], C(0, edge_shape.f_bits))
+            return fixed.Value.cast(lsb, edge_shape.f_bits)
+
+        def sign(v):
+            return v.as_value()[-1]
+
+        step_shape = (screen_y[0] - screen_y[1]).shape()
+        edge_a = Array(Signal(step_shape, name=f"edge_a_{i}") for i in range(3))
+        edge_b = Array(Signal(step_shape, name=f"edge_b_{i}") for i in range(3))
+
+        # Edge function values of the samples of the current quad
+        quad_w = [
+            [Signal(weight_shape, name=f"quad_w_{j}_{i}") for i in range(3)]
+            for j in range(4)
+        ]
+        quad_mask = Signal(4)  # samples still to be emitted
+
+        # Both sample rows of the current quad are outside an edge that only
+        # gets further away to the right, so the rest of the quad row in the
+        # block is empty
+        row_done = Signal()
+
+        # Edge function values at the top-left sample of the current block and
+        # of the first block of its row
+        blk_val = Array(Signal(edge_shape, name=f"blk_val_{i}") for i in range(3))
+        blk_row = Array(Signal(edge_shape, name=f"blk_row_{i}") for i in range(3))
+
+        # Samples queued by the scan
+        m.submodules.samples = samples = SyncFIFOBuffered(
+            width=sample_layout.size, depth=4
+        )
+        sample_in = Signal(sample_layout)
+        m.d.comb += samples.w_data.eq(sample_in)
+
         with m.FSM():
             with m.State("COLLECT"):
-                m.d.comb += [self.is_vertex.ready.eq(1), self.ready.eq(1)]
-                with m.If(self.is_vertex.valid):
-                    m.d.sync += vtx[vtx_idx].eq(self.is_vertex.payload)
-                    with m.If(vtx_idx == 2):
-                        m.d.sync += vtx_idx.eq(0)
-                        m.next = "SETUP"
-                    with m.Else():
-                        m.d.sync += vtx_idx.eq(vtx_idx + 1)
+                # The vertices are kept until all fragments are interpolated.
+                # Each vertex takes two cycles, x then y, so that the
+                # viewport transform needs a single multiplier.
+                m.d.comb += [
+                    self.is_vertex.ready.eq(interp_idle & vp_coord_y),
+                    idle.eq(interp_idle & ~area_pending),
+                ]
+                v = self.is_vertex.payload
 
-            with m.State("SETUP"):
-                # Viewport transform: NDC [-1,1] to screen space with subpixel precision
+                # Viewport transform: NDC [-1,1] to screen space with
+                # subpixel precision
                 # screen_x = (viewport_x + (ndc_x + 1) * viewport_width / 2)
                 # screen_y = (viewport_y + (ndc_y + 1) * viewport_height / 2)
-
-                for i in range(3):
-                    m.d.sync += [
-                        screen_x[i].eq(
-                            self.fb_info.viewport_x
-                            + (vtx[i].position_ndc[0] + 1) * self.fb_info.viewport_width
-                            >> 1
-                        ),
-                        screen_y[i].eq(
-                            self.fb_info.viewport_y
-                            + (vtx[i].position_ndc[1] + 1)
-                            * self.fb_info.viewport_height
-                            >> 1
-                        ),
+                with m.If(vp_coord_y):
+                    m.d.comb += [
+                        vp_ndc.eq(v.position_ndc[1]),
+                        vp_offset.eq(self.fb_info.viewport_y),
+                        vp_scale.eq(self.fb_info.viewport_height),
                     ]
+                with m.Else():
+                    m.d.comb += [
+                        vp_ndc.eq(v.position_ndc[0]),
+                        vp_offset.eq(self.fb_info.viewport_x),
+                        vp_scale.eq(self.fb_info.viewport_width),
+                    ]
+                vp_screen = vp_offset + (vp_ndc + 1) * vp_scale >> 1
+
+                with m.If(self.is_vertex.valid & interp_idle):
+                    m.d.sync += vp_coord_y.eq(~vp_coord_y)
+                    with m.Switch(vtx_idx):
+                        for i in range(3):
+                            with m.Case(i):
+                                with m.If(vp_coord_y):
+                                    m.d.sync += [
+                                        screen_y[i].eq(vp_screen),
+                                        vtx_z[i].eq(v.position_ndc[2]),
+                                        vtx_inv_w[i].eq(v.position_ndc[3]),
+                                        vtx_color[i].eq(v.color),
+                                        vtx_texcoords[i].eq(v.texcoords),
+                                    ]
+                                with m.Else():
+                                    m.d.sync += screen_x[i].eq(vp_screen)
+
+                with m.If(self.is_vertex.valid & self.is_vertex.ready):
+                    with m.If(vtx_idx == 0):
+                        m.d.sync += front_facing.eq(v.front_facing)
 
-                m.next = "BOUNDING_BOX"
+                    with m.If(vtx_idx == 2):
+                        m.d.sync += vtx_idx.eq(0)
+                        m.next = "BOUNDING_BOX"
+                    with m.Else():
+                        m.d.sync += vtx_idx.eq(vtx_idx + 1)
 
             with m.State("BOUNDING_BOX"):
                 # Compute triangle area for barycentric coordinates
@@ -156,15 +356,45 @@ class TriangleRasterizer(wiring.Component):
                     screen_y[2],
                 )
                 m.d.sync += area.eq(area_val)
+                m.d.sync += area_exact.eq(area_val)
                 m.d.sync += Print("Triangle area:", area_val)
 
+                m.d.sync += [area_pos.eq(area_val > 0), area_neg.eq(area_val < 0)]
+
+                # Edge function increments for a step in x and in y. (A, B) is
+                # the inward normal of a positive triangle, (-A, -B) of a
+                # negative one.
+                for i in range(3):
+                    a, b = (i + 1) % 3, (i + 2) % 3
+                    step_a = screen_y[a] - screen_y[b]
+                    step_b = screen_x[b] - screen_x[a]
+                    m.d.sync += [
+                        edge_a[i].eq(step_a),
+                        edge_b[i].eq(step_b),
+                        edge_owned[i].eq(
+                            Mux(
+                                area_val > 0,
+                                (step_a > 0) | ((step_a == 0) & (step_b > 0)),
+                                (step_a < 0) | ((step_a == 0) & (step_b < 0)),
+                            )
+                        ),
+                    ]
+
                 # Compute bounding box in subpixel units
                 # screen_x/y are already in subpixel units, just floor/ceil them
+                # (floor is monotonic, so the extremes are picked before it)
+                def select(sel, values):
+                    return or_value(
+                        *[Mux(sel[i], v.floor(), 0) for i, v in enumerate(values)]
+                    )
+
+                min_sel_x, max_sel_x = min_max_onehot(*screen_x)
+                min_sel_y, max_sel_y = min_max_onehot(*screen_y)
                 m.d.sync += [
-                    bb_min_x.eq(min_value(*[x.floor() for x in screen_x])),
-                    bb_max_x.eq(max_value(*[x.floor() for x in screen_x])),
-                    bb_min_y.eq(min_value(*[y.floor() for y in screen_y])),
-                    bb_max_y.eq(max_value(*[y.floor() for y in screen_y])),
+                    bb_min_x.eq(select(min_sel_x, screen_x)),
+                    bb_max_x.eq(select(max_sel_x, screen_x)),
+                    bb_min_y.eq(select(min_sel_y, screen_y)),
+                    bb_max_y.eq(select(max_sel_y, screen_y)),
                 ]
 
                 m.next = "CULLING"
@@ -172,12 +402,6 @@ class TriangleRasterizer(wiring.Component):
             with m.State("CULLING"):
                 scissor_min_x = self.fb_info.scissor_offset_x
                 scissor_min_y = self.fb_info.scissor_offset_y
-                scissor_max_x = (
-                    self.fb_info.scissor_offset_x + self.fb_info.scissor_width
-                )
-                scissor_max_y = (
-                    self.fb_info.scissor_offset_y + self.fb_info.scissor_height
-                )
 
                 # Clamp bounding box to scissor rectangle
                 m.d.sync += [
@@ -187,220 +411,444 @@ class TriangleRasterizer(wiring.Component):
                     max_y.eq(min_value(bb_max_y, scissor_max_y)),
                 ]
 
-                outside_bits = Signal(4)
+                # Degenerate triangles cover no samples, and their area has no
+                # reciprocal; this also catches areas too small for its type
+                reject_bits = Signal(5)
                 m.d.comb += [
-                    outside_bits[0].eq(bb_max_x < scissor_min_x),
-                    outside_bits[1].eq(bb_max_y < scissor_min_y),
-                    outside_bits[2].eq(bb_min_x > scissor_max_x),
-                    outside_bits[3].eq(bb_min_y > scissor_max_y),
+                    reject_bits[0].eq(bb_max_x < scissor_min_x),
+                    reject_bits[1].eq(bb_max_y < scissor_min_y),
+                    reject_bits[2].eq(bb_min_x > scissor_max_x),
+                    reject_bits[3].eq(bb_min_y > scissor_max_y),
+                    reject_bits[4].eq(area == 0),
                 ]
 
-                with m.If(outside_bits.any()):
-                    # Triangle is completely outside, skip it
+                with m.If(reject_bits.any()):
+                    # Triangle is completely outside or degenerate, skip it
                     m.next = "COLLECT"
-                with m.Else():
-                    # Request reciprocal of area for barycentric normalization
+                with m.Elif(~area_pending):
+                    # Request reciprocal of area for barycentric normalization;
+                    # it is only needed once the first sample is interpolated
                     m.d.comb += [
-                        inv.i.valid.eq(1),
-                        inv.i.payload.eq(area_val),
+                        inv_area.i.valid.eq(1),
+                        inv_area.i.payload.eq(area),
                     ]
 
-                    with m.If(inv.i.ready):
-                        m.next = "AREA_RECIP_WAIT"
-
-            with m.State("AREA_RECIP_WAIT"):
-                # Wait for area reciprocal
-                m.d.comb += inv.o.ready.eq(1)
-
-                with m.If(inv.o.valid):
-                    m.d.sync += area_recip.eq(inv.o.payload)
-                    m.next = "SCAN_INIT"
+                    with m.If(inv_area.i.ready):
+                        m.d.sync += area_pending.eq(1)
+                        m.next = "SCAN_INIT"
 
             with m.State("SCAN_INIT"):
                 # Initialize scan at bounding box min (in subpixel units)
                 # Round to pixel centers for sample points
-                m.d.sync += Print(
-                    "Rasterizing triangle with area: ", area, ", inv: ", area_recip
-                )
+                m.d.sync += Print("Rasterizing triangle with area: ", area)
                 m.d.sync += [
                     # Start at first pixel center within bounding box
-                    px.eq(min_x),
-                    py.eq(min_y),
+                    bx.eq(min_x),
+                    by.eq(min_y),
                 ]
-                m.next = "SCAN"
 
-            with m.State("SCAN"):
-                # Compute barycentric coordinates using fixed-point screen coords (with subpixel precision)
-                # px, py are integer subpixel units; convert to same fixed-point type as screen_x/y
-                px_fp = Signal(s_fb_type)
-                py_fp = Signal(s_fb_type)
+                # Evaluate the edge functions at the first sample (centroid)
+                start_x = Signal(s_fb_type)
+                start_y = Signal(s_fb_type)
                 m.d.comb += [
-                    # Centroid sampling
-                    px_fp.eq(px + fixed.Const(0.5)),
-                    py_fp.eq(py + fixed.Const(0.5)),
-                ]
-
-                edgev = Array(Signal(weight_shape) for _ in range(3))
-
-                m.d.comb += [
-                    edgev[0].eq(
-                        edge_fn(
-                            screen_x[1],
-                            screen_y[1],
-                            screen_x[2],
-                            screen_y[2],
-                            px_fp,
-                            py_fp,
-                        )
-                    ),
-                    edgev[1].eq(
-                        edge_fn(
-                            screen_x[2],
-                            screen_y[2],
-                            screen_x[0],
-                            screen_y[0],
-                            px_fp,
-                            py_fp,
-                        )
-                    ),
-                    edgev[2].eq(
-                        edge_fn(
-                            screen_x[0],
-                            screen_y[0],
-                            screen_x[1],
-                            screen_y[1],
-                            px_fp,
-                            py_fp,
-                        )
-                    ),
+                    start_x.eq(min_x + fixed.Const(0.5)),
+                    start_y.eq(min_y + fixed.Const(0.5)),
                 ]
+                start_e = [edge_at(i, start_x, start_y) for i in range(2)]
+                start_e.append(area_exact - start_e[0] - start_e[1])
+                for i in range(3):
+                    m.d.sync += [
+                        blk_val[i].eq(start_e[i] - bias(i)),
+                        blk_row[i].eq(start_e[i] - bias(i)),
+                    ]
+                m.next = "BLOCK_TEST"
+
+            with m.State("BLOCK_TEST"):
+                # An edge function is linear, so if it is outside at the four
+                # corner samples of the block it is outside in the whole block.
+                # "Outside" is negative for a positive area and non-negative
+                # for a negative one (see edge_bias).
+                all_neg = []
+                all_pos = []
+                for i in range(3):
+                    span_a = (edge_a[i] << exact_log2(block)) - edge_a[i]
+                    span_b = (edge_b[i] << exact_log2(block)) - edge_b[i]
+                    corners = [
+                        blk_val[i],
+                        blk_val[i] + span_a,
+                        blk_val[i] + span_b,
+                        blk_val[i] + span_a + span_b,
+                    ]
+                    signs = Cat(sign(c) for c in corners)
+                    all_neg.append(signs.all())
+                    all_pos.append(~signs.any())
 
-                m.d.sync += [
-                    w0.eq(edgev[0]),
-                    w1.eq(edgev[1]),
-                    w2.eq(edgev[2]),
-                ]
+                reject = (area_pos & Cat(all_neg).any()) | (
+                    area_neg & Cat(all_pos).any()
+                )
 
-                edge_pos = Signal(3)
-                edge_neg = Signal(3)
+                with m.If(reject):
+                    m.next = "BLOCK_ADVANCE"
+                with m.Else():
+                    m.d.sync += [px.eq(bx), py.eq(by)]
+                    m.d.sync += [edge_val[i].eq(blk_val[i]) for i in range(3)]
+                    m.d.sync += [edge_row[i].eq(blk_val[i]) for i in range(3)]
+                    m.next = "SCAN"
 
-                # Check if pixel is inside triangle (all edge functions have same sign as area)
-                # TODO: do correct handling to include top-left edges only (per Vulkan spec)
-                m.d.comb += edge_pos.eq(Cat([e >= 0 for e in edgev]))
-                m.d.comb += edge_neg.eq(Cat([e <= 0 for e in edgev]))
+            with m.State("SCAN"):
+                # Test all samples of the quad; the other samples' edge
+                # functions are one x (A) and/or y (B) step away.
+                mask = Signal(4)
+                row_exit = [C(0), C(0)]
+                for j, (dx, dy) in enumerate(quad_offsets):
+                    signs = []
+                    for i in range(3):
+                        e = edge_val[i]
+                        if dx:
+                            e = e + edge_a[i]
+                        if dy:
+                            e = e + edge_b[i]
+                        m.d.sync += quad_w[j][i].eq(e + bias(i))
+                        signs.append(sign(e))
+
+                    # Strictly inside all edges, or on owned ones
+                    signs = Cat(signs)
+                    inside = Mux(area_pos, ~signs.any(), signs.all())
+
+                    # The triangle orientation is checked in BLOCK_TEST
+                    in_box = C(1)
+                    if dx:
+                        in_box &= px < max_x
+                    if dy:
+                        in_box &= py < max_y
+                    m.d.comb += mask[j].eq(inside & in_box)
+
+                    if dx:
+                        # Outside edges whose function does not move towards
+                        # the inside along x
+                        exit = Mux(
+                            area_pos,
+                            signs & Cat(edge_a[i] <= 0 for i in range(3)),
+                            ~signs & Cat(edge_a[i] >= 0 for i in range(3)),
+                        )
+                        row_exit[dy] = exit.any()
 
-                with m.If(edge_pos.all() | edge_neg.all()):
-                    m.next = "EMIT"
+                m.d.sync += quad_mask.eq(mask)
+                m.d.sync += row_done.eq(row_exit[0] & (row_exit[1] | (py >= max_y)))
+                with m.If(mask.any()):
+                    m.next = "QUAD"
                 with m.Else():
                     m.next = "ADVANCE"
 
-            with m.State("EMIT"):
-                # Compute perspective-correct interpolation numerators
-                # inv_w_sum = w0*inv_w0 + w1*inv_w1 + w2*inv_w2
-
-                v0w = vtx[0].position_ndc[3]
-                v1w = vtx[1].position_ndc[3]
-                v2w = vtx[2].position_ndc[3]
-
-                # Request reciprocal of inv_w_sum
-                m.d.comb += [
-                    inv_w_sum.eq(w0 * v0w + w1 * v1w + w2 * v2w),
-                    inv.i.valid.eq(1),
-                    inv.i.payload.eq(inv_w_sum),
-                ]
-
-                with m.If(inv.i.ready):
-                    m.next = "INTERP_WAIT"
+            with m.State("QUAD"):
+                # Queue the covered samples of the quad one by one
+                with m.If(quad_mask == 0):
+                    m.next = "ADVANCE"
 
-            with m.State("INTERP_WAIT"):
-                # Wait for reciprocal to complete
-                m.d.comb += inv.o.ready.eq(1)
+                for j in reversed(range(4)):
+                    with m.If(quad_mask[j] & ((quad_mask & ((1 << j) - 1)) == 0)):
+                        dx, dy = quad_offsets[j]
+                        m.d.comb += [
+                            sample_in.w[0].eq(quad_w[j][0]),
+                            sample_in.w[1].eq(quad_w[j][1]),
+                            sample_in.w[2].eq(quad_w[j][2]),
+                            sample_in.x.eq(px + dx),
+                            sample_in.y.eq(py + dy),
+                            samples.w_en.eq(1),
+                        ]
+                        with m.If(samples.w_rdy):
+                            m.d.sync += quad_mask[j].eq(0)
 
-                zero = fixed.Const(0.0)
-                one = fixed.Const(1.0)
+            with m.State("ADVANCE"):
+                # Step to the next quad of the block, two samples right or down
+                # (skipping the rest of the row once it is known to be empty)
+                with m.If((px + 1 < max_x) & (px + 2 < bx + block) & ~row_done):
+                    m.d.sync += px.eq(px + 2)
+                    m.d.sync += [
+                        edge_val[i].eq(edge_val[i] + (edge_a[i] << 1)) for i in range(3)
+                    ]
+                    m.next = "SCAN"
+                with m.Elif((py + 1 < max_y) & (py + 2 < by + block)):
+                    m.d.sync += px.eq(bx)
+                    m.d.sync += py.eq(py + 2)
+                    for i in range(3):
+                        m.d.sync += [
+                            edge_row[i].eq(edge_row[i] + (edge_b[i] << 1)),
+                            edge_val[i].eq(edge_row[i] + (edge_b[i] << 1)),
+                        ]
+                    m.next = "SCAN"
+                with m.Else():
+                    m.next = "BLOCK_ADVANCE"
 
-                wl0 = (w0 * area_recip).clamp(zero, one)
-                wl1 = (w1 * area_recip).clamp(zero, one)
+            with m.State("BLOCK_ADVANCE"):
+                # Step to the next block, `block` samples right or down
+                shift = exact_log2(block)
+                with m.If(bx + block <= max_x):
+                    m.d.sync += bx.eq(bx + block)
+                    m.d.sync += [
+                        blk_val[i].eq(blk_val[i] + (edge_a[i] << shift))
+                        for i in range(3)
+                    ]
+                    m.next = "BLOCK_TEST"
+                with m.Elif(by + block <= max_y):
+                    m.d.sync += bx.eq(min_x)
+                    m.d.sync += by.eq(by + block)
+                    for i in range(3):
+                        m.d.sync += [
+                            blk_row[i].eq(blk_row[i] + (edge_b[i] << shift)),
+                            blk_val[i].eq(blk_row[i] + (edge_b[i] << shift)),
+                        ]
+                    m.next = "BLOCK_TEST"
+                with m.Else():
+                    m.next = "COLLECT"
 
-                m.d.sync += [
-                    weight_linear[0].eq(wl0),
-                    weight_linear[1].eq(wl1),
-                    weight_linear[2].eq(one - wl0 - wl1),
-                ]
+        m.d.comb += inv_area.o.ready.eq(1)
+        with m.If(inv_area.o.valid):
+            m.d.sync += [
+                area_recip.eq(inv_area.o.payload),
+                area_pending.eq(0),
+            ]
+
+        # Interpolation pipeline:
+        # 0. optionally, early depth test of the sample
+        # 1. request 1 / inv_w_sum, the sample waits in `in_flight` meanwhile
+        #    (deep enough for the whole latency of the reciprocal unit)
+        # 2. normalize the weights, linear and perspective-correct
+        # 3. interpolate the attributes into the output FIFO
+        zero = fixed.Const(0.0)
+        one = fixed.Const(1.0)
+
+        def linear_weights(w):
+            wl0 = (w[0] * area_recip).clamp(zero, one)
+            wl1 = (w[1] * area_recip).clamp(zero, one)
+            return wl0, wl1, one - wl0 - wl1
+
+        # 0. depth, computed as in stage 3
+        s1_src, early_idle = self._early_depth_test(
+            m,
+            samples,
+            sample_layout,
+            linear_weights,
+            vtx_z,
+            front_facing,
+            ~area_pending,
+        )
 
-                with m.If(inv.o.valid):
-                    m.d.sync += inv_w_sum_recip.eq(inv.o.payload)
-                    m.next = "CALC_PERSP_WEIGHTS"
+        # 1. perspective-correct interpolation denominator
+        # inv_w_sum = w0*inv_w0 + w1*inv_w1 + w2*inv_w2
+        s1 = Signal(sample_layout)
+        s1_persp = [s1.w[i] * vtx_inv_w[i] for i in range(3)]
+
+        # The products are kept for the perspective-correct weights; the third
+        # weights are derived from the other two
+        in_flight_layout = data.StructLayout(
+            {
+                "w": data.ArrayLayout(weight_shape, 2),
+                "w_persp": data.ArrayLayout(s1_persp[0].shape(), 2),
+                "x": unsigned(fb_pos_int_bits),
+                "y": unsigned(fb_pos_int_bits),
+            }
+        )
+        m.submodules.in_flight = in_flight = SyncFIFOBuffered(
+            width=in_flight_layout.size, depth=self._inv_steps + 4
+        )
+        issue = Signal()
+        m.d.comb += [
+            s1.eq(s1_src.r_data),
+            inv_w_sum.eq(s1_persp[0] + s1_persp[1] + s1_persp[2]),
+            inv_persp.i.payload.eq(inv_w_sum),
+            inv_persp.i.valid.eq(s1_src.r_rdy & in_flight.w_rdy),
+            issue.eq(inv_persp.i.valid & inv_persp.i.ready),
+            s1_src.r_en.eq(issue),
+        ]
+
+        s1_out = Signal(in_flight_layout)
+        m.d.comb += [
+            s1_out.w[0].eq(s1.w[0]),
+            s1_out.w[1].eq(s1.w[1]),
+            s1_out.w_persp[0].eq(s1_persp[0]),
+            s1_out.w_persp[1].eq(s1_persp[1]),
+            s1_out.x.eq(s1.x),
+            s1_out.y.eq(s1.y),
+            in_flight.w_data.eq(s1_out),
+            in_flight.w_en.eq(issue),
+        ]
+
+        # 2. weights, once both reciprocals are known
+        s2 = Signal(in_flight_layout)
+        s3_valid = Signal()
+
+        # Attributes of the fragment: interpolated in groups of `lanes`, the
+        # fragment is complete once attr_group reaches n_groups
+        n_attrs = 1 + len(frag.p.color) + sum(len(t) for t in frag.p.texcoords)
+        lanes = self._interp_lanes
+        n_groups = (n_attrs + lanes - 1) // lanes
+        attr_group = Signal(range(n_groups + 1))
+        attr_val = [Signal(FixedPoint, name=f"attr_{i}") for i in range(n_attrs)]
+        take = Signal()
+        m.d.comb += [
+            s2.eq(in_flight.r_data),
+            take.eq(
+                inv_persp.o.valid
+                & in_flight.r_rdy
+                & ~area_pending
+                & (~s3_valid | (frag.valid & frag.ready))
+            ),
+            inv_persp.o.ready.eq(take),
+            in_flight.r_en.eq(take),
+        ]
+
+        wl0, wl1, wl2 = linear_weights(s2.w)
+
+        wp0 = (s2.w_persp[0] * inv_persp.o.payload).clamp(zero, one)
+        wp1 = (s2.w_persp[1] * inv_persp.o.payload).clamp(zero, one)
+
+        with m.If(take):
+            m.d.sync += [
+                weight_linear[0].eq(wl0),
+                weight_linear[1].eq(wl1),
+                weight_linear[2].eq(wl2),
+                weight_persp[0].eq(wp0),
+                weight_persp[1].eq(wp1),
+                weight_persp[2].eq(one - wp0 - wp1),
+                frag_x.eq(s2.x),
+                frag_y.eq(s2.y),
+                s3_valid.eq(1),
+                attr_group.eq(0),
+            ]
+        with m.Elif(frag.valid & frag.ready):
+            m.d.sync += s3_valid.eq(0)
+
+        # 3. attributes, `interp_lanes` of them per cycle
+        with m.If(frag.valid & frag.ready):
+            m.d.sync += [
+                Print("Emitting fragment at (", frag_x, ",", frag_y, ")"),
+                Print("\tBarycentric weights:", *weight_linear),
+                Print("\tPersp weights:      ", *weight_persp),
+                Print(),
+            ]
+        m.d.comb += [
+            frag.p.coord_pos[0].eq(frag_x),
+            frag.p.coord_pos[1].eq(frag_y),
+        ]
+
+        # (linear, values at the vertices, destination); depth uses linear
+        # interpolation per spec
+        attrs = [(True, vtx_z, frag.p.depth)]
+        for i in range(len(frag.p.color)):
+            attrs.append((False, [vtx_color[k][i] for k in range(3)], frag.p.color[i]))
+        for tex_idx in range(len(frag.p.texcoords)):
+            for comp_idx in range(len(frag.p.texcoords[tex_idx])):
+                attrs.append(
+                    (
+                        False,
+                        [vtx_texcoords[k][tex_idx][comp_idx] for k in range(3)],
+                        frag.p.texcoords[tex_idx][comp_idx],
+                    )
+                )
 
-            with m.State("CALC_PERSP_WEIGHTS"):
-                wp0 = (w0 * vtx[0].position_ndc[3] * inv_w_sum_recip).clamp(zero, one)
-                wp1 = (w1 * vtx[1].position_ndc[3] * inv_w_sum_recip).clamp(zero, one)
+        for lane in range(lanes):
+            self._interpolate_lane(
+                m,
+                lane,
+                attrs,
+                attr_val,
+                attr_group,
+                s3_valid & (attr_group != n_groups),
+                weight_linear,
+                weight_persp,
+            )
 
-                m.d.sync += [
-                    weight_persp[0].eq(wp0),
-                    weight_persp[1].eq(wp1),
-                    weight_persp[2].eq(one - wp0 - wp1),
-                ]
-                m.next = "OUTPUT"
+        with m.If(s3_valid & (attr_group != n_groups)):
+            m.d.sync += attr_group.eq(attr_group + 1)
 
-            with m.State("OUTPUT"):
-                m.d.sync += [
-                    Print("Emitting fragment at (", px, ",", py, ")"),
-                    Print("\tBarycentric weights:", *weight_linear),
-                    Print("\tPersp weights:      ", *weight_persp),
-                    Print(),
-                ]
-                m.d.comb += [
-                    self.os_fragment.p.coord_pos[0].eq(px),
-                    self.os_fragment.p.coord_pos[1].eq(py),
-                ]
+        m.d.comb += [dst.eq(val) for (_, _, dst), val in zip(attrs, attr_val)]
 
-                # Depth uses linear interpolation per spec
-                m.d.comb += self.os_fragment.p.depth.eq(
-                    vtx_attr(
-                        "linear",
-                        vtx[0].position_ndc[2],
-                        vtx[1].position_ndc[2],
-                        vtx[2].position_ndc[2],
-                    )
-                )
+        m.d.comb += frag.p.front_facing.eq(front_facing)
+        m.d.comb += frag.valid.eq(s3_valid & (attr_group == n_groups))
 
-                for i in range(len(self.os_fragment.p.color)):
-                    m.d.comb += self.os_fragment.p.color[i].eq(
-                        vtx_attr(
-                            "perspective",
-                            vtx[0].color[i],
-                            vtx[1].color[i],
-                            vtx[2].color[i],
-                        )
-                    )
+        m.d.comb += interp_idle.eq(
+            (samples.level == 0) & early_idle & (in_flight.level == 0) & ~s3_valid
+        )
 
-                for tex_idx in range(len(self.os_fragment.p.texcoords)):
-                    for comp_idx in range(len(self.os_fragment.p.texcoords[tex_idx])):
-                        m.d.comb += self.os_fragment.p.texcoords[tex_idx][comp_idx].eq(
-                            vtx_attr(
-                                "perspective",
-                                vtx[0].texcoords[tex_idx][comp_idx],
-                                vtx[1].texcoords[tex_idx][comp_idx],
-                                vtx[2].texcoords[tex_idx][comp_idx],
-                            )
-                        )
+        return m
 
-                m.d.comb += self.os_fragment.p.front_facing.eq(vtx[0].front_facing)
-                m.d.comb += self.os_fragment.valid.eq(1)
+    def _interpolate_lane(
+        self, m, lane, attrs, attr_val, attr_group, en, weight_linear, weight_persp
+    ):
+        """Interpolate attribute `attr_group * lanes + lane` into `attr_val`."""
+        lanes = self._interp_lanes
+        n_groups = (len(attrs) + lanes - 1) // lanes
+
+        values = [Signal(FixedPoint, name=f"lane_{lane}_v{k}") for k in range(3)]
+        linear = Signal(name=f"lane_{lane}_linear")
+        weights = [Signal(fixed.UQ(1, 15), name=f"lane_{lane}_w{k}") for k in range(3)]
+        result = (
+            weights[0] * values[0] + weights[1] * values[1] + weights[2] * values[2]
+        )
 
-                with m.If(self.os_fragment.ready):
-                    m.next = "ADVANCE"
+        with m.Switch(attr_group):
+            for group in range(n_groups):
+                idx = group * lanes + lane
+                if idx < len(attrs):
+                    with m.Case(group):
+                        is_linear, attr_values, _ = attrs[idx]
+                        m.d.comb += linear.eq(is_linear)
+                        m.d.comb += [values[k].eq(attr_values[k]) for k in range(3)]
+                        with m.If(en):
+                            m.d.sync += attr_val[idx].eq(result)
+
+        m.d.comb += [
+            weights[k].eq(Mux(linear, weight_linear[k], weight_persp[k]))
+            for k in range(3)
+        ]
+
+    def _early_depth_test(
+        self, m, samples, sample_layout, linear_weights, vtx_z, front_facing, en
+    ):
+        """Query the depth of the samples, keep the ones that pass.
+
+        Returns the FIFO of the samples that passed, and whether no sample
+        is being tested. Without early_depth the samples pass through.
+        """
+        if not self._early_depth:
+            return samples, C(1)
 
-            with m.State("ADVANCE"):
-                with m.If(px < max_x):
-                    m.d.sync += px.eq(px + 1)
-                    m.next = "SCAN"
-                with m.Elif(py < max_y):
-                    m.d.sync += px.eq(min_x)
-                    m.d.sync += py.eq(py + 1)
-                    m.next = "SCAN"
-                with m.Else():
-                    m.next = "COLLECT"
+        m.submodules.depth_pending = depth_pending = SyncFIFOBuffered(
+            width=sample_layout.size, depth=self._fifo_depth
+        )
+        m.submodules.tested = tested = SyncFIFOBuffered(
+            width=sample_layout.size, depth=self._fifo_depth
+        )
 
-        return m
+        s0 = Signal(sample_layout)
+        s0_weights = [Signal(fixed.UQ(1, 15), name=f"s0_w{k}") for k in range(3)]
+        m.d.comb += s0.eq(samples.r_data)
+        m.d.comb += [s0_weights[k].eq(w) for k, w in enumerate(linear_weights(s0.w))]
+
+        query = self.os_depth_query
+        m.d.comb += [
+            query.p.depth.eq(
+                s0_weights[0] * vtx_z[0]
+                + s0_weights[1] * vtx_z[1]
+                + s0_weights[2] * vtx_z[2]
+            ),
+            query.p.coord_pos[0].eq(s0.x),
+            query.p.coord_pos[1].eq(s0.y),
+            query.p.front_facing.eq(front_facing),
+            query.valid.eq(samples.r_rdy & en & depth_pending.w_rdy),
+            samples.r_en.eq(query.valid & query.ready),
+            depth_pending.w_data.eq(samples.r_data),
+            depth_pending.w_en.eq(query.valid & query.ready),
+        ]
+
+        # samples that fail are dropped
+        result = self.is_depth_result
+        m.d.comb += [
+            result.ready.eq(depth_pending.r_rdy & tested.w_rdy),
+            depth_pending.r_en.eq(result.valid & result.ready),
+            tested.w_data.eq(depth_pending.r_data),
+            tested.w_en.eq(result.valid & result.ready & result.p),
+        ]
+
+        return tested, (depth_pending.level == 0) & (tested.level == 0)
@@ -23,6 +23,12 @@ wb_bus_data_width = 32
 wb_bus_granularity = 8
 wb_bus_addr_width = 30  # Addresses are per data width (4 bytes)
 
+# Wider bus used for index and vertex fetches (matches the 64-bit f2h_sdram port of the HPS)
+fetch_bus_data_width = 64
+
+# Entries of the post-transform vertex cache used for indexed draws
+vertex_cache_depth = 16
+
 
 class VertexLayout(data.Struct):
     position: Vector4
@@ -46,6 +52,11 @@ class PrimitiveAssemblyLayout(data.Struct):
     color_back: Vector4
 
 
+class VertexCacheLookupLayout(data.Struct):
+    hit: unsigned(1)  # vertex is already in the cache, no shaded vertex follows
+    slot: range(vertex_cache_depth)
+
+
 class RasterizerLayout(data.Struct):
     position_ndc: Vector4  # In normalized device coordinates
     texcoords: texture_coords
@@ -61,6 +72,14 @@ class FragmentLayout(data.Struct):
     front_facing: unsigned(1)
 
 
+class DepthQueryLayout(data.Struct):
+    """Early depth test request for a fragment, before its interpolation"""
+
+    depth: FixedPoint
+    coord_pos: texture_position
+    front_facing: unsigned(1)
+
+
 class FramebufferInfoLayout(data.Struct):
     width: texture_coord_shape
     height: texture_coord_shape
@@ -39,104 +39,22 @@ class CountLeadingZeros(wiring.Component):
         return m
 
 
-class FixedPointInvSmallDomain(wiring.Component):
-    """
-    Approximate fixed-point reciprocal using Newton-Raphson method.
-    Input value should be in range of [1.0, 2.0).
-    Result will be in (0.5, 1.0]
-    """
-
-    def __init__(self, type: fixed.Shape, steps: int = 4):
-        super().__init__(
-            {
-                "i": In(stream.Signature(type)),
-                "o": Out(stream.Signature(type)),
-            }
-        )
-        self._steps = steps
-        self._type = type
-
-    def elaborate(self, platform) -> Module:
-        m = Module()
-
-        # Using Newton-Raphson method for reciprocal
-        # x_{n+1}=x_n(2−value∗x_n)
-        # x_{n+1}=2*x_n - value*x_n*x_n
-
-        initial_guess = fixed.Const(0.75, self._type)
-
-        x = Signal(self._type)
-        x2 = Signal(self._type)
-        vx2 = Signal(self._type)
-
-        mul_a = Signal(self._type)
-        mul_b = Signal(self._type)
-        mul_result = Signal(self._type)
-        m.d.comb += mul_result.eq(mul_a * mul_b)
-
-        iter = Signal(range(self._steps))
-
-        with m.If(self.o.ready):
-            m.d.sync += self.o.valid.eq(0)
-
-        with m.FSM():
-            with m.State("IDLE"):
-                with m.If(self.i.valid):
-                    m.d.sync += [
-                        x.eq(initial_guess),
-                        iter.eq(0),
-                    ]
-                    m.next = "STEP_0"
-            with m.State("STEP_0"):
-                m.d.comb += [
-                    mul_a.eq(x),
-                    mul_b.eq(x),
-                ]
-                m.d.sync += [
-                    x2.eq(mul_result),
-                ]
-                m.next = "STEP_1"
-            with m.State("STEP_1"):
-                m.d.comb += [
-                    mul_a.eq(self.i.p),
-                    mul_b.eq(x2),
-                ]
-                m.d.sync += [
-                    vx2.eq(mul_result),
-                ]
-                m.next = "STEP_2"
-            with m.State("STEP_2"):
-                new_x = (x << 1) - vx2
-                m.d.sync += [
-                    x.eq(new_x),
-                    iter.eq(iter + 1),
-                ]
-                with m.If(iter < self._steps - 1):
-                    m.next = "STEP_0"
-                with m.Else():
-                    m.d.comb += self.i.ready.eq(1)
-                    m.next = "SEND_RESULT"
-            with m.State("SEND_RESULT"):
-                with m.If(self.o.ready | ~self.o.valid):
-                    m.d.sync += [
-                        self.o.p.eq(x),
-                        self.o.valid.eq(1),
-                    ]
-                    m.next = "IDLE"
-
-        return m
-
-
 class FixedPointInv(wiring.Component):
     """
     Approximate fixed-point reciprocal using Newton-Raphson method.
     Works for any positive or negative FixedPoint number.
+    Fully pipelined: accepts a new value every cycle, with a latency of steps + 3.
+
+    With seed_bits > 0 the first approximation is read from a table indexed
+    by the leading seed_bits bits of the normalized mantissa instead of
+    being a constant; every step doubles the number of correct bits, so a
+    seed of k bits needs only one or two steps.
 
     unsigned input n.m -> output unsigned m.n
     signed   input n.m -> output signed m.n
     """
 
-    def __init__(self, type: fixed.Shape, steps: int = 4):
+    def __init__(self, type: fixed.Shape, steps: int = 4, seed_bits: int = 0):
         if type.signed:
             output_type = fixed.SQ(max(type.f_bits, 2), type.i_bits)
         else:
@@ -149,6 +67,7 @@ class FixedPointInv(wiring.Component):
             }
         )
         self._steps = steps
+        self._seed_bits = seed_bits
         self._type = type
         self._output_type = output_type
 
@@ -159,82 +78,114 @@ class FixedPointInv(wiring.Component):
         # type should fit all sub computations of N-R method
         small_type = fixed.UQ(2, data_bits - 2)
 
-        m.submodules.inv_small = inv_small = FixedPointInvSmallDomain(
-            small_type, steps=self._steps
-        )
-
         u_type = fixed.UQ(self._type.i_bits, self._type.f_bits)
         u_otype = fixed.UQ(self._output_type.i_bits, self._output_type.f_bits)
 
-        v0 = Signal(u_type)
-        sgn = Signal()
-
-        lz = Signal(range(data_bits + 1))
-        norm_value = Signal(u_otype)
-
         m.submodules.clz = clz = CountLeadingZeros(self._type.as_shape())
 
-        shift_value = lz - (u_type.i_bits - small_type.i_bits) - 1
-
-        with m.If(inv_small.i.ready):
-            m.d.sync += inv_small.i.valid.eq(0)
-
-        with m.If(self.o.ready):
-            m.d.sync += self.o.valid.eq(0)
+        # The whole pipeline advances whenever the output register is free,
+        # so a new value enters every cycle and there is no interior backpressure.
+        advance = Signal()
+        m.d.comb += [
+            advance.eq(~self.o.valid | self.o.ready),
+            self.i.ready.eq(advance),
+        ]
 
-        with m.FSM():
-            with m.State("IDLE"):
-                with m.If(self.i.valid):
-                    m.d.sync += [
-                        sgn.eq(self.i.p < 0),
-                        v0.eq(abs(self.i.p)),
-                        clz.i.p.eq(abs(self.i.p)),
-                        clz.i.valid.eq(1),
-                    ]
-                    m.d.comb += self.i.ready.eq(1)
-                    m.next = "CLZ"
-            with m.State("CLZ"):
-                with m.If(clz.o.valid & (~inv_small.i.valid | inv_small.i.ready)):
-                    m.d.comb += clz.o.ready.eq(1)
-                    m.d.sync += [
-                        lz.eq(clz.o.p),
-                        inv_small.i.valid.eq(1),
-                    ]
+        def stage(valid, sgn, lz):
+            # values carried along every stage of the pipeline
+            r_valid = Signal()
+            r_sgn = Signal()
+            r_lz = Signal.like(lz)
+            with m.If(advance):
+                m.d.sync += [
+                    r_valid.eq(valid),
+                    r_sgn.eq(sgn),
+                    r_lz.eq(lz),
+                ]
+            return r_valid, r_sgn, r_lz
 
-                    shift = clz.o.p - 1
+        # Stage 0: sign, magnitude and its leading zeros
+        m.d.comb += [
+            clz.i.p.eq(abs(self.i.p)),
+            clz.i.valid.eq(1),
+            clz.o.ready.eq(1),
+        ]
 
-                    with m.If(shift >= 0):
-                        m.d.sync += inv_small.i.p.as_value().eq(
-                            v0.as_value() << shift.as_unsigned()
-                        )
-                    with m.Else():
-                        m.d.sync += inv_small.i.p.as_value().eq(
-                            v0.as_value() >> (-shift).as_unsigned()
-                        )
+        v0 = Signal(u_type)
+        with m.If(advance):
+            m.d.sync += v0.eq(abs(self.i.p))
+        valid, sgn, lz = stage(self.i.valid, self.i.p < 0, clz.o.p)
+
+        # Stage 1: normalize into [1.0, 2.0), and look up the first
+        # approximation
+        normalized = Signal(small_type)
+        shift = lz - 1
+
+        with m.If(shift >= 0):
+            m.d.comb += normalized.as_value().eq(v0.as_value() << shift.as_unsigned())
+        with m.Else():
+            m.d.comb += normalized.as_value().eq(
+                v0.as_value() >> (-shift).as_unsigned()
+            )
+
+        value = Signal(small_type)
+        with m.If(advance):
+            m.d.sync += value.eq(normalized)
+
+        seed_bits = min(self._seed_bits, small_type.f_bits)
+        if seed_bits:
+            # 1 / (midpoint of the interval of the mantissas of each entry)
+            seeds = Array(
+                fixed.Const(1 / (1 + (i + 0.5) / 2**seed_bits), small_type).as_value()
+                for i in range(2**seed_bits)
+            )
+            x = Signal(small_type, name="x_0")
+            index = normalized.as_value()[
+                small_type.f_bits - seed_bits : small_type.f_bits
+            ]
+            with m.If(advance):
+                m.d.sync += x.as_value().eq(seeds[index])
+        else:
+            x = fixed.Const(0.75, small_type)
+        valid, sgn, lz = stage(valid, sgn, lz)
 
-                    m.next = "INV_SMALL"
-            with m.State("INV_SMALL"):
-                with m.If(inv_small.o.valid & (~self.o.valid | self.o.ready)):
-                    # shift back: divide by 2^shift_value
-                    m.d.comb += inv_small.o.ready.eq(1)
+        # Stages 2..: Newton-Raphson steps, one per stage
+        # x_{n+1}=x_n(2−value∗x_n)
+        # x_{n+1}=2*x_n - value*x_n*x_n
+        for i in range(self._steps):
+            x2 = Signal(small_type, name=f"x2_{i}")
+            vx2 = Signal(small_type, name=f"vx2_{i}")
+            m.d.comb += [
+                x2.eq(x * x),
+                vx2.eq(value * x2),
+            ]
+
+            new_x = Signal(small_type, name=f"x_{i + 1}")
+            new_value = Signal(small_type, name=f"value_{i + 1}")
+            with m.If(advance):
+                m.d.sync += [
+                    new_x.eq((x << 1) - vx2),
+                    new_value.eq(value),
+                ]
+            x, value = new_x, new_value
+            valid, sgn, lz = stage(valid, sgn, lz)
 
-                    with m.If(shift_value >= 0):
-                        m.d.comb += norm_value.eq(
-                            inv_small.o.p << shift_value.as_unsigned()
-                        )
-                    with m.Else():
-                        m.d.comb += norm_value.eq(
-                            inv_small.o.p >> (-shift_value).as_unsigned()
-                        )
+        # Output: shift back (divide by 2^shift_value) and restore the sign
+        shift_value = lz - (u_type.i_bits - small_type.i_bits) - 1
+        norm_value = Signal(u_otype)
 
-                    with m.If(sgn):
-                        m.d.sync += self.o.p.eq(-norm_value)
-                    with m.Else():
-                        m.d.sync += self.o.p.eq(norm_value)
+        with m.If(shift_value >= 0):
+            m.d.comb += norm_value.eq(x << shift_value.as_unsigned())
+        with m.Else():
+            m.d.comb += norm_value.eq(x >> (-shift_value).as_unsigned())
 
-                    m.d.sync += self.o.valid.eq(1)
+        with m.If(advance):
+            with m.If(sgn):
+                m.d.sync += self.o.p.eq(-norm_value)
+            with m.Else():
+                m.d.sync += self.o.p.eq(norm_value)
 
-                    m.next = "IDLE"
+            m.d.sync += self.o.valid.eq(valid)
 
         return m
 
@@ -2,12 +2,22 @@ from amaranth import *
 from amaranth.lib.wiring import Component, Out
 from amaranth_soc.wishbone.bus import Interface, Signature
 from transactron import *
-from transactron.lib import Forwarder
+from transactron.lib import FIFO, BasicFifo
 
 
 class MemorySystem(Component):
     """
 
+    Requests are queued in a small FIFO and issued back to back: when a
+    transaction is acknowledged the next queued one is put on the bus in the
+    same cycle, and ``cyc`` stays asserted while there are requests left.
+    Reads and writes are queued separately, so both methods can be called in
+    the same cycle. Every read is tagged with the number of writes queued
+    before it and is not issued until those writes are, which keeps the
+    accesses in program order (a read called together with a write goes
+    after it and returns the written data). Read responses are returned in
+    order.
+
     Attributes
     ----------
     wb_bus: Out(Signature)
@@ -27,8 +37,9 @@ class MemorySystem(Component):
     read_resolve: Method
     request_write: Method
 
-    def __init__(self, wb_bus: Signature):
+    def __init__(self, wb_bus: Signature, depth: int = 4):
         super().__init__({"wb_bus": Out(wb_bus)})
+        self._depth = depth
 
         self.request_read = Method(
             i=[
@@ -45,48 +56,100 @@ class MemorySystem(Component):
             ]
         )
 
-        self.request_read.add_conflict(self.request_write)
-
     def elaborate(self, platform) -> TModule:
         m = TModule()
 
+        # Writes are counted modulo a power of two larger than depth, enough
+        # to tell the queued ones apart
+        seq_shape = unsigned(self._depth.bit_length())
+        writes_queued = Signal(seq_shape)
+        writes_issued = Signal(seq_shape)
+
+        m.submodules.read_fifo = read_fifo = BasicFifo(
+            [
+                ("addr", self.wb_bus.adr.shape()),
+                ("mask", self.wb_bus.sel.shape()),
+                ("seq", seq_shape),
+            ],
+            self._depth,
+        )
+        m.submodules.write_fifo = write_fifo = FIFO(
+            [
+                ("addr", self.wb_bus.adr.shape()),
+                ("mask", self.wb_bus.sel.shape()),
+                ("data", self.wb_bus.dat_w.shape()),
+            ],
+            self._depth,
+        )
+        m.submodules.resp_fifo = resp_fifo = FIFO(
+            [("data", self.wb_bus.data_width)], self._depth
+        )
+
+        # Reads requested and not resolved yet; a read is only accepted when
+        # its response is sure to have space in resp_fifo
+        reads_pending = Signal(range(self._depth + 1))
+        read_requested = Signal()
+        read_resolved = Signal()
+        write_requested = Signal()
+        m.d.sync += reads_pending.eq(reads_pending + read_requested - read_resolved)
+
         busy = Signal(1)
         m.d.comb += busy.eq(self.wb_bus.cyc)
 
-        m.submodules.read_fwd = read_fwd = Forwarder(self.wb_bus.data_width)
+        done = busy & self.wb_bus.ack
 
-        with m.If(busy & self.wb_bus.ack):
+        with m.If(done):
             m.d.sync += [
                 self.wb_bus.cyc.eq(0),
                 self.wb_bus.stb.eq(0),
             ]
 
             with Transaction().body(m, ready=~self.wb_bus.we):
-                read_fwd.write(m, self.wb_bus.dat_r)
+                resp_fifo.write(m, data=self.wb_bus.dat_r)
 
-        @def_method(m, self.request_read, ready=(~busy & ~read_fwd.read.ready))
-        def _(addr, mask):
+        # Issue the next request, right away if the current one completes.
+        # The read at the head goes first if no older write is still queued.
+        free = ~busy | done
+        read_first = (read_fifo.level != 0) & (read_fifo.head.seq == writes_issued)
+
+        with Transaction().body(m, ready=free & read_first):
+            req = read_fifo.read(m)
             m.d.sync += [
-                self.wb_bus.adr.eq(addr),
-                self.wb_bus.sel.eq(mask),
+                self.wb_bus.adr.eq(req.addr),
+                self.wb_bus.sel.eq(req.mask),
                 self.wb_bus.we.eq(0),
                 self.wb_bus.cyc.eq(1),
                 self.wb_bus.stb.eq(1),
             ]
 
-        @def_method(m, self.read_resolve)
-        def _():
-            return read_fwd.read(m)
-
-        @def_method(m, self.request_write, ready=~busy)
-        def _(addr, mask, data):
+        with Transaction().body(m, ready=free & ~read_first):
+            req = write_fifo.read(m)
             m.d.sync += [
-                self.wb_bus.adr.eq(addr),
-                self.wb_bus.sel.eq(mask),
-                self.wb_bus.dat_w.eq(data),
+                self.wb_bus.adr.eq(req.addr),
+                self.wb_bus.sel.eq(req.mask),
+                self.wb_bus.dat_w.eq(req.data),
                 self.wb_bus.we.eq(1),
                 self.wb_bus.cyc.eq(1),
                 self.wb_bus.stb.eq(1),
+                writes_issued.eq(writes_issued + 1),
             ]
 
+        @def_method(m, self.request_read, ready=reads_pending != self._depth)
+        def _(addr, mask):
+            m.d.comb += read_requested.eq(1)
+            read_fifo.write(
+                m, addr=addr, mask=mask, seq=writes_queued + write_requested
+            )
+
+        @def_method(m, self.read_resolve)
+        def _():
+            m.d.comb += read_resolved.eq(1)
+            return resp_fifo.read(m)
+
+        @def_method(m, self.request_write)
+        def _(addr, mask, data):
+            m.d.comb += write_requested.eq(1)
+            m.d.sync += writes_queued.eq(writes_queued + 1)
+            write_fifo.write(m, addr=addr, mask=mask, data=data)
+
         return m
@@ -348,6 +348,8 @@ class AnyRecombiner(wiring.Component):
 class WideStreamOutput(wiring.Component):
     """
     Splits wide output stream into multiple cycles.
+    The next wide value is taken while the last element of the current one is sent,
+    so back-to-back values are output without a bubble.
     """
 
     def __init__(self, shape: ShapeCastable, max_width: int):
@@ -366,31 +368,35 @@ class WideStreamOutput(wiring.Component):
         i = Signal.like(self.n.p)
         p = Signal.like(self.i.p)
 
+        def load():
+            with m.If(self.i.valid & self.n.valid):
+                m.d.comb += [
+                    self.i.ready.eq(1),
+                    self.n.ready.eq(1),
+                ]
+                with m.If(self.n.p > 0):
+                    m.d.sync += [
+                        n.eq(self.n.p),
+                        i.eq(0),
+                        p.eq(self.i.p),
+                        self.o.p.eq(self.i.p[0]),
+                        self.o.valid.eq(1),
+                    ]
+                    m.next = "SEND"
+
         with m.FSM():
             with m.State("IDLE"):
-                with m.If(self.i.valid & self.n.valid):
-                    m.d.comb += [
-                        self.i.ready.eq(1),
-                        self.n.ready.eq(1),
-                    ]
-                    with m.If(self.n.p > 0):
-                        m.d.sync += [
-                            n.eq(self.n.p),
-                            i.eq(0),
-                            p.eq(self.i.p),
-                            self.o.p.eq(self.i.p[0]),
-                            self.o.valid.eq(1),
-                        ]
-                        m.next = "SEND"
+                load()
             with m.State("SEND"):
                 with m.If(self.o.ready):
                     with m.If(i + 1 < n):
                         m.d.sync += [
                             i.eq(i + 1),
-                            p.eq(p[i + 1]),
+                            self.o.p.eq(p[i + 1]),
                         ]
                     with m.Else():
                         m.d.sync += self.o.valid.eq(0)
                         m.next = "IDLE"
+                        load()
 
         return m
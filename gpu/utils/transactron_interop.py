@@ -1,28 +1,68 @@
+from collections.abc import Callable
+
 from amaranth import *
 from amaranth.lib import stream, wiring
 from transactron import *
 from transactron.lib.connectors import ConnectTrans
 
 
+def _connect_stream_to_stream(
+    m: TModule, source: stream.Interface, sink: stream.Interface
+) -> None:
+    wiring.connect(m, source, sink)
+
+
+def _connect_method_to_stream(
+    m: TModule, source: Method, sink: stream.Interface
+) -> None:
+    with m.If(sink.ready):
+        m.d.sync += sink.valid.eq(0)
+
+    with Transaction().body(m, ready=(sink.ready | ~sink.valid)):
+        m.d.sync += sink.payload.eq(source(m))
+        m.d.sync += sink.valid.eq(1)
+
+
+def _connect_stream_to_method(
+    m: TModule, source: stream.Interface, sink: Method
+) -> None:
+    with Transaction().body(m, ready=source.valid):
+        sink(m, source.payload)
+        m.d.comb += source.ready.eq(1)
+
+
+def _connect_method_to_method(m: TModule, source: Method, sink: Method) -> None:
+    m.submodules += ConnectTrans.create(source, sink)
+
+
+_BUILDERS: dict[tuple[type, type], Callable[[TModule, object, object], None]] = {
+    (stream.Interface, stream.Interface): _connect_stream_to_stream,
+    (Method, stream.Interface): _connect_method_to_stream,
+    (stream.Interface, Method): _connect_stream_to_method,
+    (Method, Method): _connect_method_to_method,
+}
+
+
+def _stream_like_kind(obj: Method | stream.Interface) -> type:
+    # isinstance rather than type() so that subclasses resolve to the same
+    # builder
+    for kind in (Method, stream.Interface):
+        if isinstance(obj, kind):
+            return kind
+    raise TypeError(f"Expected a Method or stream.Interface, got {obj!r}")
+
+
 def connect_stream_like_to_stream_like(
     m: TModule,
     source: Method | stream.Interface,
     sink: Method | stream.Interface,
 ) -> None:
-    """Connects any Method or stream.Interface to any other Method or stream.Interface using adapters."""
-
-    if isinstance(source, stream.Interface) and isinstance(sink, stream.Interface):
-        wiring.connect(m, source, sink)
-    elif isinstance(source, Method) and isinstance(sink, stream.Interface):
-        with m.If(sink.ready):
-            m.d.sync += sink.valid.eq(0)
-
-        with Transaction().body(m, ready=(sink.ready | ~sink.valid)):
-            m.d.sync += sink.payload.eq(source(m))
-            m.d.sync += sink.valid.eq(1)
-    elif isinstance(source, stream.Interface) and isinstance(sink, Method):
-        with Transaction().body(m, ready=source.valid):
-            sink(m, source.payload)
-            m.d.comb += source.ready.eq(1)
-    elif isinstance(source, Method) and isinstance(sink, Method):
-        m.submodules += ConnectTrans.create(source, sink)
+    """Connects any Method or stream.Interface to any other Method or stream.Interface using adapters.
+
+    Raises
+    ------
+    TypeError
+        If ``source`` or ``sink`` is neither a Method nor a stream.Interface.
+    """
+
+    _BUILDERS[_stream_like_kind(source), _stream_like_kind(sink)](m, source, sink)
@@ -23,6 +23,7 @@ __all__ = [
     "generic_min_value",
     "min_value",
     "max_value",
+    "min_max_onehot",
 ]
 
 
@@ -178,3 +179,26 @@ def min_value(*values) -> Value:
 
 def max_value(*values) -> Value:
     return generic_min_value(*values, operator=operator.gt)
+
+
+def min_max_onehot(*values) -> tuple[Value, Value]:
+    """
+    One-hot selectors of the minimum and of the maximum of `values`.
+
+    All pairs are compared in parallel and the comparators are shared by both
+    selectors, so a selector is one comparator deep instead of a chain of them.
+    Of equal values the last one is selected as the minimum, the first one
+    as the maximum.
+    """
+    n = len(values)
+    lt = {(i, j): values[i] < values[j] for i in range(n) for j in range(i + 1, n)}
+
+    min_sel = Cat(
+        and_value(*[~lt[j, i] for j in range(i)], *[lt[i, j] for j in range(i + 1, n)])
+        for i in range(n)
+    )
+    max_sel = Cat(
+        and_value(*[lt[j, i] for j in range(i)], *[~lt[i, j] for j in range(i + 1, n)])
+        for i in range(n)
+    )
+    return min_sel, max_sel
@@ -87,25 +87,27 @@ class VertexShading(wiring.Component):
         with m.If(self.os_vertex.ready):
             m.d.sync += self.os_vertex.valid.eq(0)
 
+        def capture():
+            m.d.sync += [
+                n[0].eq(self.is_vertex.p.normal_view[0]),
+                n[1].eq(self.is_vertex.p.normal_view[1]),
+                n[2].eq(self.is_vertex.p.normal_view[2]),
+            ] + [v_color[i].eq(self.is_vertex.p.color[i]) for i in range(4)]
+            m.d.sync += [
+                v_pos_ndc.eq(self.is_vertex.p.position_proj),
+                v_texcoords.eq(self.is_vertex.p.texcoords),
+                out_color.eq(0),  # Initialize accumulated color
+            ]
+            m.d.sync += dot_accum.eq(0)
+            m.next = "DOT_0_LIGHT_0"
+
         with m.FSM():
             with m.State("IDLE"):
                 m.d.comb += self.is_vertex.ready.eq(1)
                 m.d.comb += self.ready.eq(1)
 
                 with m.If(self.is_vertex.valid):
-                    # Capture input
-                    m.d.sync += [
-                        n[0].eq(self.is_vertex.p.normal_view[0]),
-                        n[1].eq(self.is_vertex.p.normal_view[1]),
-                        n[2].eq(self.is_vertex.p.normal_view[2]),
-                    ] + [v_color[i].eq(self.is_vertex.p.color[i]) for i in range(4)]
-                    m.d.sync += [
-                        v_pos_ndc.eq(self.is_vertex.p.position_proj),
-                        v_texcoords.eq(self.is_vertex.p.texcoords),
-                        out_color.eq(0),  # Initialize accumulated color
-                    ]
-                    m.d.sync += dot_accum.eq(0)
-                    m.next = "DOT_0_LIGHT_0"
+                    capture()
 
             # Nested loops: for each light, compute dot product and per-channel shading
             for light_idx in range(num_lights):
@@ -211,6 +213,11 @@ class VertexShading(wiring.Component):
                         self.os_vertex.p.color_back.eq(out_color),
                         self.os_vertex.valid.eq(1),
                     ]
-                    m.next = "IDLE"
+                    # Take the next vertex right away instead of in IDLE
+                    m.d.comb += self.is_vertex.ready.eq(1)
+                    with m.If(self.is_vertex.valid):
+                        capture()
+                    with m.Else():
+                        m.next = "IDLE"
 
         return m
@@ -2,15 +2,16 @@ from amaranth import *
 from amaranth.lib import data, stream, wiring
 from amaranth.lib.wiring import In, Out
 
-from gpu.utils.math import FixedPointInv, SimpleOpModule
-from gpu.utils.stream import StreamToVector, VectorToStream
+from gpu.utils.math import FixedPointInv
 
+from ..utils import fixed
 from ..utils.layouts import (
     ShadingVertexLayout,
     VertexLayout,
     num_textures,
 )
-from ..utils.types import FixedPoint, FixedPoint_mem, Vector3
+from ..utils.transactron_utils import sum_value
+from ..utils.types import FixedPoint, FixedPoint_mem
 
 
 class VertexTransformEnablementLayout(data.Struct):
@@ -35,7 +36,9 @@ class VertexTransform(wiring.Component):
     - normal_mv_inv_t: Inverse transpose of Model-View matrix (3x3)
     - texture_transforms: array of texture transformation matrices (4x4) for each texture
 
-    TODO: support for configurable amount of multiplyer circuits (for now 4)
+    Each row of a matrix-vector product is computed ``num_multipliers``
+    products at a time, so a 4-element row takes a single cycle with the
+    default of 4 multipliers.
     """
 
     is_vertex: In(stream.Signature(VertexLayout))
@@ -51,8 +54,9 @@ class VertexTransform(wiring.Component):
 
     ready: Out(1)
 
-    def __init__(self):
+    def __init__(self, num_multipliers: int = 4):
         super().__init__()
+        self._num_multipliers = num_multipliers
 
     def elaborate(self, platform) -> Module:
         m = Module()
@@ -60,16 +64,38 @@ class VertexTransform(wiring.Component):
         i_data = Signal.like(self.is_vertex.payload)
         o_data = Signal.like(self.os_vertex.payload)
 
-        mul_a = Signal(FixedPoint)
-        mul_b = Signal(FixedPoint)
-        mul_result = Signal(FixedPoint)
-        m.d.comb += mul_result.eq(mul_a * mul_b)
-        cum_result = Signal(FixedPoint)
+        # Lanes that are not driven in a state multiply zeros, which pads the
+        # last chunk of a row
+        k = self._num_multipliers
+        mul_a = [Signal(FixedPoint, name=f"mul_a_{lane}") for lane in range(k)]
+        mul_b = [Signal(FixedPoint, name=f"mul_b_{lane}") for lane in range(k)]
+
+        # Products are cut to the precision of the result right away and
+        # summed with just enough integer headroom for a 4-element row, instead
+        # of adding the full-width products; rows saturate when stored
+        acc_shape = fixed.SQ(FixedPoint.i_bits + 2, FixedPoint.f_bits)
+        row_sum = Signal(acc_shape)
+        row_value = row_sum.saturate(FixedPoint)
+        cum_result = Signal(acc_shape)
+
+        # Products are kept in their own signals so that synthesis can be told
+        # to map them to DSP blocks (Intel and Xilinx attribute names)
+        dsp_attrs = {"multstyle": "dsp", "use_dsp": "yes"}
+        products = []
+        for lane, (a, b) in enumerate(zip(mul_a, mul_b)):
+            prod = Signal((a * b).shape(), name=f"mul_prod_{lane}", attrs=dsp_attrs)
+            m.d.comb += prod.eq(a * b)
+            products.append(prod)
+
+        m.d.comb += row_sum.eq(
+            sum_value(cum_result, *(p.saturate(FixedPoint) for p in products))
+        )
 
         attr_info = [
             {
                 "name": "POSITION_MV",
                 "result": o_data.position_view,
+                "output": self.os_vertex.payload.position_view,
                 "matrix": self.position_mv,
                 "vector": i_data.position,
                 "enabled": C(1),
@@ -78,6 +104,7 @@ class VertexTransform(wiring.Component):
             {
                 "name": "POSITION_P",
                 "result": o_data.position_proj,
+                "output": self.os_vertex.payload.position_proj,
                 "matrix": self.position_p,
                 "vector": o_data.position_view,
                 "enabled": C(1),
@@ -86,6 +113,7 @@ class VertexTransform(wiring.Component):
             {
                 "name": "NORMAL",
                 "result": o_data.normal_view,
+                "output": self.os_vertex.payload.normal_view,
                 "matrix": self.normal_mv_inv_t,
                 "vector": i_data.normal,
                 "enabled": self.enabled.normal,
@@ -95,6 +123,7 @@ class VertexTransform(wiring.Component):
             {
                 "name": f"TEXTURE_{i}",
                 "result": o_data.texcoords[i],
+                "output": self.os_vertex.payload.texcoords[i],
                 "matrix": self.texture_transforms[i],
                 "vector": i_data.texcoords[i],
                 "enabled": self.enabled.texture[i],
@@ -103,67 +132,101 @@ class VertexTransform(wiring.Component):
             for i in range(num_textures)
         ]
 
+        # Flat schedule of multiply steps, run by a single MAC state indexed by
+        # step: a step computes up to k products of a row of an attribute's
+        # matrix-vector product
+        schedule = []
+        first_step = {}
+        for idx, attr in enumerate(attr_info):
+            dim = attr["dim"]
+            first_step[idx] = len(schedule)
+            for row in range(dim):
+                for c in range(0, dim, k):
+                    operands = [
+                        (attr["vector"][j], attr["matrix"][row * dim + j])
+                        for j in range(c, min(dim, c + k))
+                    ]
+                    last_of_row = c + k >= dim
+                    last_of_attr = last_of_row and row == dim - 1
+                    schedule.append((idx, row, operands, last_of_row, last_of_attr))
+
+        step = Signal(range(len(schedule)))
+
         with m.If(self.os_vertex.ready):
             m.d.sync += self.os_vertex.valid.eq(0)
 
+        def goto_first_enabled(first):
+            # Disabled attributes are skipped; their results are set when the
+            # vertex is taken
+            for n, idx in enumerate(range(first, len(attr_info))):
+                with (m.If if n == 0 else m.Elif)(attr_info[idx]["enabled"]):
+                    m.d.sync += step.eq(first_step[idx])
+                    m.next = "MAC"
+
+        def take_vertex():
+            m.d.comb += self.is_vertex.ready.eq(1)
+            m.d.sync += [
+                i_data.eq(self.is_vertex.payload),
+                cum_result.eq(0),
+            ]
+            for attr in attr_info:
+                with m.If(~attr["enabled"]):
+                    # skip transformation - return 0,0,0,1 vector
+                    m.d.sync += [
+                        attr["result"][j].eq(0.0 if j < 3 else 1.0)
+                        for j in range(len(attr["result"]))
+                    ]
+            goto_first_enabled(0)
+
+        def finish_attr(idx, attr, row, value):
+            # After the last enabled attribute the results go to the output
+            # register along with the rest of o_data, and the next vertex is
+            # taken without going through IDLE. The state is held while the
+            # output register is full.
+            later = attr_info[idx + 1 :]
+            more = Cat(a["enabled"] for a in later).any() if later else C(0)
+
+            with m.If(more):
+                m.d.sync += [attr["result"][row].eq(value), cum_result.eq(0)]
+                goto_first_enabled(idx + 1)
+            with m.Elif(~self.os_vertex.valid | self.os_vertex.ready):
+                m.d.sync += [
+                    attr["result"][row].eq(value),
+                    self.os_vertex.payload.eq(o_data),
+                    attr["output"][row].eq(value),
+                    self.os_vertex.valid.eq(1),
+                ]
+                with m.If(self.is_vertex.valid):
+                    take_vertex()
+                with m.Else():
+                    m.next = "IDLE"
+
         with m.FSM():
             with m.State("IDLE"):
                 m.d.comb += self.ready.eq(1)
                 with m.If(self.is_vertex.valid):
-                    m.d.comb += self.is_vertex.ready.eq(1)
-                    m.d.sync += [
-                        i_data.eq(self.is_vertex.payload),
-                    ]
-                    m.next = f"{attr_info[0]['name']}_INIT"
-
-            for i, attr in enumerate(attr_info):
-                base = f"{attr['name']}"
-                next_state = (
-                    f"{attr_info[i+1]['name']}_INIT"
-                    if i + 1 < len(attr_info)
-                    else "SEND"
-                )
-
-                with m.State(f"{base}_INIT"):
-                    m.d.sync += cum_result.eq(0)
-                    with m.If(attr["enabled"]):
-                        m.next = f"{base}_0_0"
-                    with m.Else():
-                        # skip transformation - return 0,0,0,1 vector
-                        for j in range(len(attr["result"])):
-                            m.d.sync += attr["result"][j].eq(0.0 if j < 3 else 1.0)
-                        m.next = next_state
-
-                for i in range(attr["dim"]):
-                    for j in range(attr["dim"]):
-                        with m.State(f"{base}_{i}_{j}"):
-                            m.d.sync += cum_result.eq(
-                                cum_result + mul_result,
-                            )
-                            m.d.comb += [
-                                mul_a.eq(attr["vector"][j]),
-                                mul_b.eq(attr["matrix"][i * attr["dim"] + j]),
-                            ]
-
-                            m.next = (
-                                f"{base}_{i}_{j+1}"
-                                if j < attr["dim"] - 1
-                                else (f"{base}_STORE_{i}")
-                            )
-                    with m.State(f"{base}_STORE_{i}"):
-                        m.d.sync += attr["result"][i].eq(cum_result)
-                        m.d.sync += cum_result.eq(0)
-                        m.next = (
-                            next_state if i == attr["dim"] - 1 else f"{base}_{i+1}_0"
-                        )
-
-            with m.State("SEND"):
-                with m.If(~self.os_vertex.valid | self.os_vertex.ready):
-                    m.d.sync += [
-                        self.os_vertex.payload.eq(o_data),
-                        self.os_vertex.valid.eq(1),
-                    ]
-                    m.next = "IDLE"
+                    take_vertex()
+
+            with m.State("MAC"):
+                with m.Switch(step):
+                    for n, (idx, row, operands, last_of_row, last_of_attr) in enumerate(
+                        schedule
+                    ):
+                        attr = attr_info[idx]
+                        with m.Case(n):
+                            for lane, (a, b) in enumerate(operands):
+                                m.d.comb += [mul_a[lane].eq(a), mul_b[lane].eq(b)]
+
+                            if not last_of_row:
+                                m.d.sync += [cum_result.eq(row_sum), step.eq(n + 1)]
+                            elif not last_of_attr:
+                                m.d.sync += [
+                                    attr["result"][row].eq(row_value),
+                                    cum_result.eq(0),
+                                    step.eq(n + 1),
+                                ]
+                            else:
+                                finish_attr(idx, attr, row, row_value)
 
         return m
 
@@ -178,17 +241,14 @@ class PerspectiveDivide(wiring.Component):
     i: In(stream.Signature(ShadingVertexLayout))
     o: Out(stream.Signature(ShadingVertexLayout))
 
-    def enaborate(self, platorm) -> Module:
+    def elaborate(self, platform) -> Module:
         m = Module()
 
-        m.submodule.v2s_a = v2s_a = VectorToStream(Vector3)
-        m.submodule.dup = dup = wiring.DuplicateStream(FixedPoint, 3)
-        m.submodule.mul = mul = SimpleOpModule(lambda a, b: a * b, FixedPoint)
-        m.submodule.s2v = s2v = StreamToVector(Vector3)
-        m.submodule.inverse = inverse = FixedPointInv(FixedPoint)
+        # 1/w from an 8-bit seed table and a single refinement step
+        m.submodules.inverse = inverse = FixedPointInv(FixedPoint, steps=1, seed_bits=8)
 
-        wiring.connect(m, v2s_a.o, mul.a)
-        wiring.connect(m, mul.o, s2v.i)
+        pos = self.i.payload.position_proj
+        inv_w = inverse.o.payload
 
         with m.If(self.o.ready):
             m.d.sync += self.o.valid.eq(0)
@@ -196,40 +256,29 @@ class PerspectiveDivide(wiring.Component):
         with m.If(inverse.i.ready):
             m.d.sync += inverse.i.valid.eq(0)
 
-        with m.If(v2s_a.i.ready):
-            m.d.sync += v2s_a.i.valid.eq(0)
-
         with m.FSM():
             with m.State("IDLE"):
                 with m.If(self.i.valid):
                     m.d.sync += [
-                        v2s_a.i.payload.eq(Cat(self.i.payload.position_proj[:3])),
-                        v2s_a.i.valid.eq(1),
-                        inverse.i.payload.eq(self.i.payload.position_proj[3]),
+                        inverse.i.payload.eq(pos[3]),
                         inverse.i.valid.eq(1),
                     ]
-                    m.next = "CALC_INV_W"
-            with m.State("CALC_INV_W"):
-                with m.If(inverse.o.valid):
-                    m.d.sync += [
-                        dup.i.p.eq(inverse.o.p),
-                        dup.i.valid.eq(1),
-                    ]
                     m.next = "DIVIDE"
             with m.State("DIVIDE"):
-                # calculate x*1/w, y*1/w, z*1/w, 1/w
-                with m.If(s2v.o.valid & (self.o.ready | ~self.o.valid)):
+                # calculate x*1/w, y*1/w, z*1/w, 1/w, all three products at once
+                with m.If(inverse.o.valid & (self.o.ready | ~self.o.valid)):
                     m.d.comb += [
-                        dup.o.ready.eq(1),
-                        s2v.o.ready.eq(1),
-                        inverse.i.ready.eq(1),
+                        inverse.o.ready.eq(1),
                         self.i.ready.eq(1),
                     ]
 
                     m.d.sync += [
                         self.o.p.position_view.eq(self.i.payload.position_view),
-                        self.o.p.position_proj[:3].eq(s2v.o.p),
-                        self.o.p.position_proj[3].eq(inverse.o.p),
+                        *[
+                            self.o.p.position_proj[j].eq(pos[j] * inv_w)
+                            for j in range(3)
+                        ],
+                        self.o.p.position_proj[3].eq(inv_w),
                         self.o.p.normal_view.eq(self.i.payload.normal_view),
                         self.o.p.texcoords.eq(self.i.payload.texcoords),
                         self.o.p.color.eq(self.i.payload.color),
@@ -3,13 +3,27 @@ import pytest
 
 def pytest_addoption(parser):
     parser.addoption("--run-slow", action="store_true", help="Run slow tests")
+    parser.addoption(
+        "--emit-vcd",
+        action="store_true",
+        help="Rerun failing simulations to record VCD traces",
+    )
+
+
+def pytest_configure(config):
+    from tests.utils import sim
+
+    sim.emit_vcd = config.getoption("--emit-vcd")
 
 
 def pytest_collection_modifyitems(config, items):
     if config.getoption("--run-slow"):
         return
 
+    slow_items = [item for item in items if "slow" in item.keywords]
+    if not slow_items:
+        return
+
     skip_slow = pytest.mark.skip(reason="Skipping slow tests")
-    for item in items:
-        if "slow" in item.keywords:
-            item.add_marker(skip_slow)
+    for item in slow_items:
+        item.add_marker(skip_slow)
@@ -2,7 +2,9 @@ from amaranth import *
 from amaranth.sim import Simulator
 
 from gpu.input_assembly.cores import IndexGenerator
+from gpu.utils.layouts import fetch_bus_data_width, wb_bus_data_width
 from gpu.utils.types import IndexKind
+from tests.utils.sim import run_simulation
 from tests.utils.streams import stream_testbench
 from tests.utils.testbench import SimpleTestbench
 
@@ -13,9 +15,16 @@ def make_test_index_generator(
     kind: IndexKind,
     memory_data: bytes,
     expected: list[int],
+    data_width: int = wb_bus_data_width,
 ):
-    dut = IndexGenerator()
-    t = SimpleTestbench(dut, mem_addr=0x80000000, mem_size=1024)
+    dut = IndexGenerator(data_width=data_width)
+    t = SimpleTestbench(
+        dut,
+        addr_width=len(dut.bus.adr),
+        data_width=data_width,
+        mem_addr=0x80000000,
+        mem_size=1024,
+    )
 
     t.arbiter.add(dut.bus)
 
@@ -38,17 +47,10 @@ def make_test_index_generator(
         output_stream=dut.os_index,
         expected_output_data=expected,
         is_finished=dut.ready,
+        always_ready=True,
     )
 
-    try:
-        sim.run()
-    except Exception:
-        sim.reset()
-
-        with sim.write_vcd(
-            "test_index_generator.vcd", "test_index_generator.gtkw", traces=dut
-        ):
-            sim.run()
+    run_simulation(sim, "test_index_generator", traces=dut)
 
 
 def test_not_indexed():
@@ -113,3 +115,36 @@ def test_indexed_u16_unaligned():
         memory_data=b"".join((i.to_bytes(2, "little") for i in [2, 3, 4, 5, 1, 0])),
         expected=[2, 3, 4, 5, 1, 0],
     )
+
+
+def test_indexed_u16_multiple_bursts():
+    indices = [(i * 7) % 50 for i in range(37)]
+    make_test_index_generator(
+        addr=0x80000006,
+        count=len(indices),
+        kind=IndexKind.U16,
+        memory_data=b"".join((i.to_bytes(2, "little") for i in indices)),
+        expected=indices,
+    )
+
+
+def test_indexed_u8_wide_bus():
+    make_test_index_generator(
+        addr=0x80000003,
+        count=19,
+        kind=IndexKind.U8,
+        memory_data=bytes(range(1, 20)),
+        expected=list(range(1, 20)),
+        data_width=fetch_bus_data_width,
+    )
+
+
+def test_indexed_u32_wide_bus():
+    make_test_index_generator(
+        addr=0x80000004,
+        count=7,
+        kind=IndexKind.U32,
+        memory_data=b"".join((i.to_bytes(4, "little") for i in [6, 5, 4, 3, 2, 1, 0])),
+        expected=[6, 5, 4, 3, 2, 1, 0],
+        data_width=fetch_bus_data_width,
+    )
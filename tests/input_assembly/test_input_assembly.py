@@ -1,18 +1,69 @@
+import numpy as np
 import pytest
 from amaranth import *
-from amaranth.sim import Simulator
 
 from gpu.input_assembly.cores import InputAssembly
 from gpu.input_assembly.layouts import InputData, InputMode
-from gpu.utils.layouts import num_textures
-from gpu.utils.types import Vector4_mem
+from gpu.utils.layouts import fetch_bus_data_width, num_textures, wb_bus_data_width
+from gpu.utils.types import FixedPoint_mem
 
-from ..utils.streams import stream_testbench
+from ..utils.sim import shared_stream_sim
+from ..utils.streams import data_checker
 from ..utils.testbench import SimpleTestbench
 
+# The cases share cached simulators, so they are kept on one xdist worker
+pytestmark = pytest.mark.xdist_group("input_assembly")
+
 default_data = InputData.const({"constant_value": [0.0, 0.0, 0.0, 1.0]})
 
 
+def fixed_mem_bytes(values) -> bytes:
+    """Memory image of FixedPoint_mem values, converted all at once."""
+    raw = np.rint(np.asarray(values, np.float64) * (1 << FixedPoint_mem.f_bits))
+    return raw.astype(f"<i{FixedPoint_mem.as_shape().width // 8}").tobytes()
+
+
+@shared_stream_sim
+def input_assembly_sim(case: dict, addr: int, data_width: int):
+    dut = InputAssembly(data_width=data_width)
+    t = SimpleTestbench(
+        dut,
+        addr_width=len(dut.bus.adr),
+        data_width=data_width,
+        mem_addr=addr,
+        mem_size=1024,
+    )
+
+    t.arbiter.add(dut.bus)
+
+    async def tb(ctx):
+        await t.initialize_memory(ctx, addr, case["memory_data"])
+
+        # Configure each attribute
+        ctx.set(dut.c_pos.mode, case["pos_mode"])
+        ctx.set(dut.c_pos.info, case["pos_data"])
+
+        ctx.set(dut.c_norm.mode, case["norm_mode"])
+        ctx.set(dut.c_norm.info, case["norm_data"])
+
+        tex_modes = [case["tex0_mode"], case["tex1_mode"]]
+        tex_datas = [case["tex0_data"], case["tex1_data"]]
+        for i in range(num_textures):
+            ctx.set(dut.c_tex[i].mode, tex_modes[i])
+            ctx.set(dut.c_tex[i].info, tex_datas[i])
+
+        ctx.set(dut.c_col.mode, case["color_mode"])
+        ctx.set(dut.c_col.info, case["color_data"])
+
+    return t, {
+        "clk_period": 1e-9,
+        "init_process": tb,
+        "input_stream": dut.is_index,
+        "output_stream": dut.os_vertex,
+        "is_finished": dut.ready,
+    }
+
+
 def make_test_input_assembly(
     test_name: str,
     addr: int,
@@ -29,51 +80,25 @@ def make_test_input_assembly(
     tex1_data: InputData = default_data,
     color_mode: InputMode = InputMode.CONSTANT,
     color_data: InputData = default_data,
+    data_width: int = wb_bus_data_width,
 ):
-    dut = InputAssembly()
-    t = SimpleTestbench(dut, mem_addr=addr, mem_size=1024)
-
-    t.arbiter.add(dut.bus)
-
-    async def tb(ctx):
-        await t.initialize_memory(ctx, addr, memory_data)
-
-        # Configure each attribute
-        ctx.set(dut.c_pos.mode, pos_mode)
-        ctx.set(dut.c_pos.info, pos_data)
-
-        ctx.set(dut.c_norm.mode, norm_mode)
-        ctx.set(dut.c_norm.info, norm_data)
-
-        tex_modes = [tex0_mode, tex1_mode]
-        tex_datas = [tex0_data, tex1_data]
-        for i in range(num_textures):
-            ctx.set(dut.c_tex[i].mode, tex_modes[i])
-            ctx.set(dut.c_tex[i].info, tex_datas[i])
-
-        ctx.set(dut.c_col.mode, color_mode)
-        ctx.set(dut.c_col.info, color_data)
-
-    sim = Simulator(t)
-    sim.add_clock(1e-9)
-    stream_testbench(
-        sim,
-        init_process=tb,
-        input_stream=dut.is_index,
-        input_data=input_idx,
-        output_stream=dut.os_vertex,
-        expected_output_data=expected,
-        is_finished=dut.ready,
+    input_assembly_sim(addr, data_width).run(
+        test_name,
+        input_idx,
+        memory_data=memory_data,
+        checker=data_checker(expected),
+        pos_mode=pos_mode,
+        pos_data=pos_data,
+        norm_mode=norm_mode,
+        norm_data=norm_data,
+        tex0_mode=tex0_mode,
+        tex0_data=tex0_data,
+        tex1_mode=tex1_mode,
+        tex1_data=tex1_data,
+        color_mode=color_mode,
+        color_data=color_data,
     )
 
-    try:
-        sim.run()
-    except Exception:
-        sim.reset()
-
-        with sim.write_vcd(f"{test_name}.vcd", f"{test_name}.gtkw", traces=t.dut):
-            sim.run()
-
 
 def test_input_assembly_constant_only():
     make_test_input_assembly(
@@ -93,6 +118,36 @@ def test_input_assembly_constant_only():
     )
 
 
+def test_input_assembly_disabled():
+    # disabled attributes ignore their (garbage) configuration
+    garbage = InputData.const({"constant_value": [9.0, 9.0, 9.0, 9.0]})
+    make_test_input_assembly(
+        test_name="test_input_assembly_disabled",
+        addr=0x80000000,
+        memory_data=fixed_mem_bytes([1.0, 2.0, 3.0, 4.0]),
+        input_idx=[0, 0],
+        expected=[
+            {
+                "position": [1.0, 2.0, 3.0, 4.0],
+                "normal": [0.0, 0.0, 0.0],
+                "texcoords": [[0.0, 0.0, 0.0, 1.0] for _ in range(num_textures)],
+                "color": [0.0, 0.0, 0.0, 1.0],
+            }
+            for _ in range(2)
+        ],
+        pos_mode=InputMode.PER_VERTEX,
+        pos_data=InputData.const({"per_vertex": {"address": 0x80000000, "stride": 16}}),
+        norm_mode=InputMode.DISABLED,
+        norm_data=garbage,
+        tex0_mode=InputMode.DISABLED,
+        tex0_data=garbage,
+        tex1_mode=InputMode.DISABLED,
+        tex1_data=garbage,
+        color_mode=InputMode.DISABLED,
+        color_data=garbage,
+    )
+
+
 component_cases = [
     ("test_input_assembly_continous_pos", "position", "pos", 0),
     ("test_input_assembly_continous_norm", "normal", "norm", 0),
@@ -123,7 +178,10 @@ if num_textures >= 2:
     ["test_name", "comp", "comp_in", "separation"],
     component_cases,
 )
-def test_input_assembly_single_component(test_name, comp, comp_in, separation):
+@pytest.mark.parametrize("data_width", [wb_bus_data_width, fetch_bus_data_width])
+def test_input_assembly_single_component(
+    test_name, comp, comp_in, separation, data_width
+):
     expected = [
         {
             "position": [0.0, 0.0, 0.0, 1.0],
@@ -164,20 +222,18 @@ def test_input_assembly_single_component(test_name, comp, comp_in, separation):
         ),
     }
 
-    vec1234_mem = Vector4_mem.const([1.0, 2.0, 3.0, 4.0])
-    vec5678_mem = Vector4_mem.const([5.0, 6.0, 7.0, 8.0])
-
     make_test_input_assembly(
-        test_name=test_name,
+        test_name=f"{test_name}_{data_width}",
         addr=0x80000000,
         memory_data=b"".join(
             (
-                vec1234_mem.as_bits().to_bytes(16, "little"),
+                fixed_mem_bytes([1.0, 2.0, 3.0, 4.0]),
                 b"\x00" * separation,
-                vec5678_mem.as_bits().to_bytes(16, "little"),
+                fixed_mem_bytes([5.0, 6.0, 7.0, 8.0]),
             )
         ),
         input_idx=[0, 1],
         expected=expected,
+        data_width=data_width,
         **v,
     )
@@ -4,6 +4,7 @@ from amaranth.sim import Simulator
 from gpu.input_assembly.cores import InputTopologyProcessor
 from gpu.utils.types import InputTopology
 
+from ..utils.sim import run_simulation
 from ..utils.streams import stream_testbench
 from ..utils.testbench import SimpleTestbench
 
@@ -37,13 +38,7 @@ def make_test_input_topology_processor(
         is_finished=dut.ready,
     )
 
-    try:
-        sim.run()
-    except Exception:
-        sim.reset()
-
-        with sim.write_vcd(f"{test_name}.vcd", f"{test_name}.gtkw", traces=t.dut):
-            sim.run()
+    run_simulation(sim, test_name, traces=t.dut)
 
 
 def test_triangle_list():
@@ -80,7 +75,7 @@ def test_triangle_strip():
         test_name="test_triangle_strip",
         input_topology=InputTopology.TRIANGLE_STRIP,
         input=[0, 1, 2, 3, 4],
-        expected=[0, 1, 2, 2, 1, 3, 3, 2, 4],
+        expected=[0, 1, 2, 2, 1, 3, 2, 3, 4],
     )
 
 
@@ -0,0 +1,62 @@
+from amaranth import *
+from amaranth.sim import Simulator
+
+from gpu.input_assembly.cores import VertexCacheTags
+from gpu.utils.layouts import vertex_cache_depth
+
+from ..utils.streams import stream_get, stream_testbench
+from ..utils.testbench import SimpleTestbench
+
+
+def make_test_vertex_cache_tags(
+    input: list[int],
+    expected_misses: list[int],
+    expected_lookups: list[tuple[int, int]],
+):
+    dut = VertexCacheTags()
+    t = SimpleTestbench(dut)
+
+    lookups = []
+
+    async def lookup_tb(ctx):
+        async for p in stream_get(ctx, dut.os_lookup, C(0)):
+            lookups.append((p.hit, p.slot))
+
+    async def final_checker(ctx):
+        assert lookups == expected_lookups
+
+    sim = Simulator(t)
+    sim.add_clock(1e-9)
+    sim.add_testbench(lookup_tb, background=True)
+    stream_testbench(
+        sim,
+        input_stream=dut.is_index,
+        input_data=input,
+        output_stream=dut.os_index,
+        expected_output_data=expected_misses,
+        final_checker=final_checker,
+        is_finished=dut.ready,
+        idle_for=20,
+    )
+
+    sim.run()
+
+
+def test_vertex_cache_reuse():
+    # two triangles sharing an edge
+    make_test_vertex_cache_tags(
+        input=[0, 1, 2, 2, 1, 3],
+        expected_misses=[0, 1, 2, 3],
+        expected_lookups=[(0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (0, 3)],
+    )
+
+
+def test_vertex_cache_fifo_replacement():
+    make_test_vertex_cache_tags(
+        input=list(range(vertex_cache_depth + 1)) + [1, 0],
+        # the oldest entry (index 0) is evicted by the first index that does
+        # not fit, index 1 is still cached
+        expected_misses=list(range(vertex_cache_depth + 1)) + [0],
+        expected_lookups=[(0, i) for i in range(vertex_cache_depth)]
+        + [(0, 0), (1, 1), (0, 1)],
+    )
@@ -1,19 +1,24 @@
 import pytest
-from amaranth.sim import Simulator
+from hypothesis import assume, example, given, settings
+from hypothesis import strategies as st
 
 from gpu.primitive_assembly.cores import PrimitiveAssembly
 from gpu.utils import fixed
-from gpu.utils.layouts import num_textures
 from gpu.utils.types import CullFace, FixedPoint, FrontFace, PrimitiveType
 
-from ..utils.streams import stream_testbench
+from ..utils.sim import shared_stream_sim
+from ..utils.streams import stream_put
 from ..utils.testbench import SimpleTestbench
+from ..utils.vertices import default_texcoords
+
+# The cases share cached simulators, so they are kept on one xdist worker
+pytestmark = pytest.mark.xdist_group("primitive_assembly")
 
 
 def make_pa_vertex(pos, color, color_back=None):
     return {
         "position_ndc": pos,
-        "texcoords": [[0.0, 0.0, 0.0, 1.0] for _ in range(num_textures)],
+        "texcoords": default_texcoords,
         "color": color,
         "color_back": color_back if color_back is not None else color,
     }
@@ -27,6 +32,52 @@ def assert_rasterizer_vertex(payload, pos, color, front):
     assert int(payload.front_facing) == front
 
 
+@shared_stream_sim
+def primitive_assembly_sim(case: dict, vertex_cache: bool):
+    dut = PrimitiveAssembly(vertex_cache=vertex_cache)
+
+    async def init_proc(ctx):
+        ctx.set(dut.config.type, case["type"])
+        ctx.set(dut.config.cull, case["cull"])
+        ctx.set(dut.config.winding, case["winding"])
+
+    testbenches = []
+    if vertex_cache:
+
+        async def lookup_tb(ctx):
+            await stream_put(ctx, dut.is_lookup, case["lookups"])
+
+        testbenches.append(lookup_tb)
+
+    return SimpleTestbench(dut), {
+        "testbenches": testbenches,
+        "init_process": init_proc,
+        "input_stream": dut.is_vertex,
+        "output_stream": dut.os_primitive,
+        "idle_for": 50,
+    }
+
+
+def run_primitive_assembly(
+    test_name: str,
+    vertices: list,
+    checker,
+    type: PrimitiveType,
+    cull: CullFace = CullFace.NONE,
+    winding: FrontFace = FrontFace.CCW,
+    lookups: list | None = None,
+):
+    primitive_assembly_sim(lookups is not None).run(
+        test_name,
+        vertices,
+        type=type,
+        cull=cull,
+        winding=winding,
+        lookups=lookups,
+        checker=checker,
+    )
+
+
 @pytest.mark.parametrize(
     "pos,color",
     [
@@ -42,20 +93,12 @@ def test_points_passthrough_hypothesis(pos, color):
     pos = [fixed.Const(v, FixedPoint).as_float() for v in pos]
     color = [fixed.Const(v, FixedPoint).as_float() for v in color]
 
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
-
     vertices = [
         make_pa_vertex(pos[i : i + 4], color[i : i + 4]) for i in range(0, len(pos), 4)
     ]
 
     print("Testing points passthrough with vertices:", vertices)
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.POINTS)
-        ctx.set(dut.config.cull, CullFace.NONE)
-        ctx.set(dut.config.winding, FrontFace.CCW)
-
     async def checker(ctx, results):
         assert len(results) == len(vertices)
         for i in range(len(vertices)):
@@ -63,35 +106,20 @@ def test_points_passthrough_hypothesis(pos, color):
                 results[i], pos[4 * i : 4 * i + 4], color[4 * i : 4 * i + 4], 1
             )
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=vertices,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=50,
+    run_primitive_assembly(
+        f"test_points_passthrough_hypothesis_{len(vertices)}",
+        vertices,
+        checker,
+        type=PrimitiveType.POINTS,
     )
 
-    sim.run()
-
 
 def test_lines_passthrough():
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
-
     line = [
         make_pa_vertex([0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0]),
         make_pa_vertex([0.5, -0.5, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0]),
     ]
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.LINES)
-        ctx.set(dut.config.cull, CullFace.NONE)
-        ctx.set(dut.config.winding, FrontFace.CCW)
-
     async def checker(ctx, results):
         assert len(results) == 2
         assert_rasterizer_vertex(
@@ -101,63 +129,40 @@ def test_lines_passthrough():
             results[1], line[1]["position_ndc"], line[1]["color"], 1
         )
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=line,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=50,
+    run_primitive_assembly(
+        "test_lines_passthrough", line, checker, type=PrimitiveType.LINES
     )
 
-    sim.run()
+
+# NDC coordinates on a 1/8 grid, so the area computed in FixedPoint is exact
+ndc_coord = st.integers(-8, 8).map(lambda v: v / 8)
 
 
 @pytest.mark.parametrize("front_face", [FrontFace.CCW, FrontFace.CW])
 @pytest.mark.parametrize(
     "cull_face", [CullFace.NONE, CullFace.BACK, CullFace.FRONT, CullFace.FRONT_AND_BACK]
 )
-@pytest.mark.parametrize(
-    "tri, winding_order",
-    [
-        (
-            [
-                make_pa_vertex(
-                    [0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0]
-                ),
-                make_pa_vertex(
-                    [1.0, 0.0, 0.0, 1.0], [1.0, 0.5, 0.0, 1.0], [0.0, 1.0, 0.5, 1.0]
-                ),
-                make_pa_vertex(
-                    [0.0, 1.0, 0.0, 1.0], [1.0, 0.0, 0.5, 1.0], [0.0, 0.5, 1.0, 1.0]
-                ),
-            ],
-            FrontFace.CCW,
-        ),
-        (
-            [
-                make_pa_vertex(
-                    [0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0]
-                ),
-                make_pa_vertex(
-                    [0.0, 1.0, 0.0, 1.0], [1.0, 0.5, 0.0, 1.0], [0.0, 1.0, 0.5, 1.0]
-                ),
-                make_pa_vertex(
-                    [1.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.5, 1.0], [0.0, 0.5, 1.0, 1.0]
-                ),
-            ],
-            FrontFace.CW,
-        ),
-    ],
-)
-def test_triangles_winding_and_front_face(tri, winding_order, front_face, cull_face):
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
+@settings(max_examples=10, deadline=None)
+@example(xy=[(0.0, 0.0), (1.0, 0.0), (0.0, 1.0)])  # CCW
+@example(xy=[(0.0, 0.0), (0.0, 1.0), (1.0, 0.0)])  # CW
+@given(xy=st.lists(st.tuples(ndc_coord, ndc_coord), min_size=3, max_size=3))
+def test_triangles_winding_and_front_face(xy, front_face, cull_face):
+    (x0, y0), (x1, y1), (x2, y2) = xy
+
+    # Twice the signed area, as the primitive assembly computes it
+    area = (x1 - x0) * (y2 - y1) - (x2 - x1) * (y1 - y0)
+    assume(area != 0)
 
-    ff_expected = winding_order == front_face
+    tri = [
+        make_pa_vertex([x, y, 0.0, 1.0], color, color_back)
+        for (x, y), color, color_back in zip(
+            xy,
+            [[1.0, 0.0, 0.0, 1.0], [1.0, 0.5, 0.0, 1.0], [1.0, 0.0, 0.5, 1.0]],
+            [[0.0, 1.0, 0.0, 1.0], [0.0, 1.0, 0.5, 1.0], [0.0, 0.5, 1.0, 1.0]],
+        )
+    ]
+
+    ff_expected = (area > 0) == (front_face == FrontFace.CCW)
     cols = ["color" if ff_expected else "color_back"] * 3
 
     if ff_expected:
@@ -165,11 +170,6 @@ def test_triangles_winding_and_front_face(tri, winding_order, front_face, cull_f
     else:
         should_be_culled = bool(cull_face & CullFace.BACK)
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.TRIANGLES)
-        ctx.set(dut.config.cull, cull_face)
-        ctx.set(dut.config.winding, front_face)
-
     async def checker(ctx, results):
         if should_be_culled:
             assert results == []
@@ -184,25 +184,17 @@ def test_triangles_winding_and_front_face(tri, winding_order, front_face, cull_f
                 results[i], tri[i]["position_ndc"], exp_color, ff_expected
             )
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=tri,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=50,
+    run_primitive_assembly(
+        f"test_triangles_winding_and_front_face_{front_face.name}_{cull_face.name}",
+        tri,
+        checker,
+        type=PrimitiveType.TRIANGLES,
+        cull=cull_face,
+        winding=front_face,
     )
 
-    sim.run()
-
 
 def test_triangle_front_facing():
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
-
     # CCW winding => front-facing with default FrontFace.CCW
     tri = [
         make_pa_vertex(
@@ -216,36 +208,18 @@ def test_triangle_front_facing():
         ),
     ]
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.TRIANGLES)
-        ctx.set(dut.config.cull, CullFace.NONE)
-        ctx.set(dut.config.winding, FrontFace.CCW)
-
     async def checker(ctx, results):
         assert len(results) == 3
         assert_rasterizer_vertex(results[0], tri[0]["position_ndc"], tri[0]["color"], 1)
         assert_rasterizer_vertex(results[1], tri[1]["position_ndc"], tri[1]["color"], 1)
         assert_rasterizer_vertex(results[2], tri[2]["position_ndc"], tri[2]["color"], 1)
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=tri,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=30,
+    run_primitive_assembly(
+        "test_triangle_front_facing", tri, checker, type=PrimitiveType.TRIANGLES
     )
 
-    sim.run()
-
 
 def test_triangle_back_face_culled():
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
-
     # CW winding with CCW front-face definition => back-facing
     tri = [
         make_pa_vertex(
@@ -259,34 +233,20 @@ def test_triangle_back_face_culled():
         ),
     ]
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.TRIANGLES)
-        ctx.set(dut.config.cull, CullFace.BACK)
-        ctx.set(dut.config.winding, FrontFace.CCW)
-
     async def checker(ctx, results):
         # Back-face culled => no output
         assert results == []
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=tri,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=30,
+    run_primitive_assembly(
+        "test_triangle_back_face_culled",
+        tri,
+        checker,
+        type=PrimitiveType.TRIANGLES,
+        cull=CullFace.BACK,
     )
 
-    sim.run()
-
 
 def test_triangle_back_face_uses_back_color():
-    dut = PrimitiveAssembly()
-    t = SimpleTestbench(dut)
-
     tri = [
         make_pa_vertex(
             [0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0]
@@ -299,11 +259,6 @@ def test_triangle_back_face_uses_back_color():
         ),
     ]
 
-    async def init_proc(ctx):
-        ctx.set(dut.config.type, PrimitiveType.TRIANGLES)
-        ctx.set(dut.config.cull, CullFace.NONE)
-        ctx.set(dut.config.winding, FrontFace.CCW)
-
     async def checker(ctx, results):
         assert len(results) == 3
         assert_rasterizer_vertex(
@@ -316,16 +271,45 @@ def test_triangle_back_face_uses_back_color():
             results[2], tri[2]["position_ndc"], tri[2]["color_back"], 0
         )
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=dut.is_vertex,
-        input_data=tri,
-        output_stream=dut.os_primitive,
-        output_data_checker=checker,
-        idle_for=30,
+    run_primitive_assembly(
+        "test_triangle_back_face_uses_back_color",
+        tri,
+        checker,
+        type=PrimitiveType.TRIANGLES,
     )
 
-    sim.run()
+
+def test_triangles_vertex_cache():
+    verts = [
+        make_pa_vertex([0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 1.0]),
+        make_pa_vertex([1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0]),
+        make_pa_vertex([0.0, 1.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0]),
+        make_pa_vertex([1.0, 1.0, 0.0, 1.0], [1.0, 1.0, 0.0, 1.0]),
+    ]
+
+    # quad as two triangles (0, 1, 2) and (2, 1, 3); only misses are shaded
+    order = [0, 1, 2, 2, 1, 3]
+    lookups = [
+        {"hit": 0, "slot": 0},
+        {"hit": 0, "slot": 1},
+        {"hit": 0, "slot": 2},
+        {"hit": 1, "slot": 2},
+        {"hit": 1, "slot": 1},
+        {"hit": 0, "slot": 3},
+    ]
+
+    async def checker(ctx, results):
+        assert len(results) == len(order)
+        for res, i in zip(results, order):
+            assert_rasterizer_vertex(
+                res, verts[i]["position_ndc"], verts[i]["color"], 0
+            )
+
+    run_primitive_assembly(
+        "test_triangles_vertex_cache",
+        verts,
+        checker,
+        type=PrimitiveType.TRIANGLES,
+        winding=FrontFace.CW,
+        lookups=lookups,
+    )
@@ -256,6 +256,18 @@ def make_vertex(x, y, z, w=1.0, r=1.0, g=1.0, b=1.0, a=1.0):
             ],
             2,
         ),
+        # Edge from just outside +x onto the plane: no reciprocal of the
+        # (tiny) distance difference, the outside end is moved onto the plane
+        (
+            "triangle_clip_edge_on_plane",
+            PrimitiveType.TRIANGLES,
+            [
+                make_vertex(0.0, 0.0, 0.0),  # inside
+                make_vertex(1.0 + 2**-12, 0.0, 0.0),  # just outside
+                make_vertex(1.0, 0.5, 0.0),  # on the plane
+            ],
+            2,
+        ),
     ],
 )
 def test_clipper(test_name, prim_type, input_vertices, expected_count):
@@ -397,7 +409,7 @@ def test_clipper_interpolation():
                 valid_colors = [
                     (1.0, 0.0, 0.0),
                     (0.0, 0.0, 1.0),
-                    (0.5, 0.0, 0.5),
+                    (0.5, 0.5, 0.0),
                     (0.0, 0.5, 0.5),
                 ]
 
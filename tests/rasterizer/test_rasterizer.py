@@ -1,51 +1,111 @@
+import numpy as np
 import pytest
+from amaranth import *
+from amaranth.lib import data
 from amaranth.sim import Simulator
 
 from gpu.rasterizer.rasterizer import TriangleRasterizer
-from gpu.utils.layouts import num_textures
+from gpu.utils import fixed
+from gpu.utils.layouts import FragmentLayout
+from gpu.utils.types import FixedPoint
 
-from ..utils.streams import stream_testbench
+from ..utils.sim import shared_stream_sim
+from ..utils.streams import stream_get, stream_put, stream_testbench
 from ..utils.testbench import SimpleTestbench
-from ..utils.visualization import Fragment, FragmentVisualizer
+from ..utils.vertices import default_texcoords
+from ..utils.visualization import FragmentArrays, FragmentVisualizer
 
 
 def make_pa_vertex(pos, color):
     """Create a primitive assembly vertex (output of PrimitiveAssembly)"""
     return {
         "position_ndc": pos,
-        "texcoords": [[0.0, 0.0, 0.0, 1.0] for _ in range(num_textures)],
+        "texcoords": default_texcoords,
         "color": color,
         "front_facing": 1,
     }
 
 
-@pytest.mark.slow
-@pytest.mark.parametrize("persp", [True, False])
-def test_rasterizer_single_triangle(persp: bool):
-    """Test rasterizing a single triangle"""
-    dut = TriangleRasterizer()
-    t = SimpleTestbench(dut)
-
-    # Setup framebuffer
-    fb_width = 128
-    fb_height = 128
-    fb_info = {
-        "width": fb_width,
-        "height": fb_height,
+def make_fb_info(width: int, height: int) -> dict:
+    """Framebuffer info covering the whole framebuffer with the viewport and
+    scissor"""
+    return {
+        "width": width,
+        "height": height,
         "viewport_x": 0.0,
         "viewport_y": 0.0,
-        "viewport_width": float(fb_width),
-        "viewport_height": float(fb_height),
+        "viewport_width": float(width),
+        "viewport_height": float(height),
         "viewport_min_depth": 0.0,
         "viewport_max_depth": 1.0,
         "scissor_offset_x": 0,
         "scissor_offset_y": 0,
-        "scissor_width": fb_width,
-        "scissor_height": fb_height,
+        "scissor_width": width,
+        "scissor_height": height,
         "color_address": 0,
-        "color_pitch": fb_width * 4,
+        "color_pitch": width * 4,
     }
 
+
+def fragments_to_arrays(fragments) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unpack collected fragments into (N, 2) coordinate, (N, 4) color and (N,)
+    depth arrays, converting every fixed-point field in one go"""
+    layout = data.Layout.cast(FragmentLayout)
+    raw = np.array([frag.as_bits() for frag in fragments], dtype=object)
+
+    def column(offset: int, shape) -> np.ndarray:
+        raw_shape = Shape.cast(shape)
+        bits = ((raw >> offset) & ((1 << raw_shape.width) - 1)).astype(np.int64)
+        if raw_shape.signed:
+            bits -= (bits >> (raw_shape.width - 1)) << raw_shape.width
+        if hasattr(shape, "f_bits"):
+            return bits.astype(np.float32) * np.float32(2.0**-shape.f_bits)
+        return bits
+
+    def columns(name: str) -> np.ndarray:
+        field = layout[name]
+        elem = field.shape.elem_shape
+        width = Shape.cast(elem).width
+        return np.stack(
+            [column(field.offset + i * width, elem) for i in range(field.shape.length)],
+            axis=-1,
+        )
+
+    depth = layout["depth"]
+    return columns("coord_pos"), columns("color"), column(depth.offset, depth.shape)
+
+
+@shared_stream_sim
+def rasterizer_sim(case: dict, idle_for: int):
+    dut = TriangleRasterizer()
+
+    async def init_proc(ctx):
+        ctx.set(dut.fb_info, case["fb_info"])
+
+    return SimpleTestbench(dut), {
+        "init_process": init_proc,
+        "input_stream": dut.is_vertex,
+        "output_stream": dut.os_fragment,
+        "is_finished": dut.ready,
+        "idle_for": idle_for,
+    }
+
+
+def run_rasterizer(
+    test_name: str, fb_info: dict, vertices: list, checker, idle_for: int
+):
+    rasterizer_sim(idle_for).run(test_name, vertices, fb_info=fb_info, checker=checker)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("persp", [True, False])
+def test_rasterizer_single_triangle(persp: bool):
+    """Test rasterizing a single triangle"""
+    # Setup framebuffer
+    fb_width = 128
+    fb_height = 128
+    fb_info = make_fb_info(fb_width, fb_height)
+
     # Create a triangle in NDC space (centered, filling ~1/4 of viewport)
     # Triangle vertices in NDC [-1, 1]
     triangle_vertices = [
@@ -72,48 +132,25 @@ def test_rasterizer_single_triangle(persp: bool):
         print(f"Generated {len(results)} fragments")
 
         # Basic validation: all fragments should be within bounds
-        for frag in results:
-            x, y = int(frag.coord_pos[0]), int(frag.coord_pos[1])
-            assert 0 <= x < fb_width, f"Fragment X {x} out of bounds"
-            assert 0 <= y < fb_height, f"Fragment Y {y} out of bounds"
-
-            assert all(
-                0.0 <= c.as_float() <= 1.0 for c in frag.color
-            ), f"Fragment color {frag.color} out of range"
-
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-
-    async def init_proc(ctx):
-        # Set framebuffer info
-        ctx.set(t.dut.fb_info, fb_info)
-
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=t.dut.is_vertex,
-        input_data=triangle_vertices,
-        output_stream=t.dut.os_fragment,
-        output_data_checker=collect_output,
+        coords, colors, _ = fragments_to_arrays(results)
+        x, y = coords[:, 0], coords[:, 1]
+        assert ((0 <= x) & (x < fb_width)).all(), f"Fragment X {x} out of bounds"
+        assert ((0 <= y) & (y < fb_height)).all(), f"Fragment Y {y} out of bounds"
+
+        assert ((0.0 <= colors) & (colors <= 1.0)).all(), "Fragment color out of range"
+
+    run_rasterizer(
+        f"test_rasterizer_single_triangle_{persp}",
+        fb_info,
+        triangle_vertices,
+        collect_output,
         idle_for=100000,  # Wait for rasterization to complete
     )
 
-    sim.run()
-
     assert len(collected_fragments) > 0, "No fragments were rasterized"
 
-    fragments = [
-        Fragment(
-            coord_pos=(frag.coord_pos[0], frag.coord_pos[1]),
-            color=(
-                frag.color[0].as_float(),
-                frag.color[1].as_float(),
-                frag.color[2].as_float(),
-                frag.color[3].as_float(),
-            ),
-        )
-        for frag in collected_fragments
-    ]
+    coords, colors, _ = fragments_to_arrays(collected_fragments)
+    fragments = FragmentArrays(coord_pos=coords, color=colors)
 
     # Visualize results
     file = "triangle_single_persp.ppm" if persp else "triangle_single_linear.ppm"
@@ -131,28 +168,10 @@ def test_rasterizer_single_triangle(persp: bool):
 @pytest.mark.slow
 def test_rasterizer_two_triangles():
     """Test rasterizing two triangles with different colors"""
-    dut = TriangleRasterizer()
-    t = SimpleTestbench(dut)
-
     # Setup framebuffer
     fb_width = 128
     fb_height = 128
-    fb_info = {
-        "width": fb_width,
-        "height": fb_height,
-        "viewport_x": 0.0,
-        "viewport_y": 0.0,
-        "viewport_width": float(fb_width),
-        "viewport_height": float(fb_height),
-        "viewport_min_depth": 0.0,
-        "viewport_max_depth": 1.0,
-        "scissor_offset_x": 0,
-        "scissor_offset_y": 0,
-        "scissor_width": fb_width,
-        "scissor_height": fb_height,
-        "color_address": 0,
-        "color_pitch": fb_width * 4,
-    }
+    fb_info = make_fb_info(fb_width, fb_height)
 
     # Two triangles positioned side by side
     triangle1 = [
@@ -176,16 +195,9 @@ def test_rasterizer_two_triangles():
 
         if len(results) > 0:
             # Count fragments by color to verify both triangles rendered
-            red_frags = sum(
-                1
-                for f in results
-                if f.color[0].as_float() > 0.8 and f.color[1].as_float() < 0.2
-            )
-            blue_frags = sum(
-                1
-                for f in results
-                if f.color[2].as_float() > 0.8 and f.color[0].as_float() < 0.2
-            )
+            _, colors, _ = fragments_to_arrays(results)
+            red_frags = ((colors[:, 0] > 0.8) & (colors[:, 1] < 0.2)).sum()
+            blue_frags = ((colors[:, 2] > 0.8) & (colors[:, 0] < 0.2)).sum()
 
             print(f"Red fragments: {red_frags}, Blue fragments: {blue_frags}")
             # Only assert if we have fragments
@@ -194,38 +206,17 @@ def test_rasterizer_two_triangles():
         else:
             print("Warning: No fragments generated for two triangles test")
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-
     input_vertices = triangle1 + triangle2
-
-    async def init_proc(ctx):
-        ctx.set(t.dut.fb_info, fb_info)
-
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=t.dut.is_vertex,
-        input_data=input_vertices,
-        output_stream=t.dut.os_fragment,
-        output_data_checker=collect_output,
+    run_rasterizer(
+        "test_rasterizer_two_triangles",
+        fb_info,
+        input_vertices,
+        collect_output,
         idle_for=10000,  # Wait for rasterization to complete
     )
 
-    sim.run()
-
-    fragments = [
-        Fragment(
-            coord_pos=(frag.coord_pos[0], frag.coord_pos[1]),
-            color=(
-                frag.color[0].as_float(),
-                frag.color[1].as_float(),
-                frag.color[2].as_float(),
-                frag.color[3].as_float(),
-            ),
-        )
-        for frag in all_fragments
-    ]
+    coords, colors, _ = fragments_to_arrays(all_fragments)
+    fragments = FragmentArrays(coord_pos=coords, color=colors)
 
     # Visualize results
     visualizer = FragmentVisualizer(fb_width, fb_height)
@@ -241,27 +232,9 @@ def test_rasterizer_two_triangles():
 @pytest.mark.slow
 def test_rasterizer_depth_interpolation():
     """Test that depth is correctly interpolated"""
-    dut = TriangleRasterizer()
-    t = SimpleTestbench(dut)
-
     fb_width = 128
     fb_height = 128
-    fb_info = {
-        "width": fb_width,
-        "height": fb_height,
-        "viewport_x": 0.0,
-        "viewport_y": 0.0,
-        "viewport_width": float(fb_width),
-        "viewport_height": float(fb_height),
-        "viewport_min_depth": 0.0,
-        "viewport_max_depth": 1.0,
-        "scissor_offset_x": 0,
-        "scissor_offset_y": 0,
-        "scissor_width": fb_width,
-        "scissor_height": fb_height,
-        "color_address": 0,
-        "color_pitch": fb_width * 4,
-    }
+    fb_info = make_fb_info(fb_width, fb_height)
 
     # Triangle with varying depth (0.2 at corners, 0.8 at center)
     triangle = [
@@ -278,46 +251,26 @@ def test_rasterizer_depth_interpolation():
         print(f"Generated {len(results)} fragments")
 
         if results:
-            depths = [
-                f.depth.as_float() if hasattr(f.depth, "as_float") else float(f.depth)
-                for f in results
-            ]
-            print(f"Depth range: {min(depths):.4f} to {max(depths):.4f}")
-            if min(depths) < 0.2 or max(depths) > 0.8:
+            _, _, depths = fragments_to_arrays(results)
+            print(f"Depth range: {depths.min():.4f} to {depths.max():.4f}")
+            if depths.min() < 0.2 or depths.max() > 0.8:
                 print("Warning: Depth values outside expected range [0.2, 0.8]")
         else:
             print("Warning: No fragments generated for depth interpolation test")
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
-
-    async def init_proc(ctx):
-        ctx.set(t.dut.fb_info, fb_info)
-
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=t.dut.is_vertex,
-        input_data=triangle,
-        output_stream=t.dut.os_fragment,
-        output_data_checker=collect_output,
+    run_rasterizer(
+        "test_rasterizer_depth_interpolation",
+        fb_info,
+        triangle,
+        collect_output,
         idle_for=10000,  # Wait for rasterization to complete
     )
 
-    sim.run()
-
-    fragments = [
-        Fragment(
-            coord_pos=(frag.coord_pos[0], frag.coord_pos[1]),
-            color=(
-                (1.0 + frag.depth.as_float()) / 2.0,
-                0.0,
-                0.0,
-                1.0,
-            ),  # Visualize depth as red channel
-        )
-        for frag in collected_fragments
-    ]
+    coords, _, depths = fragments_to_arrays(collected_fragments)
+    colors = np.zeros((len(depths), 4), dtype=np.float32)
+    colors[:, 0] = (1.0 + depths) / 2.0  # Visualize depth as red channel
+    colors[:, 3] = 1.0
+    fragments = FragmentArrays(coord_pos=coords, color=colors)
 
     # Visualize results
     visualizer = FragmentVisualizer(fb_width, fb_height)
@@ -334,27 +287,9 @@ def test_rasterizer_depth_interpolation():
 @pytest.mark.parametrize("alpha", [True, False])
 def test_rasterizer_two_overlapping_triangles(alpha: bool):
     """Test rasterizing two overlapping triangles to check fragment generation"""
-    dut = TriangleRasterizer()
-    t = SimpleTestbench(dut)
-
     fb_width = 128
     fb_height = 128
-    fb_info = {
-        "width": fb_width,
-        "height": fb_height,
-        "viewport_x": 0.0,
-        "viewport_y": 0.0,
-        "viewport_width": float(fb_width),
-        "viewport_height": float(fb_height),
-        "viewport_min_depth": 0.0,
-        "viewport_max_depth": 1.0,
-        "scissor_offset_x": 0,
-        "scissor_offset_y": 0,
-        "scissor_width": fb_width,
-        "scissor_height": fb_height,
-        "color_address": 0,
-        "color_pitch": fb_width * 4,
-    }
+    fb_info = make_fb_info(fb_width, fb_height)
 
     # Two overlapping triangles
     triangle1 = [
@@ -381,52 +316,25 @@ def test_rasterizer_two_overlapping_triangles(alpha: bool):
         print(f"Generated {len(results)} fragments for overlapping triangles")
 
         if len(results) > 0:
-            red_frags = sum(
-                1
-                for f in results
-                if f.color[0].as_float() > 0.8 and f.color[1].as_float() < 0.2
-            )
-            green_frags = sum(
-                1
-                for f in results
-                if f.color[1].as_float() > 0.8 and f.color[0].as_float() < 0.2
-            )
+            _, colors, _ = fragments_to_arrays(results)
+            red_frags = ((colors[:, 0] > 0.8) & (colors[:, 1] < 0.2)).sum()
+            green_frags = ((colors[:, 1] > 0.8) & (colors[:, 0] < 0.2)).sum()
 
             print(f"Red fragments: {red_frags}, Green fragments: {green_frags}")
         else:
             print("Warning: No fragments generated for overlapping triangles test")
 
-    sim = Simulator(t)
-    sim.add_clock(1e-6)
     input_vertices = triangle1 + triangle2
-
-    async def init_proc(ctx):
-        ctx.set(t.dut.fb_info, fb_info)
-
-    stream_testbench(
-        sim,
-        init_process=init_proc,
-        input_stream=t.dut.is_vertex,
-        input_data=input_vertices,
-        output_stream=t.dut.os_fragment,
-        output_data_checker=collect_output,
+    run_rasterizer(
+        f"test_rasterizer_two_overlapping_triangles_{alpha}",
+        fb_info,
+        input_vertices,
+        collect_output,
         idle_for=10000,  # Wait for rasterization to complete
     )
 
-    sim.run()
-
-    fragments = [
-        Fragment(
-            coord_pos=(frag.coord_pos[0], frag.coord_pos[1]),
-            color=(
-                frag.color[0].as_float(),
-                frag.color[1].as_float(),
-                frag.color[2].as_float(),
-                frag.color[3].as_float(),
-            ),
-        )
-        for frag in all_fragments
-    ]
+    coords, colors, _ = fragments_to_arrays(all_fragments)
+    fragments = FragmentArrays(coord_pos=coords, color=colors)
 
     # Visualize results
     visualizer = FragmentVisualizer(fb_width, fb_height)
@@ -438,3 +346,176 @@ def test_rasterizer_two_overlapping_triangles(alpha: bool):
     visualizer.generate_ppm_image(file)
     stats = visualizer.generate_statistics(fragments)
     print("Rasterization statistics:", stats)
+
+
+@pytest.mark.parametrize(
+    "quad",
+    [
+        # split along the main diagonal, which runs through pixel centers
+        [(-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, -1.0), (1.0, 1.0), (-1.0, 1.0)],
+        # the other diagonal, opposite winding
+        [(-1.0, 1.0), (1.0, 1.0), (1.0, -1.0), (-1.0, 1.0), (1.0, -1.0), (-1.0, -1.0)],
+    ],
+)
+def test_rasterizer_shared_edge_fill_rule(quad):
+    """Samples on an edge shared by two triangles are covered exactly once"""
+    fb_size = 8
+    fb_info = make_fb_info(fb_size, fb_size)
+
+    input_vertices = [
+        make_pa_vertex([x, y, 0.5, 1.0], [1.0, 1.0, 1.0, 1.0]) for x, y in quad
+    ]
+
+    async def check_output(ctx, results):
+        coords = [(int(f.coord_pos[0]), int(f.coord_pos[1])) for f in results]
+        assert sorted(coords) == [
+            (x, y) for x in range(fb_size) for y in range(fb_size)
+        ], "Quad not covered exactly once"
+
+    run_rasterizer(
+        "test_rasterizer_shared_edge_fill_rule",
+        fb_info,
+        input_vertices,
+        check_output,
+        idle_for=1000,
+    )
+
+
+@pytest.mark.parametrize("ccw", [True, False])
+def test_rasterizer_thin_triangle_last_row(ccw: bool):
+    """A row that is empty on its upper sample row is not skipped while its
+    lower sample row is the last row of the bounding box"""
+    fb_size = 64
+    fb_info = make_fb_info(fb_size, fb_size)
+
+    # screen space (0, 0), (0, 9.9), (40, 9.9): an odd bottom row (9) whose
+    # covered samples extend past where row 8 leaves the triangle
+    screen = [(0.0, 0.0), (0.0, 9.9), (40.0, 9.9)]
+    if not ccw:
+        screen.reverse()
+
+    ndc = [
+        [fixed.Const(c / fb_size * 2 - 1, FixedPoint).as_float() for c in v]
+        for v in screen
+    ]
+    input_vertices = [
+        make_pa_vertex([x, y, 0.5, 1.0], [1.0, 1.0, 1.0, 1.0]) for x, y in ndc
+    ]
+
+    # pixel-center reference; no center lies on an edge of this triangle
+    (x0, y0), (x1, y1), (x2, y2) = [[(c + 1) / 2 * fb_size for c in v] for v in ndc]
+
+    def edge(ax, ay, bx, by, px, py):
+        return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+    expected = []
+    for x in range(fb_size):
+        for y in range(fb_size):
+            px, py = x + 0.5, y + 0.5
+            e = [
+                edge(x0, y0, x1, y1, px, py),
+                edge(x1, y1, x2, y2, px, py),
+                edge(x2, y2, x0, y0, px, py),
+            ]
+            if all(v > 0 for v in e) or all(v < 0 for v in e):
+                expected.append((x, y))
+
+    async def check_output(ctx, results):
+        coords = [(int(f.coord_pos[0]), int(f.coord_pos[1])) for f in results]
+        assert sorted(coords) == expected
+
+    run_rasterizer(
+        f"test_rasterizer_thin_triangle_last_row_{ccw}",
+        fb_info,
+        input_vertices,
+        check_output,
+        idle_for=1000,
+    )
+
+
+def test_rasterizer_degenerate_triangle():
+    """Zero-area triangles are culled without emitting fragments"""
+    fb_size = 8
+    fb_info = make_fb_info(fb_size, fb_size)
+
+    # collinear vertices along the diagonal, through pixel centers
+    input_vertices = [
+        make_pa_vertex([x, x, 0.5, 1.0], [1.0, 1.0, 1.0, 1.0]) for x in [-1.0, 0.0, 1.0]
+    ]
+
+    async def check_output(ctx, results):
+        assert results == [], "Degenerate triangle emitted fragments"
+
+    run_rasterizer(
+        "test_rasterizer_degenerate_triangle",
+        fb_info,
+        input_vertices,
+        check_output,
+        idle_for=100,
+    )
+
+
+def test_rasterizer_early_depth():
+    """Samples failing the early depth query are not emitted"""
+    dut = TriangleRasterizer(early_depth=True)
+    t = SimpleTestbench(dut)
+
+    fb_size = 8
+    fb_info = make_fb_info(fb_size, fb_size)
+
+    # full screen quad, depth 0.5
+    quad = [
+        (-1.0, -1.0),
+        (1.0, -1.0),
+        (1.0, 1.0),
+        (-1.0, -1.0),
+        (1.0, 1.0),
+        (-1.0, 1.0),
+    ]
+    input_vertices = [
+        make_pa_vertex([x, y, 0.5, 1.0], [1.0, 1.0, 1.0, 1.0]) for x, y in quad
+    ]
+
+    # the left half of the screen passes
+    queries = []
+
+    async def query_tb(ctx):
+        async for q in stream_get(ctx, t.dut.os_depth_query, C(0)):
+            queries.append((int(q.coord_pos[0]), int(q.coord_pos[1])))
+            assert q.depth.as_float() == pytest.approx(0.5, abs=2**-10)
+
+    async def result_tb(ctx):
+        sent = 0
+        while True:
+            if sent < len(queries):
+                await stream_put(ctx, t.dut.is_depth_result, [queries[sent][0] < 4])
+                sent += 1
+            else:
+                await ctx.tick()
+
+    async def check_output(ctx, results):
+        coords = [(int(f.coord_pos[0]), int(f.coord_pos[1])) for f in results]
+        all_samples = [(x, y) for x in range(fb_size) for y in range(fb_size)]
+        assert sorted(queries) == all_samples
+        assert sorted(coords) == [(x, y) for x, y in all_samples if x < 4]
+
+    sim = Simulator(t)
+    sim.add_clock(1e-6)
+    sim.add_testbench(query_tb, background=True)
+    sim.add_testbench(result_tb, background=True)
+
+    async def init_proc(ctx):
+        ctx.set(t.dut.fb_info, fb_info)
+
+    stream_testbench(
+        sim,
+        init_process=init_proc,
+        input_stream=t.dut.is_vertex,
+        input_data=input_vertices,
+        output_stream=t.dut.os_fragment,
+        output_data_checker=check_output,
+        is_finished=t.dut.ready,
+        idle_for=1000,
+    )
+
+    sim.run()
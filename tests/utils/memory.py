@@ -1,41 +1,102 @@
+import functools
+
 from amaranth_soc.memory import MemoryMap, ResourceInfo
 from amaranth_soc.wishbone.bus import Interface
 
 
+@functools.cache
+def _resources_by_path(mmap: MemoryMap) -> dict[tuple, ResourceInfo]:
+    # The memory map is frozen once it is read from a bus, so its resources
+    # only have to be walked once
+    return {res.path: res for res in mmap.all_resources()}
+
+
 def get_memory_resource(mmap: MemoryMap, path) -> ResourceInfo:
     path = tuple(MemoryMap.Name(p) for p in path)
 
-    found = (res for res in mmap.all_resources() if res.path == path)
-    if res := next(found, None):
+    if res := _resources_by_path(mmap).get(path):
         return res
 
     raise KeyError(f"Resource {path} not found in memory map")
 
 
 class DebugAccess(Interface):
-    async def read_bytes(self, ctx, addr: int, width: int) -> bytes:
-        """Perform read of 8-bit data."""
-        assert self.granularity == 8, "Granularity must be 8 bits for read_bytes"
-
-        ret = bytearray()
-        for i in range(width):
-            a = addr + i
-
-            ctx.set(self.cyc, 1)
-            ctx.set(self.stb, 1)
-            ctx.set(self.we, 0)
+    async def _burst(
+        self, ctx, we: bool, beats: list[tuple[int, int, int]]
+    ) -> list[int]:
+        """Perform back-to-back transfers in a single bus cycle.
 
-            sel = a % (self.data_width // 8)
-            adr = a // (self.data_width // 8)
+        ``cyc`` and ``stb`` stay asserted from the first beat to the last, the
+        next beat is put on the bus as soon as the previous one is acknowledged.
 
+        Parameters
+        ----------
+        ctx : SimulatorProcess
+            The simulation context.
+        we : bool
+            Whether the beats are writes.
+        beats : list[tuple[int, int, int]]
+            Word address, byte select and write data of each beat.
+        Returns
+        -------
+        list[int]
+            The data read in each beat.
+        """
+        data = []
+        if not beats:
+            return data
+
+        ctx.set(self.cyc, 1)
+        ctx.set(self.stb, 1)
+        ctx.set(self.we, we)
+        prev_sel = None
+        for adr, sel, dat_w in beats:
             ctx.set(self.adr, adr)
-            ctx.set(self.sel, 1 << sel)
+            if sel != prev_sel:
+                ctx.set(self.sel, sel)
+                prev_sel = sel
+            ctx.set(self.dat_w, dat_w)
             await ctx.tick().until(self.ack)
-            ctx.set(self.cyc, 0)
-            ctx.set(self.stb, 0)
-            ret.append((ctx.get(self.dat_r) >> (sel * 8)) & 0xFF)
-            await ctx.tick()
+            data.append(ctx.get(self.dat_r))
+        ctx.set(self.cyc, 0)
+        ctx.set(self.stb, 0)
+        await ctx.tick()
+        return data
+
+    def _sel_all(self) -> int:
+        """Byte select of a whole bus word."""
+        return (1 << (self.data_width // self.granularity)) - 1
+
+    def _word_blocks(self, addr: int, width: int) -> list[tuple[int, int, int]]:
+        """Split a byte range into (word address, first byte, byte count) blocks,
+        one per bus word it touches."""
+        bytes_per_word = self.data_width // 8
+
+        blocks = []
+        end = addr + width
+        while addr < end:
+            off = addr % bytes_per_word
+            count = min(bytes_per_word - off, end - addr)
+            blocks.append((addr // bytes_per_word, off, count))
+            addr += count
+        return blocks
+
+    async def read_bytes(self, ctx, addr: int, width: int) -> bytes:
+        """Perform read of 8-bit data."""
+        assert self.granularity == 8, "Granularity must be 8 bits for read_bytes"
 
+        blocks = self._word_blocks(addr, width)
+        words = await self._burst(
+            ctx,
+            False,
+            [(adr, ((1 << count) - 1) << off, 0) for adr, off, count in blocks],
+        )
+
+        ret = bytearray()
+        for (_, off, count), word in zip(blocks, words):
+            ret += ((word >> (off * 8)) & ((1 << (count * 8)) - 1)).to_bytes(
+                count, "little"
+            )
         return bytes(ret)
 
     async def read(self, ctx, addr: int, width: int) -> list[int]:
@@ -59,56 +120,24 @@ class DebugAccess(Interface):
             addr % (self.data_width // self.granularity) == 0
         ), "Address must be aligned to data width/granularity"
 
-        data = []
-        for i in range(width):
-            ctx.set(self.adr, addr + i)
-            ctx.set(self.sel, ~0)
-            ctx.set(self.cyc, 1)
-            ctx.set(self.stb, 1)
-            ctx.set(self.we, 0)
-            await ctx.tick().until(self.ack)
-            data.append(ctx.get(self.dat_r))
-            ctx.set(self.cyc, 0)
-            ctx.set(self.stb, 0)
-            await ctx.tick()
-        return data
+        sel = self._sel_all()
+        return await self._burst(ctx, False, [(addr + i, sel, 0) for i in range(width)])
 
     async def write_bytes(self, ctx, addr: int, data: bytes) -> None:
         """Perform writes of 8-bit data."""
         assert self.granularity == 8, "Granularity must be 8 bits for write_bytes"
 
-        # separate data by address alignment and write them block by block
-        # (each block should have different address // (data_width // 8))
-        blocks: list[tuple[int, int, bytearray]] = []  # addr_block, start_idx, data
-        for byte, adr in zip(data, range(addr, addr + len(data))):
-            addr_block = adr // (self.data_width // 8)
-            if len(blocks) == 0 or blocks[-1][0] != addr_block:
-                off = adr % (self.data_width // 8)
-                blocks.append((addr_block, off, bytearray([byte])))
-            else:
-                blocks[-1] = (
-                    blocks[-1][0],
-                    blocks[-1][1],
-                    blocks[-1][2] + bytearray([byte]),
+        beats = []
+        for adr, off, count in self._word_blocks(addr, len(data)):
+            block, data = data[:count], data[count:]
+            beats.append(
+                (
+                    adr,
+                    ((1 << count) - 1) << off,
+                    int.from_bytes(block, "little") << (off * 8),
                 )
-
-        for addr_block, start_idx, block_data in blocks:
-            # write block_data to addr_block
-            ctx.set(self.cyc, 1)
-            ctx.set(self.stb, 1)
-            ctx.set(self.we, 1)
-            ctx.set(self.adr, addr_block)
-            dat_w_v = 0
-            sel_v = 0
-            for i, byte in enumerate(block_data, start=start_idx):
-                dat_w_v |= byte << (i * 8)
-                sel_v |= 1 << i
-            ctx.set(self.dat_w, dat_w_v)
-            ctx.set(self.sel, sel_v)
-            await ctx.tick().until(self.ack)
-            ctx.set(self.cyc, 0)
-            ctx.set(self.stb, 0)
-            await ctx.tick()
+            )
+        await self._burst(ctx, True, beats)
 
     async def write(self, ctx, addr: int, data: list[int]) -> None:
         """Perform a write transaction. on word-granularity.
@@ -127,14 +156,8 @@ class DebugAccess(Interface):
             addr % (self.data_width // self.granularity) == 0
         ), "Address must be aligned to data width/granularity"
 
-        for i, datum in enumerate(data):
-            ctx.set(self.adr, addr // (self.data_width // self.granularity) + i)
-            ctx.set(self.dat_w, datum)
-            ctx.set(self.sel, ~0)
-            ctx.set(self.cyc, 1)
-            ctx.set(self.stb, 1)
-            ctx.set(self.we, 1)
-            await ctx.tick().until(self.ack)
-            ctx.set(self.cyc, 0)
-            ctx.set(self.stb, 0)
-            await ctx.tick()
+        base = addr // (self.data_width // self.granularity)
+        sel = self._sel_all()
+        await self._burst(
+            ctx, True, [(base + i, sel, datum) for i, datum in enumerate(data)]
+        )
@@ -0,0 +1,93 @@
+import functools
+import os
+
+from amaranth.sim import Simulator
+
+from .streams import stream_testbench
+
+# Set from the --emit-vcd pytest option
+emit_vcd = False
+
+
+def run_simulation(sim: Simulator, name: str, traces=()) -> None:
+    """Runs the simulation; if it fails and --emit-vcd is given, runs it
+    again from the start to record ``name``.vcd and ``name``.gtkw before
+    reraising.
+
+    Under pytest-xdist the worker id is appended to ``name``, so that cases
+    sharing a name in different workers do not write the same files."""
+    if worker := os.environ.get("PYTEST_XDIST_WORKER"):
+        name = f"{name}_{worker}"
+
+    try:
+        sim.run()
+    except Exception:
+        if emit_vcd:
+            sim.reset()
+            try:
+                with sim.write_vcd(f"{name}.vcd", f"{name}.gtkw", traces=traces):
+                    sim.run()
+            except Exception:
+                pass
+        raise
+
+
+class SharedStreamSim:
+    """Simulator of a `stream_testbench`, elaborated once and reused by every
+    case.
+
+    The processes read the case to run from `case` and the input stream data
+    from `input_data`; the output is passed to ``case["checker"]``. `run`
+    fills them in and resets the simulator after every run.
+    """
+
+    def __init__(
+        self, t, case: dict, clk_period: float = 1e-6, testbenches=(), **stream_args
+    ):
+        self.t = t
+        self.case = case
+        self.input_data = []
+
+        async def output_checker(ctx, results):
+            await case["checker"](ctx, results)
+
+        self.sim = Simulator(t)
+        self.sim.add_clock(clk_period)
+        for tb in testbenches:
+            self.sim.add_testbench(tb)
+        stream_testbench(
+            self.sim,
+            input_data=self.input_data,
+            output_data_checker=output_checker,
+            **stream_args,
+        )
+
+    def run(self, name: str, input_data: list, **case) -> None:
+        self.case.clear()
+        self.case.update(case)
+        self.input_data[:] = input_data
+
+        try:
+            run_simulation(self.sim, name, traces=self.t.dut)
+        finally:
+            # Restarts the processes as well as the design for the next case
+            self.sim.reset()
+
+
+def shared_stream_sim(build):
+    """Caches the `SharedStreamSim` made from ``build(case, *args)`` for every
+    set of ``args``.
+
+    ``build`` creates the testbench, whose processes read the case to run from
+    ``case``, and returns it with the keyword arguments of `SharedStreamSim`:
+    those of `stream_testbench` other than the input data and the output
+    checker."""
+
+    @functools.cache
+    @functools.wraps(build)
+    def get(*args) -> SharedStreamSim:
+        case = {}
+        t, stream_args = build(case, *args)
+        return SharedStreamSim(t, case, **stream_args)
+
+    return get
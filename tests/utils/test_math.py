@@ -6,6 +6,7 @@ from gpu.utils import fixed
 from gpu.utils.math import FixedPointInv, FixedPointVecNormalize
 from gpu.utils.types import Vector3
 
+from .sim import run_simulation
 from .streams import stream_testbench
 
 
@@ -47,16 +48,7 @@ def test_normalize(data: list[list[float]]):
         idle_for=30,
     )
 
-    try:
-        sim.run()
-    except Exception:
-        sim.reset()
-        with sim.write_vcd(
-            "test_fixed_point_vec_normalize.vcd",
-            "test_fixed_point_vec_normalize.gtkw",
-            traces=dut,
-        ):
-            sim.run()
+    run_simulation(sim, "test_fixed_point_vec_normalize", traces=dut)
 
 
 @pytest.mark.parametrize(
@@ -101,13 +93,40 @@ def test_inverse_unbalanced_type(
         idle_for=300,
     )
 
-    try:
-        sim.run()
-    except Exception:
-        sim.reset()
-        with sim.write_vcd(
-            "test_fixed_point_inv.vcd",
-            "test_fixed_point_inv.gtkw",
-            traces=dut,
-        ):
-            sim.run()
+    run_simulation(sim, "test_fixed_point_inv", traces=dut)
+
+
+@pytest.mark.parametrize("steps", [1, 2])
+def test_inverse_seeded(steps: int):
+    t = fixed.SQ(13, 13)
+    data = [1.0, 1.5, 3.0, -7.25, 100.5, 0.3, -0.01, 2000.0, 1.99]
+    # reciprocals of the values as they are represented
+    expected = [1.0 / fixed.Const(v, t).as_float() for v in data]
+
+    dut = FixedPointInv(t, steps=steps, seed_bits=8)
+
+    async def output_checker(ctx, results):
+        results = [v.as_float() for v in results]
+        print("Input data:", data)
+        print("Checking output:", results)
+        print("Expected data:", expected)
+        print()
+
+        def val_dist(a, b):
+            # within the last bit of the result, or 1e-4 relative
+            return abs(a - b) <= max(abs(b) * 1e-4, 2**-13)
+
+        assert len(results) == len(expected)
+        assert all(val_dist(r, e) for r, e in zip(results, expected))
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    stream_testbench(
+        sim,
+        input_stream=dut.i,
+        input_data=data,
+        output_stream=dut.o,
+        output_data_checker=output_checker,
+        idle_for=30,
+    )
+    sim.run()
@@ -0,0 +1,166 @@
+import contextlib
+
+from amaranth import *
+from amaranth.lib import wiring
+from amaranth.sim import Simulator
+from amaranth_soc import wishbone
+from amaranth_soc.wishbone.sram import WishboneSRAM
+from transactron import TModule, TransactronContextElaboratable, testing
+from transactron.lib.adapters import AdapterTrans
+from transactron.utils.dependencies import DependencyContext, DependencyManager
+
+from gpu.utils.mem import MemorySystem
+
+from .sim import run_simulation
+
+
+class MemorySystemCircuit(Elaboratable):
+    """`MemorySystem` in front of a Wishbone SRAM, with its methods exposed
+    to the testbench."""
+
+    def __init__(self, depth: int = 4):
+        self.sram = WishboneSRAM(size=64, data_width=32, granularity=8, writable=True)
+        self.mem = MemorySystem(
+            wishbone.Signature(
+                addr_width=self.sram.wb_bus.addr_width, data_width=32, granularity=8
+            ),
+            depth=depth,
+        )
+
+        self.request_read = testing.TestbenchIO(
+            AdapterTrans.create(self.mem.request_read)
+        )
+        self.read_resolve = testing.TestbenchIO(
+            AdapterTrans.create(self.mem.read_resolve)
+        )
+        self.request_write = testing.TestbenchIO(
+            AdapterTrans.create(self.mem.request_write)
+        )
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        m.submodules.sram = self.sram
+        m.submodules.mem = self.mem
+        m.submodules.request_read = self.request_read
+        m.submodules.read_resolve = self.read_resolve
+        m.submodules.request_write = self.request_write
+
+        wiring.connect(m.main_module, self.mem.wb_bus, self.sram.wb_bus)
+
+        return m
+
+
+@contextlib.contextmanager
+def memory_system_sim(depth: int = 4):
+    # Methods look up the transaction manager when they are created
+    with DependencyContext(DependencyManager()):
+        circ = MemorySystemCircuit(depth)
+        sim = Simulator(
+            TransactronContextElaboratable(
+                circ, dependency_manager=DependencyContext.get()
+            )
+        )
+        sim.add_clock(1e-6)
+        yield circ, sim
+
+
+def test_memory_system_back_to_back():
+    """Queued requests are issued without dropping ``cyc`` in between, and
+    reads wait for a slow consumer of their responses without losing any."""
+    data = [0x01020304 * (i + 1) for i in range(8)]
+
+    # cyc and ack of every cycle, until the last response is taken
+    trace = []
+    done = False
+
+    with memory_system_sim() as (circ, sim):
+        wb_bus = circ.mem.wb_bus
+
+        async def requests(ctx):
+            for i, d in enumerate(data):
+                await circ.request_write.call(ctx, addr=i, mask=0xF, data=d)
+            for i in range(len(data)):
+                await circ.request_read.call(ctx, addr=i, mask=0xF)
+
+        async def responses(ctx):
+            nonlocal done
+            for d in data:
+                # Stall, so that the responses pile up and reads are held back
+                await ctx.tick().repeat(6)
+                assert (await circ.read_resolve.call(ctx)).data == d
+            done = True
+
+        async def monitor(ctx):
+            async for _, _, cyc, ack in ctx.tick().sample(wb_bus.cyc, wb_bus.ack):
+                if done:
+                    break
+                # A lost response would leave the resolver waiting forever
+                assert len(trace) < 1000, "responses not received"
+                trace.append((cyc, ack))
+
+        sim.add_testbench(requests)
+        sim.add_testbench(responses)
+        sim.add_process(monitor)
+        run_simulation(sim, "test_memory_system_back_to_back", traces=wb_bus)
+
+    assert done
+    acks = [i for i, (_, ack) in enumerate(trace) if ack]
+    assert len(acks) == 2 * len(data)
+
+    # The writes are queued faster than the bus takes them, so they go out
+    # in a single bus cycle
+    write_acks = acks[: len(data)]
+    assert all(cyc for cyc, _ in trace[write_acks[0] : write_acks[-1] + 1])
+
+
+def test_memory_system_read_after_write():
+    """Reads interleaved with writes to the same address return the data of
+    the writes requested before them, or in the same cycle."""
+    # One step per cycle: the data to write, if any, and whether to read
+    steps = [
+        (0x11, False),
+        (None, True),
+        (0x22, True),
+        (0x33, False),
+        (0x44, False),
+        (None, True),
+        (0x55, True),
+        (None, True),
+        (0x66, True),
+        (0x77, False),
+        (None, True),
+    ]
+
+    expected = []
+    last = None
+    for data, read in steps:
+        if data is not None:
+            last = data
+        if read:
+            expected.append(last)
+
+    with memory_system_sim(depth=8) as (circ, sim):
+
+        async def requests(ctx):
+            for data, read in steps:
+                trigger = testing.CallTrigger(ctx)
+                if data is not None:
+                    trigger = trigger.call(
+                        circ.request_write, addr=3, mask=0xF, data=data
+                    )
+                if read:
+                    trigger = trigger.call(circ.request_read, addr=3, mask=0xF)
+
+                # Both requests of a step have to be taken in its cycle
+                assert all(res is not None for res in await trigger)
+
+        async def responses(ctx):
+            for e in expected:
+                assert (await circ.read_resolve.call(ctx)).data == e
+
+        sim.add_testbench(requests)
+        sim.add_testbench(responses)
+        run_simulation(
+            sim, "test_memory_system_read_after_write", traces=circ.mem.wb_bus
+        )
@@ -1,3 +1,5 @@
+import functools
+
 from amaranth import *
 from amaranth.lib import wiring
 from amaranth_soc import csr
@@ -14,6 +16,13 @@ def div_ceil(a: int, b: int) -> int:
     return (a + b - 1) // b
 
 
+@functools.cache
+def _pack_const(width: int, value: int) -> bytes:
+    # The same constants (identity matrices, default configs) are registered
+    # by many tests
+    return value.to_bytes(div_ceil(width, 8), "little")
+
+
 class SimpleTestbench(Elaboratable):
     def __init__(
         self,
@@ -60,6 +69,7 @@ class SimpleTestbench(Elaboratable):
 
         self.arbiter.add(self.dbg_access)
         self.csrs = []
+        self._csr_runs = None
 
     def set_csrs(
         self,
@@ -74,11 +84,12 @@ class SimpleTestbench(Elaboratable):
         for path, value in data:
             if not isinstance(value, bytes):
                 value = Const.cast(value)
-                value = value.value.to_bytes(div_ceil(len(value), 8), "little")
+                value = _pack_const(len(value), value.value)
             prepared_data.append((path, value))
 
         self.csr_decoder.add(csr_bus, name=name)
         self.csrs.append((name, prepared_data))
+        self._csr_runs = None
 
     def elaborate(self, platform) -> Module:
         m = Module()
@@ -102,13 +113,34 @@ class SimpleTestbench(Elaboratable):
 
         return m
 
-    async def initialize_csrs(self, ctx):
+    def _resolve_csr_runs(self) -> list[tuple[int, bytes]]:
         mmap: MemoryMap = self.decoder.bus.memory_map
 
-        for name, data in self.csrs:
-            for path, value in data:
-                res = get_memory_resource(mmap, (name,) + path)
-                await self.dbg_access.write_bytes(ctx, res.start, value)
+        writes = sorted(
+            (get_memory_resource(mmap, (name,) + path).start, value)
+            for name, data in self.csrs
+            for path, value in data
+        )
+
+        # Registers at consecutive addresses are written as one run, so that
+        # those sharing a bus word go in a single transaction
+        runs: list[tuple[int, bytearray]] = []
+        for start, value in writes:
+            if runs and runs[-1][0] + len(runs[-1][1]) == start:
+                runs[-1][1].extend(value)
+            else:
+                runs.append((start, bytearray(value)))
+
+        return [(start, bytes(value)) for start, value in runs]
+
+    async def initialize_csrs(self, ctx):
+        # The runs only change with set_csrs, so a simulator that is reset and
+        # rerun resolves them once
+        if self._csr_runs is None:
+            self._csr_runs = self._resolve_csr_runs()
+
+        for start, value in self._csr_runs:
+            await self.dbg_access.write_bytes(ctx, start, value)
 
     async def initialize_memory(self, ctx, addr: int, data: bytes):
         await self.dbg_access.write_bytes(ctx, addr, data)
@@ -0,0 +1,5 @@
+from gpu.utils.layouts import num_textures
+
+# Texture coordinates of test vertices. Tests modify other fields of their
+# vertices in place, so this is a tuple, safe to share between all of them.
+default_texcoords = tuple((0.0, 0.0, 0.0, 1.0) for _ in range(num_textures))
@@ -5,8 +5,12 @@ from typing import List, Tuple
 
 import numpy as np
 
+# ASCII shades from light to dark, and the lowest intensity of each but the first
+intensity_chars = np.array([" ", "░", "▒", "▓", "█"])
+intensity_thresholds = np.array([0.25, 0.5, 0.75, 1.0], dtype=np.float32)
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class Fragment:
     """Represents a rasterized fragment"""
 
@@ -14,6 +18,37 @@ class Fragment:
     color: Tuple[float, float, float, float]
 
 
+@dataclass
+class FragmentArrays:
+    """Rasterized fragments as a structure of arrays, in arrival order"""
+
+    coord_pos: np.ndarray  # (N, 2) integer x, y
+    color: np.ndarray  # (N, 4) float32 rgba
+
+    @classmethod
+    def cast(cls, fragments: "List[Fragment] | FragmentArrays") -> "FragmentArrays":
+        if isinstance(fragments, FragmentArrays):
+            return fragments
+
+        # Filled straight from the fragments, without intermediate lists
+        n = len(fragments)
+        return cls(
+            coord_pos=np.fromiter(
+                (c for frag in fragments for c in frag.coord_pos),
+                dtype=np.int64,
+                count=2 * n,
+            ).reshape(n, 2),
+            color=np.fromiter(
+                (c for frag in fragments for c in frag.color),
+                dtype=np.float32,
+                count=4 * n,
+            ).reshape(n, 4),
+        )
+
+    def __len__(self) -> int:
+        return len(self.coord_pos)
+
+
 class FragmentVisualizer:
     """Visualize rasterized fragments in various formats"""
 
@@ -25,35 +60,41 @@ class FragmentVisualizer:
         self.depth = np.full((height, width), 1.0, dtype=np.float32)  # Depth buffer
         self.stencil = np.zeros((height, width), dtype=np.uint8)  # Stencil buffer
 
-    def render(self, fragments: List[Fragment]):
+    def render(self, fragments: List[Fragment] | FragmentArrays):
         """Render fragments onto the canvas"""
 
-        for frag in fragments:
-            x, y = int(frag.coord_pos[0]), int(frag.coord_pos[1])
-
-            # Bounds check
-            if not (0 <= x < self.width and 0 <= y < self.height):
-                continue
+        fragments = FragmentArrays.cast(fragments)
+        x, y = fragments.coord_pos[:, 0], fragments.coord_pos[:, 1]
 
-            # TODO: Depth and stencil tests can be added here
+        # Bounds check
+        inside = (0 <= x) & (x < self.width) & (0 <= y) & (y < self.height)
+        x, y, d_rgba = x[inside], y[inside], fragments.color[inside]
 
-            d_rgba = np.array(frag.color, dtype=np.float32)
-            s_rgba = self.canvas[y, x]
+        # TODO: Depth and stencil tests can be added here
 
-            d_rgb = d_rgba[0:3]
-            d_a = d_rgba[3]
-            s_rgb = s_rgba[0:3]
-            s_a = s_rgba[3]
+        # Fragments are blended in layers: the k-th fragment to hit each pixel
+        # goes in layer k, so a layer touches every pixel at most once and the
+        # per-pixel arrival order is kept
+        pixel = y * self.width + x
+        order = np.argsort(pixel, kind="stable")
+        sorted_pixel = pixel[order]
+        run_start = np.flatnonzero(np.r_[True, sorted_pixel[1:] != sorted_pixel[:-1]])
+        run_length = np.diff(np.r_[run_start, len(sorted_pixel)])
+        layer = np.empty_like(order)
+        layer[order] = np.arange(len(order)) - np.repeat(run_start, run_length)
 
-            # Alpha blending
-            def lerp(c1, c2, t):
-                return c1 * (1 - t) + c2 * t
+        # Alpha blending
+        def lerp(c1, c2, t):
+            return c1 * (1 - t) + c2 * t
 
-            out_a = lerp(s_a, d_a, d_a)
-            out_rgb = lerp(s_rgb, d_rgb, d_a)
+        for k in range(int(layer.max(initial=-1)) + 1):
+            sel = layer == k
+            ly, lx, d = y[sel], x[sel], d_rgba[sel]
+            s_rgba = self.canvas[ly, lx]
 
-            self.canvas[y, x, 0:3] = out_rgb
-            self.canvas[y, x, 3] = out_a
+            d_a = d[:, 3:4]
+            self.canvas[ly, lx, 0:3] = lerp(s_rgba[:, 0:3], d[:, 0:3], d_a)
+            self.canvas[ly, lx, 3] = lerp(s_rgba[:, 3], d[:, 3], d[:, 3])
 
     def clear(self, color: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 1.0)):
         """Clear the canvas to a specific color"""
@@ -75,19 +116,12 @@ class FragmentVisualizer:
         """
 
         # Build ASCII string
-        ascii_chars = [" ", "░", "▒", "▓", "█"]  # From light to dark
-
-        lines = []
-        for y in range(self.height):
-            line = ""
-            for x in range(self.width):
-                r, g, b, a = self.canvas[y, x]
-                intensity = int(((r + g + b) / 3.0) * (len(ascii_chars) - 1))
-                intensity = max(0, min(intensity, len(ascii_chars) - 1))
-                line += ascii_chars[intensity]
-            lines.append(line)
+        intensity = self.canvas[:, :, 0:3].mean(axis=2)
+        chars = intensity_chars[np.digitize(intensity, intensity_thresholds)]
 
-        return "\n".join(lines)
+        # Each row of single characters reinterpreted as one string
+        rows = np.ascontiguousarray(chars).view(f"<U{self.width}")
+        return "\n".join(rows.ravel().tolist())
 
     def visualize_color_ascii(self) -> str:
         """Generate colorized ASCII visualization (ANSI codes)
@@ -96,16 +130,16 @@ class FragmentVisualizer:
             String with ANSI color codes
         """
 
+        rgb = (self.canvas[:, :, 0:3] * 255).astype(np.int64)
+
         lines = []
-        for y in range(self.height):
-            line = ""
-            for x in range(self.width):
-                r, g, b, a = self.canvas[y, x]
-                r_ansi = int(r * 255)
-                g_ansi = int(g * 255)
-                b_ansi = int(b * 255)
-                line += f"\x1b[38;2;{r_ansi};{g_ansi};{b_ansi}m█\x1b[0m"
-            lines.append(line)
+        for row in rgb:
+            # One escape per run of equally colored pixels, one reset per row
+            starts = np.flatnonzero(np.r_[True, (row[1:] != row[:-1]).any(axis=1)])
+            lengths = np.diff(np.r_[starts, len(row)])
+            runs = zip(row[starts].tolist(), lengths.tolist())
+            line = "".join(f"\x1b[38;2;{r};{g};{b}m{'█' * n}" for (r, g, b), n in runs)
+            lines.append(f"{line}\x1b[0m")
 
         return "\n".join(lines)
 
@@ -118,48 +152,34 @@ class FragmentVisualizer:
 
         max_v = 255
 
-        # Write PPM file
-        with open(filepath, "w") as f:
+        # Quantize the whole canvas at once
+        img = np.clip(self.canvas[:, :, 0:3] * max_v, 0, max_v).astype(np.uint8)
+
+        # Write binary PPM file
+        with open(filepath, "wb") as f:
             # PPM header
-            f.write("P3\n")
-            f.write(f"{self.width} {self.height}\n")
-            f.write(f"{max_v}\n")
-
-            for y in range(self.height):
-                for x in range(self.width):
-                    r, g, b, a = self.canvas[y, x]
-                    r_i = int(max(0, min(r * max_v, max_v)))
-                    g_i = int(max(0, min(g * max_v, max_v)))
-                    b_i = int(max(0, min(b * max_v, max_v)))
-                    f.write(f"{r_i} {g_i} {b_i} ")
-                f.write("\n")
+            f.write(f"P6\n{self.width} {self.height}\n{max_v}\n".encode("ascii"))
+
+            img.tofile(f)
 
         print(f"Generated PPM image: {filepath}")
 
-    def generate_statistics(self, fragments: List[Fragment]) -> dict:
+    def generate_statistics(self, fragments: List[Fragment] | FragmentArrays) -> dict:
         """Generate statistics about the rasterized output
 
         Args:
-            fragments: List of fragment objects
+            fragments: List of fragment objects, or their arrays
 
         Returns:
             Dictionary with statistics
         """
-        if not fragments:
+        fragments = FragmentArrays.cast(fragments)
+        if not len(fragments):
             return {"fragment_count": 0, "coverage": 0.0, "color_ranges": {}}
 
-        color_sum = [0.0, 0.0, 0.0, 0.0]
-        min_color = [1.0, 1.0, 1.0, 1.0]
-        max_color = [0.0, 0.0, 0.0, 0.0]
-
-        for frag in fragments:
-            for i in range(4):
-                c = frag.color[i]
-                color_sum[i] += c
-                min_color[i] = min(min_color[i], c)
-                max_color[i] = max(max_color[i], c)
-
-        avg_color = [s / len(fragments) for s in color_sum]
+        avg_color = fragments.color.mean(axis=0, dtype=np.float64).tolist()
+        min_color = np.minimum(fragments.color.min(axis=0), 1.0).tolist()
+        max_color = np.maximum(fragments.color.max(axis=0), 0.0).tolist()
 
         return {
             "fragment_count": len(fragments),
@@ -185,14 +205,20 @@ class FragmentVisualizer:
         }
 
 
-def print_fragment_summary(fragments: List, visualizer: FragmentVisualizer):
+def print_fragment_summary(
+    fragments: List[Fragment] | FragmentArrays,
+    visualizer: FragmentVisualizer,
+    stats: dict | None = None,
+):
     """Print a comprehensive summary of fragments with visualization
 
     Args:
-        fragments: List of fragment objects
-        visualizer: FragmentVisualizer instance
+        fragments: List of fragment objects, or their arrays
+        visualizer: FragmentVisualizer instance the fragments were rendered to
+        stats: Result of generate_statistics, if the caller already has it
     """
-    stats = visualizer.generate_statistics(fragments)
+    if stats is None:
+        stats = visualizer.generate_statistics(fragments)
 
     print("\n" + "=" * 60)
     print("RASTERIZER OUTPUT SUMMARY")
@@ -211,6 +237,6 @@ def print_fragment_summary(fragments: List, visualizer: FragmentVisualizer):
     print("\nASCII Visualization (Intensity-based):")
     print("(█ = high intensity, ░ = medium, · = low)")
     print("-" * visualizer.width)
-    print(visualizer.visualize_ascii(fragments, intensity_char=True))
+    print(visualizer.visualize_ascii())
     print("-" * visualizer.width)
     print("=" * 60 + "\n")
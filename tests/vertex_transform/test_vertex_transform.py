@@ -5,14 +5,15 @@ from amaranth.sim import Simulator
 from numpy.linalg import inv
 
 from gpu.utils.layouts import num_textures
-from gpu.vertex_transform.cores import VertexTransform
+from gpu.vertex_transform.cores import PerspectiveDivide, VertexTransform
 
+from ..utils.sim import shared_stream_sim
 from ..utils.streams import stream_testbench
 from ..utils.testbench import SimpleTestbench
 
-
-def identity_mat(size):
-    return np.identity(size)
+identity_mat4 = np.identity(4)
+# Inverse transpose of the identity model-view, as used for normals
+identity_mv_inv_t = inv(identity_mat4[:3, :3]).T
 
 
 def make_vertex():
@@ -28,11 +29,11 @@ def test_identity_transform_positions():
     dut = VertexTransform()
     t = SimpleTestbench(dut)
 
-    mv = identity_mat(4)
-    proj = identity_mat(4)
+    mv = identity_mat4
+    proj = identity_mat4
     vertex = make_vertex()
 
-    mv_inv_t = inv(mv[:3, :3]).T
+    mv_inv_t = identity_mv_inv_t
 
     async def init_proc(ctx):
         # Set transformation matrices
@@ -46,8 +47,9 @@ def test_identity_transform_positions():
             ctx.set(dut.enabled.texture[i], 0)
 
         # Set texture transforms to identity
+        tex_mat = identity_mat4.flatten().tolist()
         for i in range(num_textures):
-            ctx.set(dut.texture_transforms[i], identity_mat(4).flatten().tolist())
+            ctx.set(dut.texture_transforms[i], tex_mat)
 
     async def output_checker(ctx, results):
         assert len(results) == 1
@@ -79,3 +81,46 @@ def test_identity_transform_positions():
     )
 
     sim.run()
+
+
+@shared_stream_sim
+def perspective_divide_sim(case: dict):
+    dut = PerspectiveDivide()
+    return SimpleTestbench(dut), {
+        "input_stream": dut.i,
+        "output_stream": dut.o,
+        "idle_for": 20,
+    }
+
+
+@pytest.mark.xdist_group("perspective_divide")
+@pytest.mark.parametrize("w", [1.0, 2.0, 0.5, 4.0, -3.0, 7.25])
+def test_perspective_divide(w):
+    vertex = {
+        "position_view": [1.0, -2.0, 3.0, 1.0],
+        "position_proj": [1.5, -2.0, 0.75, w],
+        "normal_view": [0.0, 0.0, 1.0],
+        "texcoords": [[0.1, 0.2, 0.3, 1.0] for _ in range(num_textures)],
+        "color": [0.25, 0.5, 0.75, 1.0],
+    }
+
+    async def output_checker(ctx, results):
+        assert len(results) == 1
+        out = results[0]
+
+        def vec_to_list(vec):
+            return [c.as_float() for c in vec]
+
+        x, y, z, _ = vertex["position_proj"]
+        assert vec_to_list(out.position_proj) == pytest.approx(
+            [x / w, y / w, z / w, 1 / w], abs=1e-3
+        )
+
+        # everything else is passed through
+        assert vec_to_list(out.position_view) == vertex["position_view"]
+        assert vec_to_list(out.normal_view) == vertex["normal_view"]
+        assert vec_to_list(out.color) == vertex["color"]
+
+    perspective_divide_sim().run(
+        f"test_perspective_divide_{w}", [vertex], checker=output_checker
+    )